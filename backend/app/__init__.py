@@ -3,11 +3,9 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from config import Config
 from .models import db
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 
 migrate = Migrate()
-bcrypt = Bcrypt()
 login_manager = LoginManager()
 
 login_manager.session_protection = "strong"
@@ -16,9 +14,21 @@ login_manager.login_message_category = "info"
 
 @login_manager.user_loader
 def load_user(user_id):
-   """Callback function to reload the user object from tyhe session ID"""  
+   """Callback function to reload the user object from tyhe session ID.
+
+   Returns a cached UserSnapshot (id, email, is_admin), so most requests don't
+   touch the database; views that modify the user load the model themselves."""
    from .models import User
-   return User.query.get(int(user_id)) 
+   from .user_cache import UserSnapshot, get_user_cache
+
+   def load(uid):
+      user = db.session.get(User, uid)
+      return UserSnapshot.from_user(user) if user else None
+
+   try:
+      return get_user_cache().get(int(user_id), load)
+   except ValueError:
+      return None
 
 @login_manager.unauthorized_handler
 def unauthorized():
@@ -30,9 +40,55 @@ def create_app():
    app.config.from_object(Config)  # Load config
    db.init_app(app)
    migrate.init_app(app, db)
-   bcrypt.init_app(app)
    login_manager.init_app(app)
 
+   # One pooled client per process for the hop to the FastAPI AI service
+   from .gateway import AIGatewayClient
+   app.extensions["ai_gateway"] = AIGatewayClient.from_config(app.config)
+
+   # Hot state of active chat sessions (Redis when REDIS_URL is set, else in-process LRU)
+   from .history_cache import HistoryCache
+   app.extensions["history_cache"] = HistoryCache.from_config(app.config)
+
+   # Rights data and the precompiled FAQ index
+   from .knowledge import KnowledgeBase
+   app.extensions["knowledge"] = KnowledgeBase.from_config(app.config)
+
+   # Crisis-language detector checked before every AI call
+   from .crisis import CrisisDetector
+   app.extensions["crisis_detector"] = CrisisDetector.from_file(app.config["CRISIS_LEXICON_FILE"])
+
+   # Optional write-behind queue for chat messages
+   from .message_writer import MessageWriter
+   app.extensions["message_writer"] = MessageWriter.from_config(app)
+
+   # Snapshots of signed-in users for the user_loader (Redis tier when REDIS_URL is set)
+   from .user_cache import UserCache
+   app.extensions["user_cache"] = UserCache.from_config(app.config)
+
+   # bcrypt hashing on a bounded thread pool, off the request thread
+   from .passwords import PasswordHasher
+   app.extensions["password_hasher"] = PasswordHasher.from_config(app.config)
+
+   # Per-client chat rate limits (Redis when REDIS_URL is set, else in-process)
+   from .rate_limit import RateLimiter
+   app.extensions["rate_limiter"] = RateLimiter.from_config(app.config)
+
+   # Request/stage metrics on /metrics, and the trace ID shared with the AI service
+   from .metrics import GatewayMetrics
+   app.extensions["metrics"] = GatewayMetrics.from_config(app.config)
+   app.extensions["metrics"].init_app(app)
+
+   # `flask stats rebuild` recomputes the admin metrics counters
+   from .stats import stats_cli
+   app.cli.add_command(stats_cli)
+   # `flask reset-tokens sweep` deletes expired password reset tokens
+   from .reset_tokens import reset_tokens_cli
+   app.cli.add_command(reset_tokens_cli)
+   # `flask users set-admin EMAIL [--revoke]`
+   from .user_cache import users_cli
+   app.cli.add_command(users_cli)
+
    # Allow configuring the frontend origin via FRONTEND_URL env var / config
    default_origins = ["https://tenaai.vercel.app", "http://localhost:5173", "http://localhost:3000"]
    cors_origins = app.config.get("FRONTEND_URL", "http://localhost:5173")
@@ -0,0 +1,173 @@
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker with a latency-derived timeout.
+
+    Outcomes of the last `window` seconds (at most `max_samples`) are kept. The
+    breaker opens when either `consecutive_failures` calls fail in a row, or at
+    least `min_calls` calls were made in the window and `failure_rate` of them
+    failed. While open every call is rejected immediately; after `cooldown`
+    seconds one probe call is let through (half-open) and its outcome decides
+    whether the breaker closes or opens again.
+
+    timeout() returns the observed p99 latency of successful calls times
+    `timeout_multiplier`, clamped to [min_timeout, max_timeout], and falls back
+    to max_timeout until `min_latency_samples` successes were seen.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, window: float = 60.0, min_calls: int = 10,
+                 failure_rate: float = 0.5, consecutive_failures: int = 5,
+                 cooldown: float = 15.0, max_samples: int = 1000,
+                 min_timeout: float = 5.0, max_timeout: float = 30.0,
+                 timeout_multiplier: float = 2.0, min_latency_samples: int = 20):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_latency_samples = min_latency_samples
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=max_samples)   # (finished_at, ok)
+        self._latencies = deque(maxlen=max_samples)  # (finished_at, seconds), successes only
+        self._failures_in_row = 0
+        self._probe_started = None
+        self._timeout = max_timeout
+        self._timeout_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, name: str, config) -> "CircuitBreaker":
+        return cls(
+            name,
+            window=config.get("AI_BREAKER_WINDOW", 60.0),
+            min_calls=config.get("AI_BREAKER_MIN_CALLS", 10),
+            failure_rate=config.get("AI_BREAKER_FAILURE_RATE", 0.5),
+            consecutive_failures=config.get("AI_BREAKER_CONSECUTIVE_FAILURES", 5),
+            cooldown=config.get("AI_BREAKER_COOLDOWN", 15.0),
+            min_timeout=config.get("AI_BREAKER_MIN_TIMEOUT", 5.0),
+            max_timeout=config.get("AI_GATEWAY_READ_TIMEOUT", 30.0),
+            timeout_multiplier=config.get("AI_BREAKER_TIMEOUT_MULTIPLIER", 2.0),
+        )
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. Every allowed call must be followed by
+        record_success(), record_failure() or release()."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_started = None
+            if self.state == self.HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced
+                if self._probe_started is None or now - self._probe_started > self.max_timeout:
+                    self._probe_started = now
+                    return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                # Probe succeeded: start over with a clean window
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            self._failures_in_row = 0
+            self._outcomes.append((now, True))
+            if latency is not None:
+                self._latencies.append((now, latency))
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            self._failures_in_row += 1
+            self._outcomes.append((now, False))
+            if self.state == self.HALF_OPEN or self._should_open(now):
+                self._open(now)
+
+    def release(self):
+        """Ends an allowed call without an outcome, for calls the AI service turned
+        away as back-pressure (rate limited or overloaded) rather than failed."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_started = None
+
+    def _should_open(self, now: float) -> bool:
+        if self.state != self.CLOSED:
+            return False
+        if self._failures_in_row >= self.consecutive_failures:
+            return True
+        recent = [ok for finished_at, ok in self._outcomes if now - finished_at <= self.window]
+        if len(recent) < self.min_calls:
+            return False
+        return recent.count(False) / len(recent) >= self.failure_rate
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._probe_started = None
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 when closed)."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def _percentile(self, values: list, q: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def _recent_latencies(self, now: float) -> list:
+        return [latency for finished_at, latency in self._latencies if now - finished_at <= self.window]
+
+    def timeout(self) -> float:
+        """Adaptive read timeout for the next call (recomputed at most once a second)."""
+        now = time.monotonic()
+        if now - self._timeout_at < 1.0:
+            return self._timeout
+        with self._lock:
+            latencies = self._recent_latencies(now)
+            timeout = self.max_timeout
+            if len(latencies) >= self.min_latency_samples:
+                p99 = self._percentile(latencies, 0.99)
+                timeout = min(max(p99 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+            self._timeout, self._timeout_at = timeout, now
+        return timeout
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            recent = [ok for finished_at, ok in self._outcomes if now - finished_at <= self.window]
+            latencies = self._recent_latencies(now)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "calls": len(recent),
+            "failure_rate": round(recent.count(False) / len(recent), 4) if recent else 0.0,
+            "latency_p50": self._percentile(latencies, 0.50),
+            "latency_p95": self._percentile(latencies, 0.95),
+            "latency_p99": self._percentile(latencies, 0.99),
+            "timeout": round(self.timeout(), 3),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 3),
+        }
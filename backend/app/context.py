@@ -0,0 +1,126 @@
+import logging
+from functools import lru_cache
+from typing import Iterable, List, Optional
+from flask import current_app
+from app.models import Message, db
+
+logger = logging.getLogger(__name__)
+
+# Fixed per-message cost of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding(name: str):
+    """Loads a tiktoken encoding if the optional dependency is available."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        logger.warning("tiktoken encoding %s unavailable, falling back to estimator", name)
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English-like text)."""
+    return (len(text) + 3) // 4
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Counts tokens in `text` with the configured tokenizer.
+
+    CONTEXT_TOKENIZER='estimate' (default) uses estimate_tokens; any other value is
+    treated as a tiktoken encoding name, e.g. 'cl100k_base' or 'o200k_base'.
+    """
+    if not text:
+        return 0
+    tokenizer = current_app.config.get("CONTEXT_TOKENIZER", "estimate")
+    if tokenizer != "estimate":
+        encoding = _get_encoding(tokenizer)
+        if encoding is not None:
+            return len(encoding.encode(text))
+    return estimate_tokens(text)
+
+
+def message_tokens(content: Optional[str]) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def select_recent_turns(history: List[dict], budget: int) -> List[dict]:
+    """Keeps the most recent formatted turns whose combined size fits in `budget` tokens.
+
+    Walks from newest to oldest and stops at the first message that would overflow,
+    so the selected window is always contiguous. Returns turns in chronological order.
+    """
+    selected = []
+    used = 0
+    for msg in reversed(history):
+        cost = message_tokens(msg["content"])
+        if used + cost > budget:
+            break
+        selected.append(msg)
+        used += cost
+    selected.reverse()
+    return selected
+
+
+def history_budget(new_message: str, summary: Optional[str] = None) -> int:
+    """Tokens left for history once the system prompt, the rolling summary and the
+    new message are accounted for."""
+    config = current_app.config
+    budget = config.get("CONTEXT_TOKEN_BUDGET", 3000)
+    budget -= config.get("CONTEXT_SYSTEM_PROMPT_TOKENS", 1200)
+    budget -= message_tokens(new_message)
+    if summary:
+        budget -= message_tokens(summary)
+    return max(budget, 0)
+
+
+def load_recent_history(chat_id: int, summary_until_id: Optional[int] = None) -> List[dict]:
+    """Reads the newest CONTEXT_MAX_MESSAGES turns of a chat, oldest first, in the
+    OpenAI message format.
+
+    Messages already folded into the session summary (message_id <= summary_until_id)
+    are skipped, so the query cost stays bounded however long the session runs.
+    """
+    query = db.select(Message).filter_by(chat_id=chat_id)
+    if summary_until_id is not None:
+        query = query.filter(Message.message_id > summary_until_id)
+
+    newest_first = db.session.execute(
+        query
+        .order_by(Message.timestamp.desc(), Message.message_id.desc())
+        .limit(current_app.config.get("CONTEXT_MAX_MESSAGES", 50))
+    ).scalars().all()
+
+    return format_messages_for_ai(reversed(newest_first))
+
+
+def build_history_context(chat_id: int, new_message: str, summary: Optional[str] = None,
+                          summary_until_id: Optional[int] = None,
+                          history: Optional[List[dict]] = None) -> List[dict]:
+    """Returns the most recent turns of a chat that fit the prompt token budget.
+
+    `history` is the already-loaded recent window (e.g. from the history cache);
+    when omitted it is read from the database.
+    """
+    budget = history_budget(new_message, summary)
+    if budget <= 0:
+        return []
+    if history is None:
+        history = load_recent_history(chat_id, summary_until_id)
+    return select_recent_turns(history, budget)
+
+
+def format_messages_for_ai(messages: Iterable[Message]) -> List[dict]:
+    """Converts Message SQLAlchemy objects into the OpenAI API format."""
+    formatted_history = []
+    
+    for msg in messages:
+        # Renames 'bot' to 'assistant' for OpenAI API compatibility
+        role = 'user' if msg.sender == 'user' else 'assistant' 
+        formatted_history.append({
+            "role": role,
+            "content": msg.content
+        })
+    return formatted_history
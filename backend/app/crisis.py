@@ -0,0 +1,129 @@
+import json
+import logging
+import time
+from typing import List, Optional, Tuple
+from flask import current_app
+from app.knowledge import AhoCorasick, normalize, format_helplines
+
+logger = logging.getLogger(__name__)
+
+# Checked in this order when a message matches several categories
+CATEGORIES = ("self_harm", "danger")
+
+
+class CrisisMatch:
+    __slots__ = ("category", "language", "phrase")
+
+    def __init__(self, category: str, language: str, phrase: str):
+        self.category = category
+        self.language = language
+        self.phrase = phrase
+
+
+class CrisisDetector:
+    """Precompiled crisis-language matcher, run before every AI call.
+
+    The lexicon (data/crisis_lexicon.json) lists, per category, first-person
+    phrases in several languages plus `exclude` phrases for idioms ("killing
+    myself laughing") that would otherwise match. All of them go into a single
+    Aho-Corasick automaton over normalized text, so a message is scanned once
+    regardless of how many phrases there are; a hit that lies inside an exclude
+    phrase is ignored. Most messages contain no phrase's full set of words and
+    are rejected by a set check before the automaton runs. `python -m app.crisis`
+    measures recall, false-positive rate and latency against data/crisis_corpus.json.
+    """
+
+    def __init__(self, categories: dict):
+        self.responses = {}
+        patterns = []
+        for category, spec in categories.items():
+            self.responses[category] = spec.get("responses", {})
+            for language, phrases in spec.get("phrases", {}).items():
+                patterns.extend((normalize(p), (category, language)) for p in phrases)
+            patterns.extend((normalize(p), (None, None)) for p in spec.get("exclude", []))
+        self.pattern_count = len(patterns)
+        self._index = AhoCorasick([(p, value) for p, value in patterns if p])
+        self._phrase_words = list({frozenset(p.split()) for p, (category, _) in patterns if p and category})
+
+    @classmethod
+    def from_file(cls, path: str) -> "CrisisDetector":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                categories = json.load(f).get("categories", {})
+        except Exception:
+            logger.exception("Could not load crisis lexicon %s; crisis fast path disabled", path)
+            categories = {}
+        detector = cls(categories)
+        logger.info("Loaded crisis lexicon %s: %d phrases", path, detector.pattern_count)
+        return detector
+
+    def detect(self, message: str) -> Optional[CrisisMatch]:
+        """Returns the highest-priority crisis phrase in `message`, or None."""
+        text = normalize(message)
+        words = set(text.split())
+        if not any(phrase <= words for phrase in self._phrase_words):
+            return None
+        hits: List[Tuple[int, int, str, str]] = []
+        excluded: List[Tuple[int, int]] = []
+        for start, end, (category, language) in self._index.find(text):
+            if category is None:
+                excluded.append((start, end))
+            else:
+                hits.append((start, end, category, language))
+        hits = [hit for hit in hits if not any(s <= hit[0] and hit[1] <= e for s, e in excluded)]
+        if not hits:
+            return None
+        start, end, category, language = min(
+            hits, key=lambda hit: CATEGORIES.index(hit[2]) if hit[2] in CATEGORIES else len(CATEGORIES))
+        return CrisisMatch(category, language, text[start:end])
+
+    def reply(self, match: CrisisMatch, helplines: List[dict]) -> str:
+        """The helpline block that opens the reply to a crisis message: a short line in the message's
+        language (English if there is none) followed by the helplines."""
+        responses = self.responses.get(match.category, {})
+        intro = responses.get(match.language) or responses.get("en", "")
+        return f"{intro}\n{format_helplines(helplines)}".strip()
+
+
+def get_crisis_detector() -> CrisisDetector:
+    """Returns the crisis detector loaded by create_app for the current app."""
+    return current_app.extensions["crisis_detector"]
+
+
+def evaluate(detector: CrisisDetector, corpus: dict) -> dict:
+    """Runs the detector over a labelled corpus ({"crisis": [...], "benign": [...]})."""
+    positives, negatives = corpus.get("crisis", []), corpus.get("benign", [])
+    missed = [m for m in positives if detector.detect(m) is None]
+    false_hits = [m for m in negatives if detector.detect(m) is not None]
+
+    messages = positives + negatives
+    started = time.perf_counter()
+    rounds = 20
+    for _ in range(rounds):
+        for message in messages:
+            detector.detect(message)
+    per_message_us = (time.perf_counter() - started) / (rounds * len(messages)) * 1e6 if messages else 0.0
+
+    return {
+        "crisis_messages": len(positives),
+        "benign_messages": len(negatives),
+        "recall": round(1 - len(missed) / len(positives), 4) if positives else None,
+        "false_positive_rate": round(len(false_hits) / len(negatives), 4) if negatives else None,
+        "mean_latency_us": round(per_message_us, 1),
+        "missed": missed,
+        "false_positives": false_hits,
+    }
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+    lexicon = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data_dir, "crisis_lexicon.json")
+    corpus_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(data_dir, "crisis_corpus.json")
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        report = evaluate(CrisisDetector.from_file(lexicon), json.load(f))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    # Non-zero exit when the corpus regresses, so this can gate a lexicon change in CI
+    sys.exit(1 if report["missed"] or report["false_positives"] else 0)
@@ -0,0 +1,99 @@
+import random
+import logging
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+from app.circuit_breaker import CircuitBreaker
+from app.metrics import trace_headers
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with full jitter, so workers that lost the upstream at the
+    same moment don't reconnect in lockstep."""
+
+    def get_backoff_time(self):
+        base = super().get_backoff_time()
+        return random.uniform(0, max(base, self.backoff_factor))
+
+
+class AIGatewayClient:
+    """Process-wide HTTP client for the Flask -> FastAPI hop.
+
+    Holds a single keep-alive connection pool (one per gunicorn worker, since
+    create_app runs after the fork), so chat turns reuse an open TCP/TLS
+    connection instead of handshaking on every request. Only connection
+    errors are retried: the request never reached the AI service, so a
+    retry cannot produce a duplicate completion.
+
+    `breaker` guards the chat calls (see app/services.py) and supplies their
+    adaptive read timeout.
+    """
+
+    def __init__(self, base_url: str, internal_key: Optional[str] = None, pool_size: int = 10,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 2, backoff_factor: float = 0.2,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker or CircuitBreaker("ai_service", max_timeout=read_timeout)
+
+        retry = JitteredRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        if internal_key:
+            self.session.headers["X-Internal-Key"] = internal_key
+
+    @classmethod
+    def from_config(cls, config) -> "AIGatewayClient":
+        return cls(
+            base_url=config["FASTAPI_URL"],
+            internal_key=config.get("INTERNAL_API_KEY"),
+            pool_size=config.get("AI_GATEWAY_POOL_SIZE", 10),
+            connect_timeout=config.get("AI_GATEWAY_CONNECT_TIMEOUT", 5.0),
+            read_timeout=config.get("AI_GATEWAY_READ_TIMEOUT", 30.0),
+            max_retries=config.get("AI_GATEWAY_MAX_RETRIES", 2),
+            backoff_factor=config.get("AI_GATEWAY_BACKOFF", 0.2),
+            breaker=CircuitBreaker.from_config("ai_service", config),
+        )
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def post(self, path: str, payload: dict, **kwargs) -> requests.Response:
+        """POSTs a JSON payload to the AI service over the pooled session, tagged
+        with the current request's trace ID and with how long we will wait for the
+        answer (X-Request-Timeout, the read timeout in seconds), which the AI
+        service uses to stop queueing work nobody would read."""
+        kwargs.setdefault("timeout", self.timeout)
+        timeout = kwargs["timeout"]
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        budget = {REQUEST_TIMEOUT_HEADER: f"{read_timeout:.3f}"} if read_timeout else {}
+        kwargs["headers"] = {**trace_headers(), **budget, **(kwargs.get("headers") or {})}
+        return self.session.post(self.url(path), json=payload, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_gateway() -> AIGatewayClient:
+    """Returns the gateway client created by create_app for the current app."""
+    return current_app.extensions["ai_gateway"]
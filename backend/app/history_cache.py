@@ -0,0 +1,244 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class LRUBackend:
+    """In-process LRU with per-entry TTL. Bounded by max_entries, thread-safe."""
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: int):
+        with self._lock:
+            self._store(key, value, time.monotonic() + ttl)
+
+    def add(self, key: str, value: dict, ttl: int) -> bool:
+        """Stores value unless the key already holds a live entry."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] >= now:
+                return False
+            self._store(key, value, now + ttl)
+            return True
+
+    def replace(self, key: str, version: Optional[str], value: dict, ttl: int) -> bool:
+        """Stores value if the live entry is still at `version`, otherwise drops the entry."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] >= now and item[1].get("version") == version:
+                self._store(key, value, now + ttl)
+                return True
+            self._data.pop(key, None)
+            return False
+
+    def _store(self, key: str, value: dict, expires_at: float):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class NullBackend:
+    """Stores nothing, so every lookup goes to the database."""
+
+    def get(self, key: str) -> Optional[dict]:
+        return None
+
+    def set(self, key: str, value: dict, ttl: int):
+        pass
+
+    def add(self, key: str, value: dict, ttl: int) -> bool:
+        return False
+
+    def replace(self, key: str, version: Optional[str], value: dict, ttl: int) -> bool:
+        return False
+
+    def delete(self, key: str):
+        pass
+
+    def clear(self):
+        pass
+
+
+class RedisBackend:
+    """Shared Redis tier. Entries are JSON strings with a TTL; eviction beyond that
+    is left to the server's maxmemory policy. Redis errors are treated as misses."""
+
+    def __init__(self, url: str, prefix: str = "tena:history:"):
+        import redis
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._errors = redis.RedisError
+        self._conflict = redis.WatchError
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = self._redis.get(self.prefix + key)
+        except self._errors:
+            logger.warning("History cache read failed, falling back to database", exc_info=True)
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: dict, ttl: int):
+        try:
+            self._redis.set(self.prefix + key, json.dumps(value), ex=ttl)
+        except self._errors:
+            logger.warning("History cache write failed", exc_info=True)
+
+    def add(self, key: str, value: dict, ttl: int) -> bool:
+        try:
+            return bool(self._redis.set(self.prefix + key, json.dumps(value), ex=ttl, nx=True))
+        except self._errors:
+            logger.warning("History cache write failed", exc_info=True)
+            return False
+
+    def replace(self, key: str, version: Optional[str], value: dict, ttl: int) -> bool:
+        # Optimistic transaction: EXEC fails if the key changed after WATCH
+        name = self.prefix + key
+        try:
+            with self._redis.pipeline() as pipe:
+                pipe.watch(name)
+                raw = pipe.get(name)
+                if raw and json.loads(raw).get("version") == version:
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value), ex=ttl)
+                    pipe.execute()
+                    return True
+        except self._conflict:
+            pass
+        except self._errors:
+            logger.warning("History cache write failed", exc_info=True)
+        self.delete(key)
+        return False
+
+    def delete(self, key: str):
+        try:
+            self._redis.delete(self.prefix + key)
+        except self._errors:
+            logger.warning("History cache delete failed", exc_info=True)
+
+    def clear(self):
+        try:
+            for key in self._redis.scan_iter(match=self.prefix + "*", count=500):
+                self._redis.delete(key)
+        except self._errors:
+            logger.warning("History cache clear failed", exc_info=True)
+
+
+class HistoryCache:
+    """Write-through cache of the hot state of active chat sessions, keyed by session_uuid.
+
+    An entry holds what a chat turn needs without touching the database:
+    { chat_id, summary, summary_until_id, messages, active_on } where messages are the
+    newest `max_messages` formatted turns ({role, content}) after summary_until_id, oldest
+    first, and active_on is the last UTC day a turn was counted for the admin metrics.
+    Entries are only created from a full database read and every turn is written
+    through, so a hit is authoritative as long as every process sees the same
+    entries: Redis, or the in-process LRU when there is a single worker process.
+    Each write gets a new `version`; a turn is appended only if the entry is still at
+    the version the request read, otherwise (a concurrent turn in the same session,
+    or a summary invalidating it) the entry is dropped and reloaded on the next turn.
+    With several workers and no Redis, another worker's turns (or summaries) would
+    be missing from this worker's entry, so `auto` turns the cache off instead.
+    """
+
+    def __init__(self, backend, max_messages: int = 50, ttl: int = 1800):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.ttl = ttl
+
+    @classmethod
+    def from_config(cls, config) -> "HistoryCache":
+        backend = None
+        choice = config.get("HISTORY_CACHE_BACKEND", "auto")
+        redis_url = config.get("REDIS_URL")
+        workers = config.get("WEB_WORKERS", 1)
+        if choice in ("auto", "redis") and redis_url:
+            try:
+                backend = RedisBackend(redis_url)
+            except ImportError:
+                logger.warning("redis package not installed; falling back from the shared history cache")
+        if backend is None:
+            if choice == "memory" or (choice in ("auto", "redis") and workers <= 1):
+                if workers > 1:
+                    logger.warning("In-process history cache with %d worker processes may serve stale history", workers)
+                backend = LRUBackend(config.get("HISTORY_CACHE_MAX_SESSIONS", 2000))
+            else:
+                if choice != "off":
+                    logger.info("History cache off: %d worker processes and no Redis to share it", workers)
+                backend = NullBackend()
+        return cls(
+            backend,
+            max_messages=config.get("CONTEXT_MAX_MESSAGES", 50),
+            ttl=config.get("HISTORY_CACHE_TTL", 1800),
+        )
+
+    def get(self, session_uuid: str) -> Optional[dict]:
+        return self.backend.get(session_uuid)
+
+    def put(self, session_uuid: str, chat_id: int, summary: Optional[str],
+            summary_until_id: Optional[int], messages: List[dict],
+            active_on: Optional[str] = None) -> dict:
+        """Caches a session read from the database, unless another request already
+        has. Returns the entry either way, to be passed back to append()."""
+        entry = {
+            "chat_id": chat_id,
+            "summary": summary,
+            "summary_until_id": summary_until_id,
+            "messages": messages[-self.max_messages:],
+            "active_on": active_on,
+            "version": uuid.uuid4().hex,
+        }
+        self.backend.add(session_uuid, entry, self.ttl)
+        return entry
+
+    def append(self, session_uuid: str, entry: dict, turns: List[dict],
+               active_on: Optional[str] = None) -> bool:
+        """Adds turns to the entry returned by get() or put(). Returns False (and drops
+        the cached entry) if it changed in the meantime."""
+        updated = dict(entry, messages=(entry["messages"] + turns)[-self.max_messages:],
+                       active_on=active_on, version=uuid.uuid4().hex)
+        return self.backend.replace(session_uuid, entry.get("version"), updated, self.ttl)
+
+    def invalidate(self, session_uuid: str):
+        self.backend.delete(session_uuid)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def get_history_cache() -> HistoryCache:
+    """Returns the history cache created by create_app for the current app."""
+    return current_app.extensions["history_cache"]
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no intent; ignored when scoring how much of a message a FAQ explains
+STOPWORDS = frozenset("""
+a an the i me my we our you your he she it they them to of in on at for by with from and or
+is are was were be been am do does did can could should would will shall may might must
+how what where when who which why there here this that these those please hi hello hey
+""".split())
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Lowercases, strips accents and punctuation, and collapses whitespace."""
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+class AhoCorasick:
+    """Multi-pattern matcher over normalized text, built once per knowledge file load.
+
+    Matching is a single left-to-right pass regardless of the number of patterns;
+    hits are only reported on word boundaries.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, object]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, object]]] = [[]]
+
+        for pattern, value in patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(pattern), value))
+
+        # Breadth-first pass to link each node to its longest proper suffix
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str):
+        """Yields (start, end, value) for every whole-word pattern occurrence in text."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                start, end = i - length + 1, i + 1
+                if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " "):
+                    yield start, end, value
+
+
+def format_helplines(helplines: List[dict]) -> str:
+    """Plain-text numbered list of helplines, e.g. "1. Police Service: 191"."""
+    return "\n".join(f"{i}. {line['name']}: {line['number']}" for i, line in enumerate(helplines, 1))
+
+
+class FaqMatch:
+    __slots__ = ("faq_id", "answer", "score", "language")
+
+    def __init__(self, faq_id: str, answer: str, score: float, language: str):
+        self.faq_id = faq_id
+        self.answer = answer
+        self.score = score
+        self.language = language
+
+
+class KnowledgeBase:
+    """rights_data.json loaded into memory, with a precompiled FAQ index.
+
+    FAQ entries look like:
+        {"id": "report-abuse", "keyword": "report",
+         "patterns": ["how do i report abuse", "report abuse"],
+         "aliases": {"fr": ["signaler un abus"]},
+         "answer": "...", "answers": {"fr": "..."}}
+    `keyword`, `patterns` and each language's `aliases` all become index patterns.
+    The file is re-read when its modification time changes.
+    """
+
+    def __init__(self, path: str, min_coverage: float = 0.6, max_words: int = 12,
+                 reload_interval: float = 5.0):
+        self.path = path
+        self.min_coverage = min_coverage
+        self.max_words = max_words
+        self.reload_interval = reload_interval
+        self.rights: List[dict] = []
+        self.faqs: List[dict] = []
+        self.helplines: List[dict] = []
+        self._index: Optional[AhoCorasick] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    @classmethod
+    def from_config(cls, config) -> "KnowledgeBase":
+        return cls(
+            config["KNOWLEDGE_FILE"],
+            min_coverage=config.get("FAQ_MIN_COVERAGE", 0.6),
+            max_words=config.get("FAQ_MAX_WORDS", 12),
+            reload_interval=config.get("KNOWLEDGE_RELOAD_INTERVAL", 5.0),
+        )
+
+    def reload(self):
+        """(Re)reads the knowledge file and rebuilds the FAQ index."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            logger.exception("Could not load knowledge file %s; keeping previous data", self.path)
+            if self._mtime is None:
+                self._mtime = 0.0
+                self._index = AhoCorasick([])
+            return
+
+        faqs = data.get("faqs", [])
+        patterns = []
+        for position, faq in enumerate(faqs):
+            faq_id = faq.get("id") or faq.get("keyword") or str(position)
+            variants = [("en", p) for p in [faq.get("keyword")] + faq.get("patterns", []) if p]
+            for language, aliases in faq.get("aliases", {}).items():
+                variants.extend((language, alias) for alias in aliases)
+            for language, variant in variants:
+                normalized = normalize(variant)
+                if normalized:
+                    patterns.append((normalized, (position, faq_id, language)))
+
+        self.rights = data.get("rights", [])
+        self.faqs = faqs
+        self.helplines = data.get("helplines", [])
+        self._index = AhoCorasick(patterns)
+        self._mtime = mtime
+        logger.info("Loaded knowledge file %s: %d FAQs, %d index patterns", self.path, len(faqs), len(patterns))
+
+    def maybe_reload(self):
+        """Re-reads the file if it changed; stat() is throttled to reload_interval."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                changed = os.path.getmtime(self.path) != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+
+    def match_faq(self, message: str, min_coverage: Optional[float] = None,
+                  max_words: Optional[int] = None) -> Optional[FaqMatch]:
+        """Returns the FAQ that confidently answers `message`, or None.
+
+        Confidence is the share of the message's content words (non-stopwords) covered
+        by one FAQ's matched patterns; long messages always go to the model.
+        `min_coverage` and `max_words` override the configured thresholds.
+        """
+        self.maybe_reload()
+        min_coverage = self.min_coverage if min_coverage is None else min_coverage
+        max_words = self.max_words if max_words is None else max_words
+        text = normalize(message)
+        words = text.split()
+        if not words or len(words) > max_words:
+            return None
+
+        content_words = [w for w in words if w not in STOPWORDS] or words
+        covered: Dict[int, set] = {}
+        languages: Dict[int, str] = {}
+        for start, end, (position, faq_id, language) in self._index.find(text):
+            covered.setdefault(position, set()).update(text[start:end].split())
+            if language != "en" or position not in languages:
+                languages[position] = language
+
+        best = None
+        for position, matched in covered.items():
+            score = sum(1 for w in content_words if w in matched) / len(content_words)
+            if score >= min_coverage and (best is None or score > best[1]):
+                best = (position, score)
+        if best is None:
+            return None
+
+        position, score = best
+        faq = self.faqs[position]
+        language = languages[position]
+        answer = faq.get("answers", {}).get(language) or faq["answer"]
+        return FaqMatch(faq.get("id") or faq.get("keyword") or str(position), answer, score, language)
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Returns the knowledge base loaded by create_app for the current app."""
+    return current_app.extensions["knowledge"]
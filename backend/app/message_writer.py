@@ -0,0 +1,188 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+from flask import current_app
+from sqlalchemy.exc import DataError, IntegrityError
+from app.models import Message, db
+from app.stats import record_turn
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MessageWriter:
+    """Write-behind persistence for chat messages.
+
+    Request threads hand finished turns to a bounded in-process queue and return
+    immediately; a single flusher thread drains it and bulk-inserts the rows in one
+    transaction per batch (together with the matching admin metrics counters).
+
+    Durability controls:
+      - a batch is written once it holds `batch_size` rows or `max_delay` seconds
+        after its first turn was queued, whichever comes first;
+      - the queue is drained on interpreter shutdown (atexit) and by flush();
+      - when the queue is full, submit() returns False and the caller persists the
+        turn synchronously instead.
+    Turns still queued when the process is killed without a clean shutdown are lost.
+    """
+
+    def __init__(self, app, enabled: bool = False, max_queue: int = 10000,
+                 batch_size: int = 500, max_delay: float = 0.2, max_retries: int = 3):
+        self.app = app
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._active_on = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app) -> "MessageWriter":
+        config = app.config
+        writer = cls(
+            app,
+            enabled=config.get("MESSAGE_WRITE_BEHIND", False),
+            max_queue=config.get("MESSAGE_QUEUE_SIZE", 10000),
+            batch_size=config.get("MESSAGE_FLUSH_BATCH", 500),
+            max_delay=config.get("MESSAGE_FLUSH_INTERVAL", 0.2),
+        )
+        if writer.enabled:
+            atexit.register(writer.close)
+        return writer
+
+    def _ensure_started(self):
+        # Started lazily (and again after a fork) so each worker process owns its thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, chat_id: int, user_message: str, reply: str, flag: Optional[str] = None) -> bool:
+        """Queues a user/bot message pair (`flag` marks the user message). Returns False
+        if the caller must write it itself."""
+        if not self.enabled:
+            return False
+        self._ensure_started()
+        now = datetime.utcnow()
+        rows = [
+            {"chat_id": chat_id, "sender": "user", "content": user_message, "timestamp": now, "flag": flag},
+            {"chat_id": chat_id, "sender": "bot", "content": reply, "timestamp": now, "flag": None},
+        ]
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.rejected += 1
+            logger.warning("Message write-behind queue full; persisting synchronously")
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            batch, stop = [item], False
+            rows = len(item)
+            deadline = time.monotonic() + self.max_delay
+            while rows < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                rows += len(item)
+
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                return
+
+    def _write(self, turns: List[List[dict]]):
+        """Inserts the turns' rows in one transaction, retrying transient failures.
+
+        A row the database rejects (its session was deleted meanwhile, content too
+        long for the column) would fail every turn in the batch, so the batch is
+        split in halves until the offending turns are isolated; only they are dropped.
+        """
+        rows = [row for turn in turns for row in turn]
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with self.app.app_context():
+                    db.session.execute(db.insert(Message), rows)
+                    for chat_id, count in Counter(row["chat_id"] for row in rows).items():
+                        self._active_on[chat_id] = record_turn(chat_id, count, self._active_on.get(chat_id))
+                    db.session.commit()
+                self.written += len(rows)
+                self.batches += 1
+                if len(self._active_on) > 50000:
+                    self._active_on.clear()
+                return
+            except (IntegrityError, DataError):
+                if len(turns) > 1:
+                    middle = len(turns) // 2
+                    self._write(turns[:middle])
+                    self._write(turns[middle:])
+                    return
+                logger.exception("Dropped a queued turn for chat %s rejected by the database", rows[0]["chat_id"])
+                self.dropped += len(rows)
+                return
+            except Exception:
+                logger.exception("Failed to flush %d queued messages (attempt %d/%d)",
+                                 len(rows), attempt, self.max_retries)
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+        self.dropped += len(rows)
+        logger.error("Dropped %d queued messages after %d failed flushes", len(rows), self.max_retries)
+
+    def flush(self):
+        """Blocks until every turn queued so far has been written (or dropped)."""
+        if self.enabled and self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Drains the queue and stops the flusher thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=30)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
+
+
+def get_message_writer() -> MessageWriter:
+    """Returns the message writer created by create_app for the current app."""
+    return current_app.extensions["message_writer"]
@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+from flask import Response, abort, current_app, g, has_app_context, has_request_context, request
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.exposition import choose_encoder
+from sqlalchemy import event
+from app.models import db
+
+logger = logging.getLogger(__name__)
+
+# Correlates a chat turn across the gateway and the AI service (see services.py)
+TRACE_HEADER = "X-Trace-Id"
+_VALID_TRACE_ID = re.compile(r"[A-Za-z0-9._-]{8,64}\Z")
+
+# Seconds; chat turns wait seconds on the model, everything else should take milliseconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+
+
+def _multiprocess_dir() -> Optional[str]:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+
+class GatewayMetrics:
+    """Prometheus metrics for the gateway, served on /metrics.
+
+    Every request is counted by endpoint (the URL rule, so ids don't explode the
+    label space), method and status, timed, and its SQL statements counted.
+    Hot paths time their stages with `stage()`: the chat turn is split into
+    crisis check, FAQ lookup, session lookup, history query, the AI service hop
+    and the commits. Each request also gets a trace ID (the caller's X-Trace-Id
+    when valid, else a new one), which is echoed in the response, forwarded to
+    the AI service and attached to latency observations as an exemplar; requests
+    slower than `slow_request_ms` are logged with their stage breakdown.
+
+    Under gunicorn each worker has its own counters; set PROMETHEUS_MULTIPROC_DIR
+    so /metrics aggregates all workers (gunicorn.conf.py clears it on start).
+    """
+
+    def __init__(self, enabled: bool = True, token: Optional[str] = None, slow_request_ms: float = 5000):
+        self.enabled = enabled
+        self.token = token
+        self.slow_request_ms = slow_request_ms
+        self.registry = CollectorRegistry(auto_describe=True)
+        self.requests = Counter(
+            "tena_gateway_requests_total", "HTTP requests handled",
+            ["endpoint", "method", "status"], registry=self.registry)
+        self.latency = Histogram(
+            "tena_gateway_request_duration_seconds", "Time to handle a request, including streamed bodies",
+            ["endpoint"], buckets=LATENCY_BUCKETS, registry=self.registry)
+        self.in_flight = Gauge(
+            "tena_gateway_requests_in_flight", "Requests being handled",
+            multiprocess_mode="livesum", registry=self.registry)
+        self.stage_latency = Histogram(
+            "tena_gateway_stage_duration_seconds", "Time spent in one stage of a request",
+            ["stage"], buckets=STAGE_BUCKETS, registry=self.registry)
+        self.db_queries = Histogram(
+            "tena_gateway_db_queries_per_request", "SQL statements executed per request",
+            ["endpoint"], buckets=QUERY_COUNT_BUCKETS, registry=self.registry)
+
+    @classmethod
+    def from_config(cls, config) -> "GatewayMetrics":
+        return cls(
+            enabled=config.get("METRICS_ENABLED", True),
+            token=config.get("METRICS_TOKEN"),
+            slow_request_ms=config.get("SLOW_REQUEST_LOG_MS", 5000),
+        )
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if self.enabled:
+            app.add_url_rule("/metrics", "metrics", self.metrics_view)
+            with app.app_context():
+                event.listen(db.engine, "before_cursor_execute", _count_query)
+
+    def _before_request(self):
+        incoming = request.headers.get(TRACE_HEADER, "")
+        g.trace_id = incoming if _VALID_TRACE_ID.match(incoming) else uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+        g.stage_seconds = {}
+        g.db_queries = 0
+        if self.enabled:
+            self.in_flight.inc()
+
+    def _after_request(self, response):
+        response.headers[TRACE_HEADER] = g.trace_id
+        g.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        # Runs once the response body is sent, so streamed chats are timed to their last frame
+        started = g.pop("request_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        status = 500 if exc is not None else g.get("status", 500)
+        if self.enabled:
+            self.in_flight.dec()
+            self.requests.labels(endpoint, request.method, str(status)).inc()
+            self.latency.labels(endpoint).observe(elapsed, exemplar={"trace_id": g.trace_id})
+            self.db_queries.labels(endpoint).observe(g.db_queries)
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            stages = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in g.stage_seconds.items())
+            logger.warning("Slow request %s %s -> %s in %.0fms (trace %s, %d queries) %s",
+                           request.method, endpoint, status, elapsed * 1000, g.trace_id, g.db_queries, stages)
+
+    def observe_stage(self, name: str, seconds: float):
+        if self.enabled:
+            self.stage_latency.labels(name).observe(seconds)
+        if has_request_context() and "stage_seconds" in g:
+            g.stage_seconds[name] = g.stage_seconds.get(name, 0.0) + seconds
+
+    def metrics_view(self):
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+            abort(401)
+        registry = self.registry
+        if _multiprocess_dir():
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        encoder, content_type = choose_encoder(request.headers.get("Accept"))
+        return Response(encoder(registry), content_type=content_type)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "db_queries" in g:
+        g.db_queries += 1
+
+
+def get_metrics() -> GatewayMetrics:
+    """Returns the metrics created by create_app for the current app."""
+    return current_app.extensions["metrics"]
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block as one stage of the current request: `with stage("history_query"): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics().observe_stage(name, time.perf_counter() - started)
+
+
+def trace_headers() -> dict:
+    """The current request's trace ID as a header for calls to the AI service."""
+    trace_id = g.get("trace_id") if has_app_context() else None
+    return {TRACE_HEADER: trace_id} if trace_id else {}
@@ -1,29 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from sqlalchemy import Integer, String, Text, DateTime, Column, ForeignKey
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import Integer, BigInteger, SmallInteger, String, Text, Date, DateTime, Column, ForeignKey
 from sqlalchemy.orm import relationship
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
-import secrets
+from app.passwords import get_password_hasher
 
 db = SQLAlchemy()
 
-RESET_TOKEN_LIFESPAN = timedelta(hours=1)
-
 class User(db.Model, UserMixin):
    __tablename__ = "user"
    user_id = db.Column(db.Integer, primary_key=True) 
    user_name = db.Column(db.String(128), nullable=False)
    email = db.Column(db.String(128), nullable=False, index=True, unique=True)
    password_hash = db.Column(db.String(128), nullable=False)
-   created_at = db.Column(db.DateTime, default=datetime.utcnow())
+   created_at = db.Column(db.DateTime, default=datetime.utcnow)
    
    is_admin = db.Column(db.Boolean, default=False)
    chat_sessions = db.relationship('ChatSession', backref='user', lazy='dynamic')
-    
-   reset_token = db.Column(db.String(128), nullable=True) 
-   reset_token_expiration = db.Column(db.DateTime, nullable=True)
    
    def __repr__(self):
       return f"<User {self.email}>" 
@@ -32,34 +26,18 @@ class User(db.Model, UserMixin):
       return str(self.user_id)
    
    def set_password(self, password):
-      self.password_hash = generate_password_hash(password)
+      self.password_hash = get_password_hasher().hash(password)
       
    def check_password(self, password):
-      return check_password_hash(self.password_hash, password)   
-      
-   def generate_reset_token(self):
-      """Generates a secure token and sets its issuance time."""
-      self.reset_token = secrets.token_hex(32)
-      self.reset_token_expiration = datetime.utcnow() + RESET_TOKEN_LIFESPAN
-      return self.reset_token
-
-   def is_reset_token_valid(self):
-      """Checks if the stored token is still within the expiration window."""
-      if self.reset_token and self.reset_token_expiration:
-         return datetime.utcnow() < self.reset_token_expiration
-      return False
-  
-   def check_reset_token(self, token):
-      """Combines token match and expiration check."""
-      return (
-         self.reset_token == token and 
-         self.is_reset_token_valid()
-      )
-    
-   def clear_reset_token(self):
-      """Clear the token fields after a successful reset or failure."""
-      self.reset_token = None
-      self.reset_token_expiration = None
+      """Verifies the password; an outdated hash (werkzeug format or another bcrypt
+      cost) is replaced with a fresh one, which the caller commits."""
+      hasher = get_password_hasher()
+      if not hasher.verify(self.password_hash, password):
+         return False
+      if hasher.needs_rehash(self.password_hash):
+         self.password_hash = hasher.hash(password)
+         hasher.rehashed += 1
+      return True
    
     
 class ChatSession(db.Model):  
@@ -68,6 +46,13 @@ class ChatSession(db.Model):
    user_id = Column(Integer, ForeignKey('user.user_id'), nullable=True, index=True) # Link to User
    session_uuid = Column(String(128), unique=True, nullable=False) 
    created_at = Column(DateTime, default=datetime.utcnow)
+   
+   # Rolling summary of older turns, covering messages up to summary_until_id (inclusive)
+   summary = Column(Text, nullable=True)
+   summary_until_id = Column(Integer, nullable=True)
+   
+   # UTC day of the last message, used to count active sessions per day
+   last_active_date = Column(Date, nullable=True)
  
    messages = relationship('Message', backref="session", lazy='dynamic')
     
@@ -76,12 +61,59 @@ class ChatSession(db.Model):
  
 class Message(db.Model):
    __tablename__ = "message"
+   __table_args__ = (
+      # Serves per-session history reads and keyset pagination in one index range scan
+      db.Index("ix_message_chat_id_timestamp_id", "chat_id", "timestamp", "message_id"),
+      # Partial index: only flagged messages, newest first, for the admin follow-up queue
+      db.Index("ix_message_flagged", "message_id",
+               postgresql_where=db.text("flag IS NOT NULL"), sqlite_where=db.text("flag IS NOT NULL")),
+   )
    message_id = Column(Integer, primary_key=True)  
    # Integer PK as the Foreign Key for efficiency
    chat_id = Column(Integer, ForeignKey('chat_session.chat_id'), nullable=False, index=True) 
    sender = Column(String(10)) # 'user' or 'bot'
    content = Column(Text, nullable=False)
    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+   # Set on user messages that need human follow-up, e.g. the crisis category 'self_harm'
+   flag = Column(String(32), nullable=True)
     
    def __repr__(self):
-      return f"<Message {self.message_id} from {self.sender}>"
\ No newline at end of file
+      return f"<Message {self.message_id} from {self.sender}>"
+
+
+class StatTotal(db.Model):
+   """Running totals maintained by app/stats.py. Each metric is split across a few
+   shards so concurrent writers don't contend on a single row; readers sum them."""
+   __tablename__ = "stat_total"
+   metric = Column(String(32), primary_key=True)
+   shard = Column(SmallInteger, primary_key=True)
+   value = Column(BigInteger, nullable=False, default=0)
+
+   def __repr__(self):
+      return f"<StatTotal {self.metric}[{self.shard}]={self.value}>"
+
+
+class StatDaily(db.Model):
+   """Per-day (UTC) rollups maintained by app/stats.py, sharded like StatTotal."""
+   __tablename__ = "stat_daily"
+   metric = Column(String(32), primary_key=True)
+   day = Column(Date, primary_key=True)
+   shard = Column(SmallInteger, primary_key=True)
+   value = Column(BigInteger, nullable=False, default=0)
+
+   def __repr__(self):
+      return f"<StatDaily {self.metric} {self.day}[{self.shard}]={self.value}>"
+
+
+class PasswordResetToken(db.Model):
+   """Outstanding password reset links, managed by app/reset_tokens.py. Only a
+   SHA-256 of the token is stored; it is the primary key, so redeeming a token
+   is a single index probe."""
+   __tablename__ = "password_reset_token"
+   token_hash = Column(String(64), primary_key=True)
+   user_id = Column(Integer, ForeignKey('user.user_id', ondelete='CASCADE'), nullable=False, index=True)
+   expires_at = Column(DateTime, nullable=False, index=True)
+   created_at = Column(DateTime, default=datetime.utcnow)
+
+   def __repr__(self):
+      return f"<PasswordResetToken user={self.user_id} expires={self.expires_at}>"
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+import bcrypt
+from flask import current_app
+from werkzeug.security import check_password_hash
+
+logger = logging.getLogger(__name__)
+
+# bcrypt only reads the first 72 bytes of a password; older bcrypt releases truncated
+# silently and current ones raise, so truncate explicitly to keep existing hashes valid
+BCRYPT_MAX_BYTES = 72
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when a hash can't start within the queue timeout."""
+
+
+def _native_thread_pool(workers: int):
+    """A pool of real OS threads under gevent, where monkey-patched threads would
+    just be greenlets sharing the worker's one thread."""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched("threading"):
+            from gevent.threadpool import ThreadPool
+            return ThreadPool(workers)
+    except ImportError:
+        pass
+    return None
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a small per-process thread pool.
+
+    A bcrypt hash costs hundreds of milliseconds of CPU by design. Run inline it
+    stalls a sync worker for that long and, with gevent workers, every greenlet
+    in the process. Here it runs on `workers` native threads (bcrypt releases the
+    GIL), so a burst of logins is capped at that much CPU per process while chat
+    requests keep being served. Callers beyond `max_pending` in flight, or still
+    waiting after `timeout` seconds, get PasswordHasherBusy.
+
+    New hashes use bcrypt at `rounds`. Verification also accepts werkzeug hashes
+    ("scrypt:..." / "pbkdf2:..."), which the password reset flow used to write;
+    needs_rehash() flags those and bcrypt hashes of a different cost so login
+    can upgrade them.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 2, max_pending: int = 64, timeout: float = 10.0):
+        self.rounds = rounds
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rehashed = 0
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._gevent = False
+        self._hash_seconds = 0.0
+        self._hash_count = 0
+
+    @classmethod
+    def from_config(cls, config) -> "PasswordHasher":
+        return cls(
+            rounds=config.get("BCRYPT_LOG_ROUNDS", 12),
+            workers=config.get("PASSWORD_HASH_WORKERS", 2),
+            max_pending=config.get("PASSWORD_HASH_MAX_PENDING", 64),
+            timeout=config.get("PASSWORD_HASH_TIMEOUT", 10.0),
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy("too many password hashes in flight")
+            self._pending += 1
+            if self._pool is None:
+                # Created on first use so each forked worker gets its own threads
+                self._pool = _native_thread_pool(self.workers)
+                self._gevent = self._pool is not None
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        try:
+            if self._gevent:
+                from gevent import Timeout
+                try:
+                    return self._pool.spawn(fn, *args).get(timeout=self.timeout)
+                except Timeout:
+                    pass
+            else:
+                try:
+                    return self._pool.submit(fn, *args).result(timeout=self.timeout)
+                except FutureTimeout:
+                    pass
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("password hashing timed out")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _hash(self, password: bytes) -> str:
+        started = time.perf_counter()
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=self.rounds)).decode("ascii")
+        with self._lock:
+            self._hash_seconds += time.perf_counter() - started
+            self._hash_count += 1
+        return hashed
+
+    def hash(self, password: str) -> str:
+        """A new bcrypt hash of `password` at the configured cost."""
+        return self._run(self._hash, password.encode("utf-8")[:BCRYPT_MAX_BYTES])
+
+    def verify(self, stored_hash: Optional[str], password: str) -> bool:
+        """Checks `password` against a bcrypt or werkzeug hash."""
+        if not stored_hash:
+            return False
+        if stored_hash.startswith("$2"):
+            secret = password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+            try:
+                return self._run(bcrypt.checkpw, secret, stored_hash.encode("ascii"))
+            except ValueError:
+                logger.warning("Malformed bcrypt hash")
+                return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash: Optional[str]) -> bool:
+        """Whether a verified hash should be replaced: not bcrypt, or another cost."""
+        if not stored_hash or not stored_hash.startswith("$2"):
+            return True
+        try:
+            return int(stored_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            mean_ms = self._hash_seconds / self._hash_count * 1000 if self._hash_count else None
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "pending": self._pending,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "mean_hash_ms": round(mean_ms, 1) if mean_ms is not None else None,
+            }
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Returns the password hasher created by create_app for the current app."""
+    return current_app.extensions["password_hasher"]
@@ -0,0 +1,215 @@
+import math
+import time
+import logging
+import threading
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+from flask import current_app, has_request_context, jsonify, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+# (requests allowed, period in seconds)
+Limit = Tuple[int, float]
+# A client key with the windows that apply to it
+Rule = Tuple[str, List[Limit]]
+
+
+def parse_limits(per_minute: int, per_hour: int) -> List[Limit]:
+    """Minute and hour windows; a value of 0 disables that window."""
+    return [(count, period) for count, period in ((per_minute, 60.0), (per_hour, 3600.0)) if count > 0]
+
+
+class MemoryLimiter:
+    """Per-process GCRA (generic cell rate algorithm) limiter, thread-safe.
+
+    State is one float per key and window, the key's theoretical arrival time
+    (TAT). A request is allowed when admitting it keeps the TAT no more than
+    `period` ahead of now, which enforces `count` requests per sliding `period`
+    without storing timestamps. Keys whose TAT has passed hold no information
+    and are swept every `sweep_interval` seconds.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._tats: Dict[str, float] = {}
+        self._swept_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def hit(self, rules: List[Rule]) -> float:
+        """Counts one request against every key/window. Returns 0 if allowed, else the
+        seconds until it would be; a rejected request consumes nothing."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at >= self.sweep_interval:
+                self._tats = {slot: tat for slot, tat in self._tats.items() if tat > now}
+                self._swept_at = now
+            updates, wait = [], 0.0
+            for key, limits in rules:
+                for count, period in limits:
+                    slot = f"{key}:{int(period)}"
+                    tat = max(self._tats.get(slot, now), now) + period / count
+                    wait = max(wait, tat - now - period)
+                    updates.append((slot, tat))
+            if wait > 0:
+                return wait
+            self._tats.update(updates)
+            return 0.0
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "tracked": len(self._tats)}
+
+
+# Same algorithm as MemoryLimiter, applied atomically to every key in one round trip.
+# ARGV: now, then interval and period for each key. The wait is returned as a
+# string because Lua numbers are truncated to integers on the way back.
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tats, wait = {}, 0
+for i = 1, #KEYS do
+  local interval, period = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+  local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+  if tat < now then tat = now end
+  tats[i] = tat + interval
+  wait = math.max(wait, tats[i] - now - period)
+end
+if wait > 0 then return tostring(wait) end
+for i = 1, #KEYS do
+  redis.call('SET', KEYS[i], tostring(tats[i]), 'PX', math.ceil(tonumber(ARGV[2 * i + 1]) * 1000))
+end
+return '0'
+"""
+
+
+class RedisLimiter:
+    """Limits shared by every worker and instance. Keys expire with their window;
+    Redis errors fail open so an outage never blocks chat."""
+
+    def __init__(self, url: str, prefix: str = "tena:gateway:ratelimit:"):
+        import redis
+        self.prefix = prefix
+        self.errors = 0
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._redis.register_script(_GCRA_SCRIPT)
+
+    def hit(self, rules: List[Rule]) -> float:
+        slots, argv = [], [time.time()]
+        for key, limits in rules:
+            for count, period in limits:
+                slots.append(f"{self.prefix}{key}:{int(period)}")
+                argv += [period / count, period]
+        try:
+            return float(self._script(keys=slots, args=argv))
+        except Exception:
+            self.errors += 1
+            logger.warning("Rate limiter check failed, allowing request", exc_info=True)
+            return 0.0
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "errors": self.errors}
+
+
+class RateLimiter:
+    """Applies the minute/hour windows to a request's client IP, chat session and user."""
+
+    def __init__(self, backend, limits: List[Limit], ip_limits: Optional[List[Limit]] = None,
+                 enabled: bool = True, trusted_proxies: int = 0):
+        self.backend = backend
+        self.limits = limits
+        self.ip_limits = ip_limits if ip_limits is not None else limits
+        self.enabled = enabled and bool(limits or self.ip_limits)
+        self.trusted_proxies = trusted_proxies
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, config) -> "RateLimiter":
+        backend = None
+        redis_url = config.get("REDIS_URL")
+        if config.get("RATE_LIMIT_BACKEND", "auto") in ("auto", "redis") and redis_url:
+            try:
+                backend = RedisLimiter(redis_url)
+            except ImportError:
+                logger.warning("redis package not installed; using in-process rate limiter")
+        if backend is None:
+            backend = MemoryLimiter()
+        return cls(
+            backend,
+            limits=parse_limits(config.get("RATE_LIMIT_MINUTE", 60), config.get("RATE_LIMIT_HOUR", 1000)),
+            ip_limits=parse_limits(config.get("RATE_LIMIT_IP_MINUTE", 60), config.get("RATE_LIMIT_IP_HOUR", 1000)),
+            enabled=config.get("RATE_LIMIT_ENABLED", False),
+            trusted_proxies=config.get("RATE_LIMIT_TRUSTED_PROXIES", 0),
+        )
+
+    def client_ip(self) -> Optional[str]:
+        """The caller's address; with `trusted_proxies` reverse proxies in front, the
+        X-Forwarded-For entry the outermost trusted proxy appended."""
+        if self.trusted_proxies:
+            forwarded = [part.strip() for part in request.headers.get("X-Forwarded-For", "").split(",") if part.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr
+
+    def check(self, ip: Optional[str] = None, session_id: Optional[str] = None,
+              user_id: Optional[str] = None) -> float:
+        """Returns 0 if the request may proceed, else the Retry-After in seconds."""
+        rules = []
+        if ip and self.ip_limits:
+            rules.append((f"ip:{ip}", self.ip_limits))
+        if self.limits:
+            rules += [(f"{scope}:{value}", self.limits)
+                      for scope, value in (("session", session_id), ("user", user_id)) if value]
+        if not self.enabled or not rules:
+            return 0.0
+        wait = self.backend.hit(rules)
+        if wait:
+            self.rejected += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "rejected": self.rejected,
+                "limits": self.limits, "ip_limits": self.ip_limits, **self.backend.stats()}
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Returns the rate limiter created by create_app for the current app."""
+    return current_app.extensions["rate_limiter"]
+
+
+def current_user_key() -> Optional[str]:
+    return str(current_user.user_id) if current_user.is_authenticated else None
+
+
+def client_headers() -> Dict[str, str]:
+    """Identifies the end client to the AI service, which applies the same limits."""
+    if not has_request_context():
+        return {}
+    headers = {"X-Client-IP": get_rate_limiter().client_ip() or ""}
+    user_id = current_user_key()
+    if user_id:
+        headers["X-User-Id"] = user_id
+    return headers
+
+
+def too_many_requests(wait: float):
+    """The 429 response, with Retry-After rounded up to whole seconds."""
+    response = jsonify({"error": "Too many requests. Please slow down and try again shortly."})
+    response.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+    return response, 429
+
+
+def rate_limited(view):
+    """Rejects the request with 429 + Retry-After before the view does any database
+    or AI work once the client's IP, chat session (`session_id` in the JSON body)
+    or signed-in user is over its limit."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        limiter = get_rate_limiter()
+        if limiter.enabled:
+            data = request.get_json(silent=True) or {}
+            session_id = data.get("session_id") if isinstance(data, dict) else None
+            session_id = str(session_id)[:128] if session_id else None
+            wait = limiter.check(ip=limiter.client_ip(), session_id=session_id, user_id=current_user_key())
+            if wait:
+                return too_many_requests(wait)
+        return view(*args, **kwargs)
+    return wrapper
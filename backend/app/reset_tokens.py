@@ -0,0 +1,84 @@
+import hashlib
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.models import PasswordResetToken, db
+
+reset_tokens_cli = AppGroup("reset-tokens", help="Maintain password reset tokens.")
+
+# When this process last swept expired tokens (monotonic seconds)
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+def _hash(token: str) -> str:
+    # Tokens are 256 random bits, so a plain digest is enough: there is nothing to
+    # brute-force, and it keeps lookups an equality probe on the primary key
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue(user_id: int) -> str:
+    """Creates a reset token for the user, replacing any outstanding one, and
+    returns it. Only its hash is stored; the caller commits."""
+    _maybe_sweep()
+    db.session.execute(db.delete(PasswordResetToken).where(PasswordResetToken.user_id == user_id))
+    token = secrets.token_urlsafe(32)
+    lifespan = timedelta(seconds=current_app.config.get("RESET_TOKEN_LIFESPAN", 3600))
+    db.session.add(PasswordResetToken(
+        token_hash=_hash(token), user_id=user_id, expires_at=datetime.utcnow() + lifespan,
+    ))
+    return token
+
+
+def consume(token: str) -> Optional[int]:
+    """Redeems a token: returns its user_id and deletes it in the same statement,
+    so it can be used only once even by concurrent requests. None if the token
+    is unknown, used or expired. The caller commits."""
+    if not token:
+        return None
+    stmt = (
+        db.delete(PasswordResetToken)
+        .where(PasswordResetToken.token_hash == _hash(token), PasswordResetToken.expires_at > datetime.utcnow())
+        .returning(PasswordResetToken.user_id)
+    )
+    return db.session.execute(stmt).scalar()
+
+
+def _delete_expired() -> int:
+    # An index range scan on expires_at
+    result = db.session.execute(
+        db.delete(PasswordResetToken).where(PasswordResetToken.expires_at <= datetime.utcnow())
+    )
+    return result.rowcount
+
+
+def sweep() -> int:
+    """Deletes expired tokens and commits. Returns how many were removed."""
+    deleted = _delete_expired()
+    db.session.commit()
+    return deleted
+
+
+def _maybe_sweep():
+    """Sweeps from the issuing request at most every RESET_TOKEN_SWEEP_INTERVAL
+    seconds per process; expired tokens are never valid anyway, this only bounds
+    the table."""
+    global _last_sweep
+    interval = current_app.config.get("RESET_TOKEN_SWEEP_INTERVAL", 600)
+    now = time.monotonic()
+    with _sweep_lock:
+        if interval <= 0 or now - _last_sweep < interval:
+            return
+        _last_sweep = now
+    _delete_expired()
+
+
+@reset_tokens_cli.command("sweep")
+def sweep_command():
+    """Delete expired password reset tokens (for cron)."""
+    click.echo(f"Deleted {sweep()} expired reset tokens")
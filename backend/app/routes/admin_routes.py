@@ -1,9 +1,20 @@
-from flask import Blueprint, jsonify, request
-from app.models import User, ChatSession, Message, db
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
+from app.models import User, ChatSession, Message, PasswordResetToken, db
 from app.utils import admin_required
+from app.history_cache import get_history_cache
+from app import stats
+from app.message_writer import get_message_writer
+from app.gateway import get_gateway
+from app.rate_limit import get_rate_limiter
+from app.passwords import get_password_hasher
+from app.user_cache import get_user_cache
 from sqlalchemy import text
 from flask_login import login_required 
+import io
+import csv
+import json
 import logging
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -11,45 +22,224 @@ admin_bp = Blueprint("admin_api", __name__, url_prefix="/api/admin")
 
 @admin_bp.get("/metrics/system") 
 @login_required
+@admin_required
 def system_metrics():
-    """Returns application health metrics."""
+    """Returns application health metrics.
+
+    Totals come from the maintained counters in app/stats.py (a handful of rows),
+    not from counting the base tables.
+    """
     try:
-        total_users = db.session.query(User).count()
-        total_chats = db.session.query(ChatSession).count()
-        total_messages = db.session.query(Message).count()
+        totals = stats.totals()
 
         return jsonify({
-            'total_users': total_users,
-            'total_chats': total_chats,
-            'total_messages': total_messages,
+            'total_users': totals['users'],
+            'total_chats': totals['chats'],
+            'total_messages': totals['messages'],
+            'message_queue': get_message_writer().stats(),
+            'ai_breaker': get_gateway().breaker.stats(),
+            'rate_limiter': get_rate_limiter().stats(),
+            'password_hasher': get_password_hasher().stats(),
+            'user_cache': get_user_cache().stats(),
         }), 200
 
     except Exception as e:
         print(f"Error fetching system metrics: {e}")
         return jsonify({'error': 'Failed to fetch system metrics due to a server error.'}), 500
 
+@admin_bp.get("/metrics/timeseries")
+@login_required
+@admin_required
+def metrics_timeseries():
+    """
+    Returns daily rollups for a date range, served from the stat_daily table.
+
+    Query params: `start` and `end` as ISO dates (inclusive, UTC; default the last
+    30 days) and `metrics`, a comma-separated subset of stats.DAILY_METRICS
+    (default all). Days without activity are reported as 0.
+    """
+    requested = request.args.get('metrics')
+    metrics = [m.strip() for m in requested.split(',') if m.strip()] if requested else list(stats.DAILY_METRICS)
+    unknown = [m for m in metrics if m not in stats.DAILY_METRICS]
+    if unknown:
+        return jsonify({'error': f"Unknown metrics: {', '.join(unknown)}"}), 400
+
+    try:
+        start, end = stats.parse_range(
+            request.args.get('start'), request.args.get('end'),
+            max_days=current_app.config.get('STATS_MAX_RANGE_DAYS', 366),
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
+
+    try:
+        series = stats.timeseries(start, end, metrics)
+    except Exception as e:
+        logger.exception("Error fetching metrics time series")
+        return jsonify({'error': 'Failed to fetch metrics due to a server error.'}), 500
+
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days,
+        'series': series,
+    }), 200
+
+
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ('id', 'email', 'name', 'is_admin', 'created_at')
+
+
+def _user_columns():
+    """Plain column selection (no ORM hydration), ordered by the keyset column."""
+    return db.select(
+        User.user_id.label('id'), User.email, User.user_name.label('name'),
+        User.is_admin, User.created_at,
+    ).order_by(User.user_id.asc())
+
+
+def _user_row(row):
+    return {
+        'id': row.id,
+        'email': row.email,
+        'name': row.name,
+        'is_admin': bool(row.is_admin),
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+
 @admin_bp.get("/users")
 @login_required
+@admin_required
 def get_users():
-    """Returns a list of all users with non-sensitive data."""
+    """
+    Returns one page of users with non-sensitive data, in ascending id order.
+
+    Keyset pagination: `limit` (default 100, max 1000) and `after=<id>` to continue
+    from the last user of the previous page. `next_after` is null on the last page.
+    """
+    limit = min(max(request.args.get('limit', USERS_PAGE_SIZE, type=int), 1), USERS_MAX_PAGE_SIZE)
+    after = request.args.get('after', type=int)
+
     try:
-        users = User.query.all()
-        user_list = [
-            {
-                'id': user.user_id,
-                'email': user.email,
-                'name': user.user_name,
-                'is_admin': user.is_admin
-            }
-            for user in users
-        ]
-        return jsonify({'users': user_list}), 200
+        query = _user_columns()
+        if after is not None:
+            query = query.where(User.user_id > after)
+        # One extra row tells us whether another page exists
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        user_list = [_user_row(row) for row in rows[:limit]]
+        return jsonify({
+            'users': user_list,
+            'next_after': user_list[-1]['id'] if has_more else None,
+        }), 200
     
     except Exception as e:
         print(f"Error fetching user list: {e}")
         return jsonify({'error': 'Failed to fetch user list.'}), 500
 
 
+@admin_bp.get("/users/export")
+@login_required
+@admin_required
+def export_users():
+    """
+    Streams every user as NDJSON (default) or CSV (`format=csv`).
+
+    Rows are read through a server-side cursor in batches of EXPORT_BATCH_SIZE and
+    written out as they arrive, so memory stays flat regardless of table size.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv.'}), 400
+
+    def generate():
+        result = db.session.execute(
+            _user_columns().execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        try:
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+                writer.writeheader()
+                for partition in result.partitions():
+                    for row in partition:
+                        writer.writerow(_user_row(row))
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            else:
+                for partition in result.partitions():
+                    yield ''.join(json.dumps(_user_row(row)) + '\n' for row in partition)
+        finally:
+            result.close()
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"users-{datetime.utcnow():%Y%m%d}.{'csv' if export_format == 'csv' else 'ndjson'}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+FLAGGED_PAGE_SIZE = 50
+FLAGGED_MAX_PAGE_SIZE = 200
+
+
+@admin_bp.get("/messages/flagged")
+@login_required
+@admin_required
+def flagged_messages():
+    """
+    Returns user messages flagged for follow-up (e.g. crisis language), newest first.
+
+    Keyset pagination over the partial ix_message_flagged index: `limit` (default 50,
+    max 200) and `before=<message_id>` from the previous page's `next_before`.
+    Optional `flag` filters by category.
+    """
+    limit = min(max(request.args.get('limit', FLAGGED_PAGE_SIZE, type=int), 1), FLAGGED_MAX_PAGE_SIZE)
+    before = request.args.get('before', type=int)
+
+    query = (
+        db.select(Message.message_id, Message.flag, Message.content, Message.timestamp,
+                  ChatSession.session_uuid, ChatSession.user_id)
+        .join(ChatSession, ChatSession.chat_id == Message.chat_id)
+        .where(Message.flag.isnot(None))
+        .order_by(Message.message_id.desc())
+    )
+    if request.args.get('flag'):
+        query = query.where(Message.flag == request.args['flag'])
+    if before is not None:
+        query = query.where(Message.message_id < before)
+
+    try:
+        rows = db.session.execute(query.limit(limit + 1)).all()
+    except Exception:
+        logger.exception("Error fetching flagged messages")
+        return jsonify({'error': 'Failed to fetch flagged messages.'}), 500
+
+    messages = [{
+        'message_id': row.message_id,
+        'flag': row.flag,
+        'content': row.content,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+        'session_id': row.session_uuid,
+        'user_id': row.user_id,
+    } for row in rows[:limit]]
+    return jsonify({
+        'messages': messages,
+        'next_before': messages[-1]['message_id'] if len(rows) > limit else None,
+    }), 200
+
+
 @admin_bp.post("/delete-all-users")
 @login_required
 @admin_required
@@ -57,6 +247,9 @@ def delete_all_users():
     """Wipes the entire database and resets ID sequences."""
     num_deleted = 0
     try:
+        # Queued messages must land before their sessions are removed
+        get_message_writer().flush()
+
         if db.engine.driver == 'psycopg2': 
             tables = ['"user"', 'chat_session', 'message']
             
@@ -69,9 +262,10 @@ def delete_all_users():
         else: 
             # --- SQLite Logic ---
             
-            # Delete dependent data first (Messages, then ChatSessions) due to foreign keys.
+            # Delete dependent data first (Messages, then ChatSessions, reset tokens) due to foreign keys.
             db.session.query(Message).delete()
             db.session.query(ChatSession).delete()
+            db.session.query(PasswordResetToken).delete()
             
             # Delete main User data and capture count.
             num_deleted = db.session.query(User).delete()
@@ -81,7 +275,12 @@ def delete_all_users():
             db.session.execute(text('DELETE FROM sqlite_sequence WHERE name="chat_session";'))
             db.session.execute(text('DELETE FROM sqlite_sequence WHERE name="message";'))
             
+        # Counters describe the rows that were just removed
+        stats.reset()
         db.session.commit()
+        # Cached sessions now point at deleted chat rows, cached users at deleted users
+        get_history_cache().clear()
+        get_user_cache().clear()
         
         return jsonify({
             'message': 'Successfully deleted all user data, chat sessions, and messages. Database ID sequences have been reset to 1.',
@@ -1,10 +1,23 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.models import User, db
-from app import bcrypt
+from app.passwords import PasswordHasherBusy
+from app.user_cache import invalidate_user
+from app import reset_tokens
+from app.stats import record_new_user, record_user_deleted
 from flask_login import login_user, logout_user, current_user, login_required
 
 auth_bp = Blueprint("auth_api", __name__, url_prefix="/api/auth")
 
+
+@auth_bp.errorhandler(PasswordHasherBusy)
+def hasher_busy(e):
+    """Password hashing is capped per worker; when it's saturated, ask the client to retry."""
+    db.session.rollback()
+    current_app.logger.warning(f"Password hashing busy: {e}")
+    response = jsonify({'message': 'The server is busy. Please try again in a moment.'})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
 # --- Authentication & Account Management ---
 
 @auth_bp.route("/status", methods=["GET"])
@@ -34,14 +47,16 @@ def register():
     if existing_user:
         return jsonify({'message': f' A user with email {email} already exists'}), 409
     
+    new_user = User(
+        email=email, 
+        user_name=email.split('@')[0].capitalize().replace('.', '')
+    )
+    # Hashed on the password pool; PasswordHasherBusy is answered with a 503
+    new_user.set_password(password)
+
     try:
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-        new_user = User(
-            email=email, 
-            password_hash=hashed_password, 
-            user_name=email.split('@')[0].capitalize().replace('.', '')
-        )
         db.session.add(new_user)
+        record_new_user()
         db.session.commit()
         
         return jsonify({'message': 'Registration succesful'}), 201
@@ -66,8 +81,10 @@ def login():
     
         user = User.query.filter_by(email=email).first()
         
-        if user and bcrypt.check_password_hash(user.password_hash, password):
+        if user and user.check_password(password):
             login_user(user)
+            # Persists a hash check_password upgraded to the current format/cost
+            db.session.commit()
             return jsonify({'message': 'Login successful', 'email': user.email}), 200
         else:
             return jsonify({'message': 'Invalid email or password'}), 401
@@ -86,12 +103,15 @@ def logout():
 @login_required
 def delete_user():
     """Allows a logged-in user to delete their own account."""
-    user  = current_user
+    # current_user is a cached snapshot; deleting needs the row itself
+    user = db.session.get(User, current_user.user_id)
     if not user:
-        return jsonify({"message": f"User {user} not found"}), 400
+        return jsonify({"message": f"User {current_user.user_id} not found"}), 400
     
     db.session.delete(user)
+    record_user_deleted()
     db.session.commit()
+    invalidate_user(user.user_id)
     logout_user()
     return jsonify({"message": "Account deleted successfully"}), 200
 
@@ -106,7 +126,7 @@ def forgot_password():
     user = User.query.filter_by(email=email).first()
 
     if user:
-        token = user.generate_reset_token()
+        token = reset_tokens.issue(user.user_id)
         
         # SIMULATED EMAIL SENDING (TO BE REPLACED WITH REAL EMAIL LOGIC) 📧
         reset_link = f"http://localhost:3000/reset-password?token={token}"
@@ -132,16 +152,16 @@ def reset_password():
     if not token or not new_password:
         return jsonify({'error': 'Missing token or new password.'}), 400
 
-    # Find the user by token
-    user = User.query.filter_by(reset_token=token).first()
+    # Redeeming deletes the token; if anything below fails the rollback restores it
+    user_id = reset_tokens.consume(token)
+    user = db.session.get(User, user_id) if user_id is not None else None
     
-    if not user or not user.check_reset_token(token):
+    if not user:
         return jsonify({'error': 'Invalid, expired, or used token.'}), 400
 
-    # Update the password and clear the token
     user.set_password(new_password) 
-    user.clear_reset_token()
     
     db.session.commit()
+    invalidate_user(user.user_id)
     
     return jsonify({'message': 'Password successfully reset. You can now log in.'}), 200
\ No newline at end of file
@@ -1,23 +1,22 @@
-from flask import Blueprint, request, jsonify, current_app
-from app.services import generate_ai_response
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from app.services import AIServiceBusy, generate_ai_response, stream_ai_response
+from app.summarizer import schedule_summary
+from app.context import load_recent_history
+from app.history_cache import get_history_cache
+from app.knowledge import get_knowledge_base, format_helplines
+from app.crisis import get_crisis_detector
+from app.stats import record_new_session, record_turn
+from app.message_writer import get_message_writer
+from app.rate_limit import rate_limited, too_many_requests
+from app.metrics import stage
 from app.models import Message, ChatSession, db
 from flask_login import current_user, login_required
 from datetime import datetime
 import json
-import os
 import uuid
 
 main_bp = Blueprint("api", __name__)
 
-# Load rights data from the repository's data folder 
-base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-data_file = os.path.join(base_dir, "data", "rights_data.json")
-try:
-    with open(data_file, "r", encoding="utf-8") as f:
-        rights_data = json.load(f)
-except Exception:
-    rights_data = {"rights": [], "faqs": []}
-
 @main_bp.after_request
 def add_cors_headers(response):
     origin = request.headers.get("Origin")
@@ -30,6 +29,7 @@ def add_cors_headers(response):
     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     response.headers["Access-Control-Allow-Credentials"] = "true"
+    response.headers["Access-Control-Expose-Headers"] = "ETag, X-Next-Before, Retry-After"
     return response
 
 
@@ -51,16 +51,153 @@ def health_check():
 @main_bp.route("/right-of-the-day", methods=["GET"])
 def right_of_the_day():
     # Return first right (can randomize later)
-    if rights_data.get("rights"):
-        return jsonify(rights_data["rights"][0])
+    knowledge = get_knowledge_base()
+    knowledge.maybe_reload()
+    if knowledge.rights:
+        return jsonify(knowledge.rights[0])
     return jsonify({}), 404
 
+FALLBACK_REPLY = "Sorry, I'm having trouble right now. Please try again later."
+
+
+def _degraded_reply(user_message):
+    """Immediate answer for when the AI service is unavailable (circuit open, timeout
+    or upstream error): the closest FAQ answer under a relaxed coverage threshold,
+    otherwise the fallback apology followed by the helplines."""
+    knowledge = get_knowledge_base()
+    match = knowledge.match_faq(user_message, min_coverage=current_app.config.get("DEGRADED_FAQ_MIN_COVERAGE", 0.3))
+    if match is not None:
+        return match.answer
+    if not knowledge.helplines:
+        return FALLBACK_REPLY
+    return f"{FALLBACK_REPLY}\n\nIf you need help urgently, you can reach:\n{format_helplines(knowledge.helplines)}"
+
+
+def _get_or_create_chat_session(session_uuid):
+    """Returns the ChatSession for session_uuid, creating (and committing) it if needed."""
+    with stage("session_lookup"):
+        chat_session = ChatSession.query.filter_by(session_uuid=session_uuid).first()
+    if not chat_session:
+        user_id_to_assign = None
+        if current_user.is_authenticated:
+            user_id_to_assign = current_user.user_id
+            
+        chat_session = ChatSession(
+            session_uuid=session_uuid,
+            user_id=user_id_to_assign
+        )
+        db.session.add(chat_session)
+        record_new_session(authenticated=user_id_to_assign is not None)
+        with stage("session_commit"):
+            db.session.commit()
+    return chat_session
+
+
+def _load_chat_context(session_uuid):
+    """Returns the hot state of a chat session: chat_id, summary, summary_until_id and the
+    recent formatted messages.
+
+    Served from the history cache when possible; on a miss the session is looked up
+    (or created) and its recent history read from the database, then cached.
+    """
+    cache = get_history_cache()
+    context = cache.get(session_uuid)
+    if context is not None:
+        return context
+
+    chat_session = _get_or_create_chat_session(session_uuid)
+    context = {
+        "chat_id": chat_session.chat_id,
+        "summary": chat_session.summary,
+        "summary_until_id": chat_session.summary_until_id,
+        "messages": _timed_history(chat_session),
+        "active_on": chat_session.last_active_date.isoformat() if chat_session.last_active_date else None,
+    }
+    return cache.put(session_uuid, **context)
+
+
+def _timed_history(chat_session):
+    with stage("history_query"):
+        return load_recent_history(chat_session.chat_id, chat_session.summary_until_id)
+
+
+def _remember_turn(session_uuid, context, user_message, reply, active_on=None):
+    """Write-through: appends the persisted turn to the session's cached history, or
+    drops the cached entry if another turn or a summary changed it since it was read."""
+    turns = [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": reply},
+    ]
+    get_history_cache().append(session_uuid, context, turns, active_on=active_on)
+
+
+def _persist_turn(session_uuid, context, user_message, reply, flag=None):
+    """Stores a user/bot message pair, updating the admin metrics counters in the
+    same transaction, then writes the turn through to the history cache.
+    `flag` marks the user message for follow-up (see Message.flag).
+
+    With MESSAGE_WRITE_BEHIND the pair is handed to the background message writer
+    instead, unless its queue is full.
+    """
+    active_on = context.get("active_on")
+    if not get_message_writer().submit(context["chat_id"], user_message, reply, flag=flag):
+        db.session.add(Message(chat_id=context["chat_id"], sender="user", content=user_message, flag=flag))
+        db.session.add(Message(chat_id=context["chat_id"], sender="bot", content=reply))
+        active_on = record_turn(context["chat_id"], 2, active_on=active_on)
+        with stage("persist_commit"):
+            db.session.commit()
+    _remember_turn(session_uuid, context, user_message, reply, active_on=active_on)
+
+
+def _faq_fast_path(user_message, session_uuid):
+    """Answers high-confidence FAQ hits locally, without a round-trip to the model.
+
+    Returns the answer text, or None if the message should go to the AI service.
+    With FAQ_PERSIST_MESSAGES the turn is still logged as Message rows.
+    """
+    if not current_app.config.get("FAQ_FAST_PATH", True):
+        return None
+    with stage("faq_lookup"):
+        match = get_knowledge_base().match_faq(user_message)
+    if match is None:
+        return None
+
+    if current_app.config.get("FAQ_PERSIST_MESSAGES", True):
+        context = _load_chat_context(session_uuid)
+        _persist_turn(session_uuid, context, user_message, match.answer)
+        # FAQ turns count toward the summary threshold like model turns
+        schedule_summary(context["chat_id"])
+    return match.answer
+
+
+def _crisis_check(user_message):
+    """Runs the local crisis detector (well under a millisecond per message).
+
+    Returns (match, helpline reply) on a hit, otherwise (None, None).
+    """
+    if not current_app.config.get("CRISIS_FAST_PATH", True):
+        return None, None
+    with stage("crisis_check"):
+        match = get_crisis_detector().detect(user_message)
+    if match is None:
+        return None, None
+    current_app.logger.warning("Crisis language detected (%s, %s)", match.category, match.language)
+    return match, get_crisis_detector().reply(match, get_knowledge_base().helplines)
+
+
+def _sse(data, event=None):
+    """Formats a single Server-Sent Event frame with a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @main_bp.route("/chat", methods=["OPTIONS"])
 def chat_preflight():
     return ("", 204)
 
 
 @main_bp.route("/chat", methods=["POST"])
+@rate_limited
 def chat():
     data = request.get_json() or {}
     user_message = data.get("message", "")
@@ -70,83 +207,203 @@ def chat():
     # Accept or create a session id so frontend can continue conversations
     session_uuid = data.get("session_id") or uuid.uuid4().hex
 
-    # Ensure a ChatSession exists
-    chat_session = ChatSession.query.filter_by(session_uuid=session_uuid).first()
-    if not chat_session:
-        user_id_to_assign = None
-        if current_user.is_authenticated:
-            user_id_to_assign = current_user.user_id
-            
-        chat_session = ChatSession(
-            session_uuid=session_uuid,
-            user_id=user_id_to_assign
-        )
-        db.session.add(chat_session)
-        db.session.commit()
+    # Crisis language is answered with the helplines straight away, without
+    # waiting on the model (/chat/stream sends them first, then the model's reply)
+    crisis, crisis_reply = _crisis_check(user_message)
+
+    # Common questions are answered straight from the FAQ index
+    faq_answer = None if crisis is not None else _faq_fast_path(user_message, session_uuid)
+    if faq_answer is not None:
+        return jsonify({"reply": faq_answer, "session_id": session_uuid, "source": "faq"})
+
+    # Ensure a ChatSession exists (served from the history cache for active sessions)
+    context = _load_chat_context(session_uuid)
     
-    current_chat_id = chat_session.chat_id
+    current_chat_id = context["chat_id"]
+
+    if crisis is not None:
+        _persist_turn(session_uuid, context, user_message, crisis_reply, flag=crisis.category)
+        schedule_summary(current_chat_id)
+        return jsonify({"reply": crisis_reply, "session_id": session_uuid, "source": "crisis"})
+
+    # Hand the DB connection back to the pool while waiting on the model
+    db.session.close()
     
     # AI response (forward to FastAPI microservice)
-    ai_result = generate_ai_response(user_message, session_id=session_uuid, chat_id=current_chat_id)
+    ai_result = generate_ai_response(
+        user_message, session_id=session_uuid, chat_id=current_chat_id,
+        summary=context["summary"], summary_until_id=context["summary_until_id"],
+        history=context["messages"]
+    )
+    if isinstance(ai_result, AIServiceBusy):
+        if ai_result.reason == "rate_limited":
+            # Over the AI service's per-client limit: the client retries, nothing is persisted
+            return too_many_requests(ai_result.retry_after)
+        ai_result = None
     
     if not ai_result:
-        reply = "Sorry, I'm having trouble right now. Please try again later."
+        # AI service unavailable: answer from the FAQ/helplines instead
+        reply = _degraded_reply(user_message)
+        ai_result = {}
     else:
-        reply = ai_result.get("reply", "An unknown response was received") 
+        reply = ai_result.get("reply") or "An unknown response was received"
     
     returned_session = ai_result.get("session_id") or session_uuid
 
-    # Persist user message
-    user_msg = Message(chat_id=current_chat_id, sender="user", content=user_message)
-    db.session.add(user_msg)
-    
-    # Persist bot message
-    bot_msg = Message(chat_id=current_chat_id, sender="bot", content=reply)
-    db.session.add(bot_msg)
-    
-    db.session.commit() 
+    # Persist the user and bot messages
+    _persist_turn(session_uuid, context, user_message, reply)
+
+    # Fold older turns into the running summary in the background
+    schedule_summary(current_chat_id)
+
+    response_body = {"reply": reply, "session_id": returned_session}
+    if not ai_result:
+        response_body["source"] = "degraded"
+    return jsonify(response_body)
+
+
+@main_bp.route("/chat/stream", methods=["OPTIONS"])
+def chat_stream_preflight():
+    return ("", 204)
+
+
+@main_bp.route("/chat/stream", methods=["POST"])
+@rate_limited
+def chat_stream():
+    """
+    Streaming variant of /chat. Relays reply tokens to the browser as Server-Sent Events:
+    `data: {"delta": "..."}` frames while the reply is generated, then a final
+    `event: done` frame with the session_id and the complete reply. The message pair
+    is persisted once the stream finishes.
+
+    On crisis language the helplines are sent as the first frame, before the model
+    has produced anything; the model's reply follows them.
+    """
+    data = request.get_json() or {}
+    user_message = data.get("message", "")
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    session_uuid = data.get("session_id") or uuid.uuid4().hex
+    stream_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    crisis, crisis_reply = _crisis_check(user_message)
+    faq_answer = None if crisis is not None else _faq_fast_path(user_message, session_uuid)
+    if faq_answer is not None:
+        frames = [
+            _sse({"delta": faq_answer}),
+            _sse({"session_id": session_uuid, "reply": faq_answer, "source": "faq"}, event="done"),
+        ]
+        return Response(frames, mimetype="text/event-stream", headers=stream_headers)
+
+    context = _load_chat_context(session_uuid)
+    current_chat_id = context["chat_id"]
+    # Hand the DB connection back to the pool while the reply streams
+    db.session.close()
+
+    def generate():
+        parts = []
+        if crisis is not None:
+            parts.append(crisis_reply + "\n\n")
+            yield _sse({"delta": parts[0]})
+        for delta in stream_ai_response(user_message, session_id=session_uuid, chat_id=current_chat_id,
+                                        summary=context["summary"], summary_until_id=context["summary_until_id"],
+                                        history=context["messages"], crisis=crisis is not None):
+            parts.append(delta)
+            yield _sse({"delta": delta})
 
-    return jsonify({"reply": reply, "session_id": returned_session})
+        reply = "".join(parts).strip()
+        done = {"session_id": session_uuid, "reply": reply}
+        if crisis is not None:
+            done["source"] = "crisis"
+        elif not reply:
+            reply = done["reply"] = _degraded_reply(user_message)
+            done["source"] = "degraded"
+            yield _sse({"delta": reply})
+
+        # Persist the turn only once the full reply is known
+        _persist_turn(session_uuid, context, user_message, reply, flag=crisis.category if crisis else None)
+
+        yield _sse(done, event="done")
+        schedule_summary(current_chat_id)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=stream_headers)
+
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+TITLE_LENGTH = 50
+
+
+def _session_history_query(user_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """Builds one statement returning a page of the user's sessions with their titles.
+
+    The title is the first user message of each session. On PostgreSQL it is fetched
+    with a LATERAL join; other databases (SQLite) use an equivalent correlated
+    subquery. Either way the lookup runs once per returned row inside the same query.
+    Sessions are ordered newest first by chat_id, which follows creation order, and
+    `before` is the keyset cursor (exclusive).
+    """
+    first_message = (
+        db.select(db.func.substr(Message.content, 1, TITLE_LENGTH).label("title"))
+        .where(Message.chat_id == ChatSession.chat_id, Message.sender == 'user')
+        .order_by(Message.timestamp.asc(), Message.message_id.asc())
+        .limit(1)
+    )
+
+    if db.engine.dialect.name == "postgresql":
+        title_source = first_message.lateral("first_message")
+        query = (
+            db.select(ChatSession.chat_id, ChatSession.session_uuid, ChatSession.created_at, title_source.c.title)
+            .outerjoin(title_source, db.true())
+        )
+    else:
+        query = db.select(
+            ChatSession.chat_id, ChatSession.session_uuid, ChatSession.created_at,
+            first_message.scalar_subquery().label("title"),
+        )
+
+    query = query.where(ChatSession.user_id == user_id)
+    if before is not None:
+        query = query.where(ChatSession.chat_id < before)
+    return query.order_by(ChatSession.chat_id.desc()).limit(limit)
 
 
 @main_bp.get("/chat/history")
 @login_required
 def get_history():
     """
-    Fetches the list of chat sessions for the currently logged-in user.
+    Fetches the list of chat sessions for the currently logged-in user, newest first.
+
+    Keyset pagination: `limit` (default 50, max 200) and `before=<chat_id>` to continue
+    after the last session of the previous page. When more sessions exist, the cursor
+    for the next page is returned in the X-Next-Before header.
     """
     if not current_user.is_authenticated:
         return jsonify({"message": "Unauthorized"}), 401
 
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+
     try:
-        # Query all ChatSessions belonging to the current user, ordered by creation time
-        sessions = ChatSession.query.filter_by(
-            user_id=current_user.user_id
-        ).order_by(
-            ChatSession.created_at.desc() 
+        # One query for the page plus one extra row to detect whether another page exists
+        rows = db.session.execute(
+            _session_history_query(current_user.user_id, before, limit + 1)
         ).all()
         
         history_list = []
-        for session in sessions:
-            
-            # For the title, grab the first user message of the session
-            first_user_message = Message.query.filter_by(
-                chat_id=session.chat_id,
-                sender='user'
-            ).order_by(Message.timestamp.asc()).first()
-
-            # Determine the session title and date
-            session_title = first_user_message.content[:50] if first_user_message else "New Conversation"
-            session_date = session.created_at.strftime('%Y-%m-%d')
-            
+        for row in rows[:limit]:
             history_list.append({
-                "chat_id": session.chat_id,
-                "session_id": session.session_uuid,
-                "title": session_title,
-                "date": session_date
+                "chat_id": row.chat_id,
+                "session_id": row.session_uuid,
+                "title": row.title or "New Conversation",
+                "date": row.created_at.strftime('%Y-%m-%d') if row.created_at else None
             })
 
-        return jsonify(history_list), 200
+        response = jsonify(history_list)
+        if len(rows) > limit:
+            response.headers["X-Next-Before"] = str(history_list[-1]["chat_id"])
+        return response, 200
 
     except Exception as e:
         print(f"Error fetching chat history: {e}")
@@ -159,11 +416,31 @@ def rename_chat_title():
     return
 
 
+MESSAGES_PAGE_SIZE = 100
+MESSAGES_MAX_PAGE_SIZE = 500
+
+
+def _message_cursor(timestamp, message_id):
+    return f"{timestamp.isoformat() if timestamp else ''}_{message_id}"
+
+
+def _parse_message_cursor(cursor):
+    """Parses a '<iso timestamp>_<message_id>' keyset cursor; raises ValueError if malformed."""
+    timestamp, _, message_id = cursor.rpartition("_")
+    return datetime.fromisoformat(timestamp), int(message_id)
+
+
 @main_bp.get("/chat/messages/<session_uuid>")  
 @login_required
 def get_messages(session_uuid):
     """
     Fetches messages for a specific session ID, verified against the current user.
+
+    Returns the newest `limit` messages (default 100, max 500) in chronological order.
+    - `before=<cursor>` pages backwards using the `next_before` cursor of the previous
+      response (keyset on timestamp, message_id).
+    - `since=<message_id>` returns only messages newer than that id, for polling.
+    Responses carry an ETag; a matching If-None-Match yields 304 without reading messages.
     """
     # Find the session and ensure it belongs to the current user
     session = ChatSession.query.filter_by(
@@ -174,21 +451,70 @@ def get_messages(session_uuid):
     if not session:
         return jsonify({"message": "Session not found or access denied"}), 404
 
-    # Fetch all messages in the session, ordered by timestamp
-    messages = Message.query.filter_by(
-        chat_id=session.chat_id
-    ).order_by(Message.timestamp.asc()).all()
+    limit = min(max(request.args.get("limit", MESSAGES_PAGE_SIZE, type=int), 1), MESSAGES_MAX_PAGE_SIZE)
+    since = request.args.get("since", type=int)
+    before = request.args.get("before")
+    try:
+        before_key = _parse_message_cursor(before) if before else None
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+
+    # Messages are append-only, so the newest id identifies the session's state.
+    # This is an index-only probe on (chat_id, timestamp, message_id).
+    latest_id = db.session.execute(
+        db.select(db.func.max(Message.message_id)).where(Message.chat_id == session.chat_id)
+    ).scalar() or 0
+    etag = f"{session.chat_id}-{latest_id}-{limit}-{since or ''}-{before or ''}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    columns = (Message.message_id, Message.content, Message.sender, Message.timestamp)
+    query = db.select(*columns).where(Message.chat_id == session.chat_id)
+
+    if since is not None:
+        # Delta mode: everything after the client's newest message, oldest first
+        rows = db.session.execute(
+            query.where(Message.message_id > since)
+            .order_by(Message.message_id.asc())
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        if before_key is not None:
+            before_timestamp, before_id = before_key
+            query = query.where(db.or_(
+                Message.timestamp < before_timestamp,
+                db.and_(Message.timestamp == before_timestamp, Message.message_id < before_id),
+            ))
+        rows = db.session.execute(
+            query.order_by(Message.timestamp.desc(), Message.message_id.desc()).limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
     
     message_list = []
-    for message in messages:
+    for message in rows:
         message_list.append({
             "id": str(message.message_id),
             "text": message.content,
             "sender": message.sender,
-            "timestamp": message.timestamp.strftime('%H:%M') # Format time for display
+            "timestamp": message.timestamp.strftime('%H:%M') if message.timestamp else "" # Format time for display
         })
 
-    return jsonify({"messages": message_list}), 200
+    payload = {"messages": message_list, "latest_id": latest_id}
+    if since is None:
+        # Cursor for the next (older) page
+        payload["next_before"] = _message_cursor(rows[0].timestamp, rows[0].message_id) if has_more and rows else None
+    else:
+        payload["has_more"] = has_more
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response, 200
 
 
 @main_bp.post('/user/settings')
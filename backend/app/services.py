@@ -1,59 +1,40 @@
-import os
+import json
+import time
 import logging
 import requests
-from typing import Optional, List
-from app.models import Message, db 
+from typing import Optional, List, Iterator, Union
+from app.gateway import get_gateway
+from app.context import build_history_context
+from app.rate_limit import client_headers
+from app.metrics import get_metrics, stage
 
 logger = logging.getLogger(__name__)
 
 
-def format_messages_for_ai(messages: List[Message]) -> List[dict]:
-    """Converts a list of Message SQLAlchemy objects into the OpenAI API format."""
-    formatted_history = []
-    
-    for msg in messages:
-        # Renames 'bot' to 'assistant' for OpenAI API compatibility
-        role = 'user' if msg.sender == 'user' else 'assistant' 
-        formatted_history.append({
-            "role": role,
-            "content": msg.content
-        })
-    return formatted_history
+class AIServiceBusy:
+    """The AI service turned a request away as back-pressure instead of failing it:
+    `reason` is "rate_limited" (a 429 from its per-client limiter) or "overloaded"
+    (a 503 from its admission queue). `retry_after` is in seconds."""
 
+    __slots__ = ("reason", "retry_after")
 
-def generate_ai_response(message: str, session_id: Optional[str] = None, chat_id: Optional[int] = None) -> Optional[dict]:
-    """Retrieves context, forward the full payload to the FastAPI AI.
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
 
-    Returns a dict with keys: { 'reply': str|null, 'session_id': str|null } or None on failure.
-    """
-    
+    def __repr__(self):
+        return f"AIServiceBusy({self.reason!r}, retry_after={self.retry_after})"
+
+
+def _build_ai_payload(message: str, session_id: Optional[str], chat_id: Optional[int],
+                      summary: Optional[str] = None, summary_until_id: Optional[int] = None,
+                      history: Optional[List[dict]] = None, no_cache: bool = False) -> dict:
+    """Collects the history context and builds the JSON payload for the FastAPI AI service."""
     history_payload = []
     
     if chat_id is not None:
-        CONTEXT_LIMIT = 10 # last 10 messages
-        
-        # Query the database using the integer 'chat_id' (the foreign key)
-        history_db_objects = db.session.execute(
-            db.select(Message)
-            .filter_by(chat_id=chat_id) 
-            .order_by(Message.timestamp.asc()) 
-            .limit(CONTEXT_LIMIT)
-        ).scalars().all()
-
-        # Convert SQLAlchemy objects to the API's required dict format
-        if history_db_objects:
-            history_payload = format_messages_for_ai(history_db_objects)
-            
-    FLASK_ENV = os.getenv("FLASK_ENV")
-    if FLASK_ENV == "development":
-        fastapi_url = "http://localhost:8000" 
-    elif FLASK_ENV == "production":
-        fastapi_url = os.getenv("FASTAPI_URL", "https://tena-fastapi.onrender.com")
-    else:
-        fastapi_url = "https://tena-fastapi.onrender.com"
-            
-    endpoint = f"{fastapi_url.rstrip('/')}/ai/chat"
-    internal_key = os.getenv("INTERNAL_API_KEY")
+        # Most recent turns that fit the prompt token budget (see app/context.py)
+        history_payload = build_history_context(chat_id, message, summary, summary_until_id, history)
 
     payload = {
         "message": message, 
@@ -63,15 +44,190 @@ def generate_ai_response(message: str, session_id: Optional[str] = None, chat_id
     if session_id:
         payload["session_id"] = session_id # Include the UUID for tracking/logging
 
-    headers = {"Content-Type": "application/json"}
-    if internal_key:
-        headers["X-Internal-Key"] = internal_key
+    if summary:
+        payload["summary"] = summary # Stands in for the turns folded out of the history
+
+    if no_cache:
+        payload["no_cache"] = True # Never answer from (or into) the AI service's reply cache
+
+    return payload
 
+
+def generate_ai_response(message: str, session_id: Optional[str] = None, chat_id: Optional[int] = None,
+                         summary: Optional[str] = None, summary_until_id: Optional[int] = None,
+                         history: Optional[List[dict]] = None,
+                         crisis: bool = False) -> Union[dict, AIServiceBusy, None]:
+    """Retrieves context, forward the full payload to the FastAPI AI.
+
+    `history` is the session's recent window from the history cache; the database
+    is queried when it is not supplied. `crisis` turns always get a freshly generated reply.
+
+    Returns a dict with keys: { 'reply': str|null, 'session_id': str|null } or None on failure.
+    While the AI service circuit breaker is open, returns None without calling it.
+    When the AI service is rate limiting the client or shedding load, returns an
+    AIServiceBusy; neither counts against the circuit breaker.
+    """
+    gateway = get_gateway()
+    breaker = gateway.breaker
+    if not breaker.allow():
+        logger.warning("AI service circuit open, skipping call (retry in %.1fs)", breaker.retry_after())
+        return None
+
+    with stage("history_context"):
+        payload = _build_ai_payload(message, session_id, chat_id, summary, summary_until_id, history,
+                                    no_cache=crisis)
+    started = time.monotonic()
     try:
-        resp = requests.post(endpoint, json=payload, headers=headers, timeout=30)
+        # The AI service tags its own timings with the X-Trace-Id that post() adds
+        with stage("ai_service"):
+            resp = gateway.post("/ai/chat", payload, headers=client_headers(),
+                                timeout=(gateway.connect_timeout, breaker.timeout()))
+        busy = _backpressure(resp)
+        if busy is not None:
+            logger.warning("AI service is %s (retry in %.0fs)", busy.reason, busy.retry_after)
+            breaker.release()
+            return busy
+        if _is_upstream_failure(resp.status_code):
+            logger.error("FastAPI AI service returned %s", resp.status_code)
+            breaker.record_failure()
+            return None
         resp.raise_for_status()
         data = resp.json()
-        return {"reply": data.get("reply"), "session_id": data.get("session_id")}
+    except requests.HTTPError:
+        # 4xx: our request was rejected, the service itself is healthy
+        logger.exception("FastAPI AI service rejected the request at %s", gateway.url("/ai/chat"))
+        breaker.record_success()
+        return None
+    except (requests.RequestException, ValueError):
+        logger.exception("Failed to call FastAPI AI service at %s", gateway.url("/ai/chat"))
+        breaker.record_failure()
+        return None
+
+    if data.get("error"):
+        # The AI service answered, but its model provider failed
+        logger.error("AI service reported an upstream error: %s", data["error"])
+        breaker.record_failure()
+        return None
+    breaker.record_success(time.monotonic() - started)
+    return {"reply": data.get("reply"), "session_id": data.get("session_id")}
+
+
+def _is_upstream_failure(status_code: int) -> bool:
+    """Responses that count against the AI service circuit breaker. Back-pressure
+    (see _backpressure) is checked first and is not a sign that it is unhealthy."""
+    return status_code >= 500
+
+
+def _backpressure(resp: requests.Response) -> Optional[AIServiceBusy]:
+    """An AIServiceBusy for a 429, or for a 503 whose body reports "overloaded"."""
+    if resp.status_code == 429:
+        reason = "rate_limited"
+    elif resp.status_code == 503 and _error_code(resp) == "overloaded":
+        reason = "overloaded"
+    else:
+        return None
+    try:
+        retry_after = float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        retry_after = 1.0
+    return AIServiceBusy(reason, max(retry_after, 1.0))
+
+
+def _error_code(resp: requests.Response) -> Optional[str]:
+    try:
+        data = resp.json()
+    except ValueError:
+        return None
+    return data.get("error") if isinstance(data, dict) else None
+
+
+def iter_sse_events(lines: Iterator[str]) -> Iterator[tuple]:
+    """Parses Server-Sent Event lines into (event, data) tuples.
+
+    `data` is the decoded JSON payload; the event name defaults to 'message'.
+    """
+    event, data_lines = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                try:
+                    yield event, json.loads("\n".join(data_lines))
+                except ValueError:
+                    logger.warning("Dropping malformed SSE frame from AI service")
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].lstrip())
+
+
+def stream_ai_response(message: str, session_id: Optional[str] = None, chat_id: Optional[int] = None,
+                       summary: Optional[str] = None, summary_until_id: Optional[int] = None,
+                       history: Optional[List[dict]] = None, crisis: bool = False) -> Iterator[str]:
+    """Streaming counterpart of generate_ai_response.
+
+    Yields reply text deltas as the FastAPI service relays them from Azure. Stops
+    early (without raising) if the service fails, reports an error or turns the
+    request away as back-pressure, and yields nothing while the circuit breaker is
+    open; the caller supplies the fallback.
+    """
+    gateway = get_gateway()
+    breaker = gateway.breaker
+    if not breaker.allow():
+        logger.warning("AI service circuit open, skipping stream (retry in %.1fs)", breaker.retry_after())
+        return
+
+    with stage("history_context"):
+        payload = _build_ai_payload(message, session_id, chat_id, summary, summary_until_id, history,
+                                    no_cache=crisis)
+    started = time.monotonic()
+    succeeded = None
+    first_delta = True
+    try:
+        # The read timeout applies between chunks, not to the whole reply
+        with gateway.post("/ai/chat/stream", payload, stream=True,
+                          headers={"Accept": "text/event-stream", **client_headers()},
+                          timeout=(gateway.connect_timeout, breaker.timeout())) as resp:
+            if not resp.ok:
+                busy = _backpressure(resp)
+                if busy is not None:
+                    logger.warning("AI service is %s (retry in %.0fs)", busy.reason, busy.retry_after)
+                    return  # Released in the finally block
+                logger.error("FastAPI AI service returned %s", resp.status_code)
+                if _is_upstream_failure(resp.status_code):
+                    succeeded = False
+                else:
+                    breaker.record_success()  # 4xx: the service itself is healthy
+                return
+            resp.encoding = "utf-8"
+            # chunk_size=None hands lines over as soon as they arrive instead of buffering 512 bytes
+            for event, data in iter_sse_events(resp.iter_lines(chunk_size=None, decode_unicode=True)):
+                if event == "message" and data.get("delta"):
+                    if first_delta:
+                        get_metrics().observe_stage("ai_service_first_delta", time.monotonic() - started)
+                        first_delta = False
+                    yield data["delta"]
+                elif event == "error":
+                    # Shed by the AI service's admission queue: back-pressure, not a failure
+                    if data.get("error") != "overloaded":
+                        succeeded = False
+                    return
+                elif event == "done":
+                    succeeded = True
+                    return
+            # Connection closed without a final frame
+            succeeded = False
     except requests.RequestException:
-        logger.exception("Failed to call FastAPI AI service at %s", endpoint)
-        return None
\ No newline at end of file
+        logger.exception("Failed to stream from FastAPI AI service at %s", gateway.url("/ai/chat/stream"))
+        succeeded = False
+    finally:
+        get_metrics().observe_stage("ai_service_stream", time.monotonic() - started)
+        # Left undecided on back-pressure and when the browser disconnected mid-stream
+        if succeeded:
+            breaker.record_success(time.monotonic() - started)
+        elif succeeded is False:
+            breaker.record_failure()
+        else:
+            breaker.release()
@@ -0,0 +1,212 @@
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import StatTotal, StatDaily, User, ChatSession, Message, db
+
+# Running totals served by the system metrics endpoint
+TOTAL_METRICS = ("users", "chats", "messages")
+
+# Daily (UTC) rollups served by the time-series endpoint
+DAILY_METRICS = (
+    "messages",
+    "active_sessions",
+    "new_users",
+    "new_sessions",
+    "anonymous_sessions",
+    "authenticated_sessions",
+)
+
+stats_cli = AppGroup("stats", help="Maintain the admin metrics counters.")
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def _shard() -> int:
+    return random.randrange(current_app.config.get("STATS_SHARDS", 8))
+
+
+def _increment(model, keys: dict, amount: int):
+    """Adds `amount` to one counter row, creating it if needed.
+
+    Uses INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite so concurrent
+    writers never race on row creation; other databases fall back to update-then-insert.
+    """
+    dialect = db.session.get_bind().dialect.name
+    insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+    if insert is not None:
+        stmt = insert(model).values(**keys, value=amount)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys), set_={"value": model.value + stmt.excluded.value}
+        )
+        db.session.execute(stmt)
+        return
+
+    updated = db.session.execute(
+        db.update(model).filter_by(**keys).values(value=model.value + amount)
+    ).rowcount
+    if not updated:
+        db.session.add(model(**keys, value=amount))
+
+
+def increment(totals: Optional[Dict[str, int]] = None, daily: Optional[Dict[str, int]] = None,
+              day: Optional[date] = None):
+    """Bumps total and daily counters inside the caller's transaction.
+
+    Each call writes to one randomly chosen shard per metric, so hot counters are
+    spread over STATS_SHARDS rows instead of serializing every writer on one.
+    """
+    day = day or _today()
+    shard = _shard()
+    for metric, amount in (totals or {}).items():
+        _increment(StatTotal, {"metric": metric, "shard": shard}, amount)
+    for metric, amount in (daily or {}).items():
+        _increment(StatDaily, {"metric": metric, "day": day, "shard": shard}, amount)
+
+
+def record_new_user():
+    increment(totals={"users": 1}, daily={"new_users": 1})
+
+
+def record_user_deleted():
+    increment(totals={"users": -1})
+
+
+def record_new_session(authenticated: bool):
+    kind = "authenticated_sessions" if authenticated else "anonymous_sessions"
+    increment(totals={"chats": 1}, daily={"new_sessions": 1, kind: 1})
+
+
+def record_turn(chat_id: int, message_count: int, active_on: Optional[str] = None) -> str:
+    """Counts persisted messages and marks the session active for today.
+
+    `active_on` is the last day (ISO string) this process already saw the session
+    active, typically remembered in the history cache; when it is today the
+    activity UPDATE is skipped. Otherwise a conditional UPDATE of
+    ChatSession.last_active_date decides, atomically, whether this is the session's
+    first turn of the day. Returns today's ISO date for the caller to remember.
+    """
+    today = _today()
+    daily = {"messages": message_count}
+    if active_on != today.isoformat():
+        first_today = db.session.execute(
+            db.update(ChatSession)
+            .where(ChatSession.chat_id == chat_id)
+            .where(db.or_(ChatSession.last_active_date.is_(None), ChatSession.last_active_date < today))
+            .values(last_active_date=today)
+        ).rowcount
+        if first_today:
+            daily["active_sessions"] = 1
+    increment(totals={"messages": message_count}, daily=daily, day=today)
+    return today.isoformat()
+
+
+def totals() -> Dict[str, int]:
+    """Current value of every total counter (summed across shards)."""
+    rows = db.session.execute(
+        db.select(StatTotal.metric, db.func.sum(StatTotal.value)).group_by(StatTotal.metric)
+    ).all()
+    values = {metric: 0 for metric in TOTAL_METRICS}
+    values.update({metric: int(value or 0) for metric, value in rows})
+    return values
+
+
+def timeseries(start: date, end: date, metrics: Iterable[str]) -> Dict[str, List[int]]:
+    """Daily values of `metrics` for every day in [start, end], zero-filled."""
+    metrics = list(metrics)
+    days = (end - start).days + 1
+    series = {metric: [0] * days for metric in metrics}
+    rows = db.session.execute(
+        db.select(StatDaily.metric, StatDaily.day, db.func.sum(StatDaily.value))
+        .where(StatDaily.metric.in_(metrics), StatDaily.day.between(start, end))
+        .group_by(StatDaily.metric, StatDaily.day)
+    ).all()
+    for metric, day, value in rows:
+        series[metric][(day - start).days] = int(value or 0)
+    return series
+
+
+def reset():
+    """Empties all counters (used when the underlying tables are wiped)."""
+    db.session.execute(db.delete(StatDaily))
+    db.session.execute(db.delete(StatTotal))
+
+
+def rebuild():
+    """Recomputes every counter from the base tables.
+
+    This is the full-scan path the counters exist to avoid; run it once after
+    migrating, or to repair drift. Writes go to shard 0 and commit together.
+    """
+    reset()
+    day = db.func.date
+
+    for metric, model in (("users", User), ("chats", ChatSession), ("messages", Message)):
+        count = db.session.execute(db.select(db.func.count()).select_from(model)).scalar()
+        db.session.add(StatTotal(metric=metric, shard=0, value=count or 0))
+
+    daily_queries = {
+        "messages": db.select(day(Message.timestamp), db.func.count())
+            .where(Message.timestamp.isnot(None)).group_by(day(Message.timestamp)),
+        "active_sessions": db.select(day(Message.timestamp), db.func.count(db.distinct(Message.chat_id)))
+            .where(Message.timestamp.isnot(None)).group_by(day(Message.timestamp)),
+        "new_users": db.select(day(User.created_at), db.func.count())
+            .where(User.created_at.isnot(None)).group_by(day(User.created_at)),
+        "new_sessions": db.select(day(ChatSession.created_at), db.func.count())
+            .where(ChatSession.created_at.isnot(None)).group_by(day(ChatSession.created_at)),
+        "anonymous_sessions": db.select(day(ChatSession.created_at), db.func.count())
+            .where(ChatSession.created_at.isnot(None), ChatSession.user_id.is_(None))
+            .group_by(day(ChatSession.created_at)),
+        "authenticated_sessions": db.select(day(ChatSession.created_at), db.func.count())
+            .where(ChatSession.created_at.isnot(None), ChatSession.user_id.isnot(None))
+            .group_by(day(ChatSession.created_at)),
+    }
+    for metric, query in daily_queries.items():
+        for bucket, value in db.session.execute(query).all():
+            if isinstance(bucket, str):  # SQLite returns date() as text
+                bucket = date.fromisoformat(bucket)
+            db.session.add(StatDaily(metric=metric, day=bucket, shard=0, value=value))
+
+    last_active = (
+        db.select(db.func.max(day(Message.timestamp)))
+        .where(Message.chat_id == ChatSession.chat_id)
+        .scalar_subquery()
+    )
+    if db.session.get_bind().dialect.name == "sqlite":
+        # date() is text on SQLite; the Date column expects a real date value
+        for chat_id, bucket in db.session.execute(db.select(ChatSession.chat_id, last_active)).all():
+            if bucket:
+                db.session.execute(
+                    db.update(ChatSession).where(ChatSession.chat_id == chat_id)
+                    .values(last_active_date=date.fromisoformat(bucket))
+                )
+    else:
+        db.session.execute(db.update(ChatSession).values(last_active_date=last_active))
+    db.session.commit()
+
+
+@stats_cli.command("rebuild")
+def rebuild_command():
+    """Recompute admin metrics counters from the base tables."""
+    rebuild()
+    click.echo("Rebuilt counters: " + ", ".join(f"{k}={v}" for k, v in totals().items()))
+
+
+def parse_range(start: Optional[str], end: Optional[str], default_days: int = 30,
+                max_days: int = 366):
+    """Parses ISO `start`/`end` dates (inclusive), defaulting to the last `default_days`.
+
+    Raises ValueError for malformed or oversized ranges.
+    """
+    end_day = date.fromisoformat(end) if end else _today()
+    start_day = date.fromisoformat(start) if start else end_day - timedelta(days=default_days - 1)
+    if start_day > end_day:
+        raise ValueError("start must not be after end")
+    if (end_day - start_day).days + 1 > max_days:
+        raise ValueError(f"range may span at most {max_days} days")
+    return start_day, end_day
@@ -0,0 +1,109 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import requests
+from flask import current_app
+from app.models import ChatSession, Message, db
+from app.gateway import get_gateway
+from app.context import format_messages_for_ai
+from app.history_cache import get_history_cache
+
+logger = logging.getLogger(__name__)
+
+# Summaries are built off the request path by a small background pool
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarizer")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def schedule_summary(chat_id: int):
+    """Queues a summary refresh for chat_id after the reply has been returned.
+
+    At most one job per chat is queued at a time; the job itself decides whether
+    the session has grown enough to need folding.
+    """
+    if not current_app.config.get("SUMMARY_ENABLED", True):
+        return
+    with _pending_lock:
+        if chat_id in _pending:
+            return
+        _pending.add(chat_id)
+
+    app = current_app._get_current_object()
+    _executor.submit(_run_summary_job, app, chat_id)
+
+
+def _run_summary_job(app, chat_id: int):
+    try:
+        with app.app_context():
+            summarize_session(chat_id)
+    except Exception:
+        logger.exception("Summary job failed for chat %s", chat_id)
+    finally:
+        with _pending_lock:
+            _pending.discard(chat_id)
+
+
+def messages_to_fold(chat_session: ChatSession) -> List[Message]:
+    """Returns the oldest unsummarized messages once the session crosses the threshold.
+
+    The newest SUMMARY_KEEP_RECENT messages always stay verbatim in the history window.
+    """
+    config = current_app.config
+    query = db.select(Message).filter_by(chat_id=chat_session.chat_id)
+    if chat_session.summary_until_id is not None:
+        query = query.filter(Message.message_id > chat_session.summary_until_id)
+
+    unsummarized = db.session.execute(
+        db.select(db.func.count()).select_from(query.subquery())
+    ).scalar()
+    if unsummarized < config.get("SUMMARY_TRIGGER_MESSAGES", 30):
+        return []
+
+    fold_count = min(unsummarized - config.get("SUMMARY_KEEP_RECENT", 10),
+                     config.get("SUMMARY_MAX_BATCH", 60))
+    if fold_count <= 0:
+        return []
+
+    return db.session.execute(
+        query.order_by(Message.message_id.asc()).limit(fold_count)
+    ).scalars().all()
+
+
+def summarize_session(chat_id: int) -> bool:
+    """Folds older turns of a chat into its stored running summary.
+
+    Returns True if the summary was updated.
+    """
+    chat_session = db.session.get(ChatSession, chat_id)
+    if chat_session is None:
+        return False
+
+    to_fold = messages_to_fold(chat_session)
+    if not to_fold:
+        return False
+
+    payload = {
+        "summary": chat_session.summary or "",
+        "history": format_messages_for_ai(to_fold),
+    }
+    gateway = get_gateway()
+    try:
+        resp = gateway.post("/ai/summarize", payload)
+        resp.raise_for_status()
+        new_summary = (resp.json().get("summary") or "").strip()
+    except requests.RequestException:
+        logger.exception("Failed to call FastAPI summarizer at %s", gateway.url("/ai/summarize"))
+        return False
+
+    if not new_summary:
+        return False
+
+    chat_session.summary = new_summary
+    chat_session.summary_until_id = to_fold[-1].message_id
+    db.session.commit()
+    # The cached window still holds the folded turns; the next turn reloads it
+    get_history_cache().invalidate(chat_session.session_uuid)
+    logger.info("Folded %d messages into summary for chat %s", len(to_fold), chat_id)
+    return True
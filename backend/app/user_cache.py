@@ -0,0 +1,156 @@
+import logging
+import threading
+from typing import Callable, Optional
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_login import UserMixin
+from app.history_cache import LRUBackend, RedisBackend
+from app.models import User, db
+
+logger = logging.getLogger(__name__)
+
+users_cli = AppGroup("users", help="Manage user accounts.")
+
+
+class UserSnapshot(UserMixin):
+    """What a request needs to know about the signed-in user, detached from the
+    database session. Immutable, so one instance can be shared across requests."""
+
+    __slots__ = ("user_id", "email", "is_admin")
+
+    def __init__(self, user_id: int, email: str, is_admin: bool):
+        object.__setattr__(self, "user_id", user_id)
+        object.__setattr__(self, "email", email)
+        object.__setattr__(self, "is_admin", bool(is_admin))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserSnapshot is immutable")
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.user_id}>"
+
+    def get_id(self):
+        return str(self.user_id)
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(user.user_id, user.email, user.is_admin)
+
+    def to_dict(self) -> dict:
+        return {"user_id": self.user_id, "email": self.email, "is_admin": self.is_admin}
+
+
+class UserCache:
+    """Identity cache behind Flask-Login's user_loader.
+
+    Every authenticated request used to SELECT its user row; this serves a
+    UserSnapshot from an in-process LRU instead, falling back to a shared Redis
+    tier (when configured) and then the database. Entries live `ttl` seconds,
+    or `local_ttl` in the in-process tier when Redis is in front of it, since
+    invalidate() can only reach the Redis tier and this process's own LRU.
+    Changes to a user must call invalidate(); edits made straight in the
+    database show up once the entries expire.
+    """
+
+    def __init__(self, local: LRUBackend, shared: Optional[RedisBackend] = None,
+                 ttl: int = 60, local_ttl: Optional[int] = None, enabled: bool = True):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.local_ttl = local_ttl if local_ttl is not None else ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "UserCache":
+        shared = None
+        redis_url = config.get("REDIS_URL")
+        if config.get("USER_CACHE_BACKEND", "auto") in ("auto", "redis") and redis_url:
+            try:
+                shared = RedisBackend(redis_url, prefix="tena:user:")
+            except ImportError:
+                logger.warning("redis package not installed; using in-process user cache only")
+        ttl = config.get("USER_CACHE_TTL", 60)
+        return cls(
+            LRUBackend(config.get("USER_CACHE_MAX_ENTRIES", 10000)),
+            shared,
+            ttl=ttl,
+            local_ttl=min(ttl, config.get("USER_CACHE_LOCAL_TTL", 5)) if shared else ttl,
+            enabled=config.get("USER_CACHE_ENABLED", True),
+        )
+
+    def get(self, user_id: int, load: Callable[[int], Optional[UserSnapshot]]) -> Optional[UserSnapshot]:
+        """The snapshot for `user_id`, calling `load` (a database read) on a miss."""
+        if not self.enabled:
+            return load(user_id)
+        key = str(user_id)
+        snapshot = self.local.get(key)
+        if snapshot is None and self.shared is not None:
+            data = self.shared.get(key)
+            if data:
+                snapshot = UserSnapshot(**data)
+                self.local.set(key, snapshot, self.local_ttl)
+        if snapshot is not None:
+            with self._lock:
+                self.hits += 1
+            return snapshot
+
+        with self._lock:
+            self.misses += 1
+        snapshot = load(user_id)
+        if snapshot is not None:
+            self.local.set(key, snapshot, self.local_ttl)
+            if self.shared is not None:
+                self.shared.set(key, snapshot.to_dict(), self.ttl)
+        return snapshot
+
+    def invalidate(self, user_id: int):
+        """Drops a user whose row changed (deleted, password reset, admin flag)."""
+        key = str(user_id)
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "memory+redis" if self.shared is not None else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def get_user_cache() -> UserCache:
+    """Returns the user cache created by create_app for the current app."""
+    return current_app.extensions["user_cache"]
+
+
+def invalidate_user(user_id: int):
+    """Call after committing a change to a user's row."""
+    get_user_cache().invalidate(user_id)
+
+
+@users_cli.command("set-admin")
+@click.argument("email")
+@click.option("--revoke", is_flag=True, help="Remove admin rights instead of granting them.")
+def set_admin_command(email, revoke):
+    """Grant (or with --revoke, remove) admin rights."""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f"No user with email {email}")
+    user.is_admin = not revoke
+    db.session.commit()
+    # Reaches the Redis tier; other processes' in-process entries expire on their own
+    invalidate_user(user.user_id)
+    click.echo(f"{email}: is_admin={user.is_admin}")
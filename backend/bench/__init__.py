@@ -0,0 +1 @@
+"""Load-test harness for the Flask gateway and FastAPI AI service (see bench/README.md)."""
@@ -0,0 +1,82 @@
+"""Compares two bench/run.py result files, e.g. before and after a change.
+
+    python -m bench.compare base.json head.json [--fail-over 10]
+
+Prints throughput and p50/p95/p99 per endpoint with the relative change. With
+--fail-over PCT the exit status is 1 when any endpoint's p95 got more than PCT
+percent slower or its error rate rose, so the comparison can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import Optional
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate")
+
+# Endpoints with too few samples have unstable percentiles; they are shown but never fail the gate
+MIN_REQUESTS = 20
+
+
+def _change(old: Optional[float], new: Optional[float]) -> str:
+    if old is None or new is None:
+        return "n/a"
+    if old == 0:
+        return "=" if new == 0 else "new"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        results = json.load(f)
+    if results.get("schema") != 1:
+        raise SystemExit(f"{path}: unsupported results schema {results.get('schema')!r}")
+    return results
+
+
+def compare(base: dict, head: dict, fail_over: Optional[float] = None) -> list:
+    """Prints the comparison; returns the regressions beyond `fail_over`."""
+    for key in ("users", "duration_s", "think_ms", "mix", "database", "stub", "env"):
+        if base["config"].get(key) != head["config"].get(key):
+            print(f"warning: runs differ in {key}: {base['config'].get(key)} vs {head['config'].get(key)}")
+
+    regressions = []
+    header = f"{'endpoint':24s} {'metric':15s} {'base':>10s} {'head':>10s} {'change':>8s}"
+    print(header)
+    print("-" * len(header))
+    endpoints = sorted(set(base["endpoints"]) | set(head["endpoints"]))
+    for endpoint in endpoints:
+        old, new = base["endpoints"].get(endpoint, {}), head["endpoints"].get(endpoint, {})
+        for metric in METRICS:
+            a, b = old.get(metric), new.get(metric)
+            print(f"{endpoint:24s} {metric:15s} {a if a is not None else '-':>10} "
+                  f"{b if b is not None else '-':>10} {_change(a, b):>8s}")
+        if fail_over is None or not old or not new:
+            continue
+        if min(old["requests"], new["requests"]) < MIN_REQUESTS:
+            continue
+        if old["p95_ms"] and (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > fail_over:
+            regressions.append(f"{endpoint}: p95 {old['p95_ms']} -> {new['p95_ms']} ms")
+        if new["error_rate"] > old["error_rate"]:
+            regressions.append(f"{endpoint}: error rate {old['error_rate']} -> {new['error_rate']}")
+
+    a, b = base["summary"]["throughput_rps"], head["summary"]["throughput_rps"]
+    print(f"\noverall throughput {a} -> {b} req/s ({_change(a, b)})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--fail-over", type=float, metavar="PCT",
+                        help="exit 1 if any endpoint's p95 regressed by more than PCT percent")
+    args = parser.parse_args(argv)
+
+    regressions = compare(_load(args.base), _load(args.head), args.fail_over)
+    if regressions:
+        print("\nregressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
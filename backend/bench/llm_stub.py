@@ -0,0 +1,148 @@
+"""Local OpenAI-compatible chat completions endpoint for benchmarks.
+
+Stands in for Azure OpenAI so the services can be load-tested offline and with
+reproducible upstream behaviour. Serves both the Azure route
+(/openai/deployments/<name>/chat/completions) and the plain OpenAI one
+(/v1/chat/completions), blocking and streamed. Configured from the environment:
+
+    STUB_LATENCY_MS      time to first token (default 300)
+    STUB_JITTER_MS       +/- uniform jitter on that latency (default 50)
+    STUB_TOKENS_PER_SEC  generation speed; a blocking reply takes latency + tokens / rate (default 60)
+    STUB_REPLY_TOKENS    completion length in words, roughly tokens (default 120)
+    STUB_ERROR_RATE      share of calls answered with a 500 (default 0)
+    STUB_THROTTLE_RATE   share of calls answered with a 429 + retry-after-ms (default 0)
+    STUB_SEED            seed for the jitter and error draws (default 0)
+
+Run it on its own with `python -m bench.llm_stub --port 9100`; bench/run.py starts it for you.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "300"))
+JITTER_MS = float(os.getenv("STUB_JITTER_MS", "50"))
+TOKENS_PER_SEC = float(os.getenv("STUB_TOKENS_PER_SEC", "60"))
+REPLY_TOKENS = int(os.getenv("STUB_REPLY_TOKENS", "120"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+THROTTLE_RATE = float(os.getenv("STUB_THROTTLE_RATE", "0"))
+SEED = int(os.getenv("STUB_SEED", "0"))
+
+# Streamed replies are sent in batches of this many tokens, like Azure does under load
+STREAM_BATCH_TOKENS = 4
+
+# Typical reply shape, including the markdown the AI service has to strip
+_REPLY_WORDS = (
+    "I hear you, and what you are describing sounds **really difficult**. Under the Labour Act an "
+    "employer must give written notice before ending your contract, and dismissal because of "
+    "pregnancy is *unfair*. You can:\n- keep copies of your contract and payslips\n- write down "
+    "dates, names and what was said\n- contact the National Labour Commission for free advice\n"
+    "If you ever feel unsafe at home or at work, call 112. Was this helpful?"
+).split(" ")
+
+app = FastAPI(title="Tena AI - LLM stub")
+rng = random.Random(SEED)
+calls = {"total": 0, "errors": 0, "throttled": 0, "streamed": 0}
+
+
+def _reply_text() -> str:
+    words = [_REPLY_WORDS[i % len(_REPLY_WORDS)] for i in range(REPLY_TOKENS)]
+    return " ".join(words)
+
+
+def _estimate_tokens(messages: list) -> int:
+    return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+
+def _first_token_delay() -> float:
+    return max(0.0, LATENCY_MS + rng.uniform(-JITTER_MS, JITTER_MS)) / 1000
+
+
+def _chunk(text: str, finish_reason=None) -> str:
+    payload = {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "delta": {"content": text} if text else {}, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def _completion(request: Request):
+    body = await request.json()
+    calls["total"] += 1
+    draw = rng.random()
+    if draw < THROTTLE_RATE:
+        calls["throttled"] += 1
+        return JSONResponse({"error": {"code": "429", "message": "Rate limit reached (stub)"}},
+                            status_code=429, headers={"retry-after-ms": "500"})
+    if draw < THROTTLE_RATE + ERROR_RATE:
+        calls["errors"] += 1
+        await asyncio.sleep(_first_token_delay())
+        return JSONResponse({"error": {"code": "500", "message": "Injected failure (stub)"}}, status_code=500)
+
+    max_tokens = body.get("max_tokens") or REPLY_TOKENS
+    words = _reply_text().split(" ")[:max_tokens]
+    per_token = 1 / TOKENS_PER_SEC if TOKENS_PER_SEC > 0 else 0.0
+    delay = _first_token_delay()
+
+    if body.get("stream"):
+        calls["streamed"] += 1
+
+        async def events():
+            # Azure opens with a chunk that only carries content-filter results
+            yield "data: " + json.dumps({"id": "", "object": "", "created": 0, "model": "",
+                                         "choices": [], "prompt_filter_results": []}) + "\n\n"
+            await asyncio.sleep(delay)
+            for i in range(0, len(words), STREAM_BATCH_TOKENS):
+                batch = words[i:i + STREAM_BATCH_TOKENS]
+                if i:
+                    await asyncio.sleep(per_token * len(batch))
+                yield _chunk(("" if i == 0 else " ") + " ".join(batch))
+            yield _chunk("", finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(delay + per_token * len(words))
+    prompt_tokens = _estimate_tokens(body.get("messages", []))
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                  "total_tokens": prompt_tokens + len(words)},
+    }
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: Request):
+    return await _completion(request)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    return await _completion(request)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "calls": calls}
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,518 @@
+"""Load test of the whole chat path: browser -> Flask gateway -> FastAPI -> LLM.
+
+Starts the LLM stub (bench/llm_stub.py), the FastAPI AI service and the Flask
+gateway (gunicorn, as deployed) on free local ports, against a fresh SQLite file
+or a local PostgreSQL database, then runs closed-loop virtual users that each
+register, log in and pick actions from a weighted mix:
+
+    chat         POST /api/chat
+    chat_stream  POST /api/chat/stream (also reports time to first delta)
+    history      GET  /api/chat/history
+    messages     GET  /api/chat/messages/<session_uuid> of one of the user's sessions
+    login        POST /api/auth/login
+    status       GET  /api/auth/status
+
+Throughput and p50/p95/p99 latency per endpoint are written as JSON (see
+bench/README.md for the format); compare two runs with `python -m bench.compare`.
+
+    python -m bench.run --users 20 --duration 60 --out results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULTS_SCHEMA = 1
+
+DEFAULT_MIX = "chat=50,history=15,messages=15,chat_stream=5,status=10,login=5"
+ACTIONS = ("chat", "chat_stream", "history", "messages", "login", "status")
+
+# What users send, weighted: model questions, FAQ hits answered by the gateway, small
+# talk, and the occasional crisis message answered locally with the helplines
+MESSAGES = (
+    (40, "My employer fired me after I told her I was pregnant. What can I do?"),
+    (15, "Is it legal for my landlord to keep my deposit because I am a woman living alone?"),
+    (10, "My husband takes all the money I earn from my shop. Does the law protect me?"),
+    (10, "how do i report abuse"),
+    (10, "what are my rights"),
+    (10, "Thank you, that was helpful"),
+    (5, "I want to kill myself"),
+)
+
+PASSWORD = "bench-password"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil without floats
+    return ordered[int(rank) - 1]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {name!r} (expected one of {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one action with a positive weight")
+    return mix
+
+
+def parse_env(items: List[str]) -> Dict[str, str]:
+    env = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--env expects KEY=VALUE, got {item!r}")
+        env[key] = value
+    return env
+
+
+class Service:
+    """A child process serving HTTP, with its output captured in a log file."""
+
+    def __init__(self, name: str, argv: List[str], env: dict, health_url: str, log_dir: str,
+                 cwd: str = BACKEND_DIR):
+        self.name = name
+        self.argv = argv
+        self.env = env
+        self.cwd = cwd
+        self.health_url = health_url
+        self.log_path = os.path.join(log_dir, f"{name}.log")
+        self.process = None
+
+    def start(self):
+        log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            self.argv, cwd=self.cwd, env=self.env,
+            stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        log.close()
+
+    def wait_ready(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with {self.process.returncode}; see {self.log_path}")
+            try:
+                if requests.get(self.health_url, timeout=1).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{self.name} not ready after {timeout:.0f}s; see {self.log_path}")
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        # The whole process group, so gunicorn/uvicorn workers go too
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+
+class Stack:
+    """The three services wired together on free ports."""
+
+    def __init__(self, args, work_dir: str):
+        self.args = args
+        self.work_dir = work_dir
+        self.internal_key = uuid.uuid4().hex
+        self.database_url = args.database_url or f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+        self.stub_url = f"http://127.0.0.1:{free_port()}"
+        self.fastapi_url = f"http://127.0.0.1:{free_port()}"
+        self.flask_url = f"http://127.0.0.1:{free_port()}"
+        self.services: List[Service] = []
+
+    def _env(self, **extra) -> dict:
+        env = dict(os.environ)
+        env.update({key: str(value) for key, value in extra.items()})
+        env.update(self.args.env)
+        return env
+
+    def start(self):
+        args = self.args
+        python = sys.executable
+        stub_port, fastapi_port, flask_port = (url.rsplit(":", 1)[1] for url in
+                                               (self.stub_url, self.fastapi_url, self.flask_url))
+        stub = Service("llm_stub", [python, "-m", "bench.llm_stub", "--port", stub_port], self._env(
+            STUB_LATENCY_MS=args.stub_latency_ms,
+            STUB_JITTER_MS=args.stub_jitter_ms,
+            STUB_TOKENS_PER_SEC=args.stub_tokens_per_sec,
+            STUB_REPLY_TOKENS=args.stub_reply_tokens,
+            STUB_ERROR_RATE=args.stub_error_rate,
+            STUB_THROTTLE_RATE=args.stub_throttle_rate,
+            STUB_SEED=args.seed,
+        ), f"{self.stub_url}/health", self.work_dir)
+
+        fastapi = Service("fastapi", [
+            python, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", fastapi_port,
+            "--workers", str(args.fastapi_workers), "--log-level", "warning", "--no-access-log",
+        ], self._env(
+            AZURE_OPENAI_KEY="bench",
+            AZURE_OPENAI_ENDPOINT=self.stub_url,
+            AZURE_OPENAI_DEPLOYMENT="bench",
+            INTERNAL_API_KEY=self.internal_key,
+            # Every chat turn should reach the model unless the run asks otherwise
+            ENABLE_RESPONSE_CACHE="0",
+        ), f"{self.fastapi_url}/health", self.work_dir, cwd=os.path.join(BACKEND_DIR, "fastapi_service"))
+
+        flask_env = self._env(
+            DATABASE_URL=self.database_url,
+            SECRET_KEY=uuid.uuid4().hex,
+            FLASK_ENV="development",
+            FASTAPI_URL=self.fastapi_url,
+            INTERNAL_API_KEY=self.internal_key,
+            GUNICORN_BIND=f"127.0.0.1:{flask_port}",
+            GUNICORN_WORKERS=args.flask_workers,
+        )
+        self._create_schema(flask_env)
+        flask = Service("flask", [python, "-m", "gunicorn", "-c", "gunicorn.conf.py", "run:app"],
+                        flask_env, f"{self.flask_url}/api/health", self.work_dir)
+
+        for service in (stub, fastapi, flask):
+            self.services.append(service)
+            service.start()
+        for service in self.services:
+            service.wait_ready()
+
+    def _create_schema(self, env: dict):
+        # Migrations are PostgreSQL-specific; create_all builds the same tables on
+        # either engine and leaves existing ones alone
+        script = ("from app import create_app\nfrom app.models import db\n"
+                  "app = create_app()\nwith app.app_context():\n    db.create_all()\n")
+        subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        for service in reversed(self.services):
+            service.stop()
+
+    def snapshot(self) -> dict:
+        """Service-side counters worth keeping next to the results."""
+        diagnostics = {}
+        for name, url, headers in (
+            ("llm_stub", f"{self.stub_url}/health", {}),
+            ("fastapi", f"{self.fastapi_url}/ai/stats", {"X-Internal-Key": self.internal_key}),
+        ):
+            try:
+                diagnostics[name] = requests.get(url, headers=headers, timeout=5).json()
+            except (requests.RequestException, ValueError) as exc:
+                diagnostics[name] = {"error": str(exc)}
+        return diagnostics
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by every virtual user."""
+
+    def __init__(self):
+        self.recording = False
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._statuses: Dict[str, Dict[str, int]] = {}
+        self._sources: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, seconds: float, status, ok: bool, source: Optional[str] = None):
+        if not self.recording:
+            return
+        with self._lock:
+            self._latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+            statuses = self._statuses.setdefault(endpoint, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if source:
+                sources = self._sources.setdefault(endpoint, {})
+                sources[source] = sources.get(source, 0) + 1
+
+    def results(self, elapsed: float) -> dict:
+        endpoints = {}
+        total = errors = 0
+        with self._lock:
+            for endpoint in sorted(self._latencies):
+                ordered = sorted(self._latencies[endpoint])
+                count, failed = len(ordered), self._errors.get(endpoint, 0)
+                # Timings like time-to-first-delta are not separate requests
+                if ":" not in endpoint:
+                    total += count
+                    errors += failed
+                endpoints[endpoint] = {
+                    "requests": count,
+                    "errors": failed,
+                    "error_rate": round(failed / count, 4),
+                    "throughput_rps": round(count / elapsed, 2),
+                    "mean_ms": round(sum(ordered) / count * 1000, 1),
+                    "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+                    "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+                    "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                    "status": self._statuses.get(endpoint, {}),
+                }
+                if endpoint in self._sources:
+                    endpoints[endpoint]["source"] = self._sources[endpoint]
+        return {
+            "summary": {
+                "duration_s": round(elapsed, 2),
+                "requests": total,
+                "errors": errors,
+                "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            },
+            "endpoints": endpoints,
+        }
+
+
+class VirtualUser(threading.Thread):
+    """One signed-in browser: think, act, repeat until `stop` is set."""
+
+    def __init__(self, index: int, base_url: str, recorder: Recorder, mix: Dict[str, float],
+                 think: float, seed: int, run_id: str, stop: threading.Event, timeout: float):
+        super().__init__(name=f"vu-{index}", daemon=True)
+        self.base_url = base_url
+        self.recorder = recorder
+        self.actions = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.actions]
+        self.think = think
+        self.rng = random.Random(seed * 1000 + index)
+        self.email = f"bench-{run_id}-{index}@example.com"
+        self.stop_event = stop
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.sessions: List[str] = []
+        self.ready = threading.Event()
+        self.setup_error: Optional[str] = None
+
+    def _request(self, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as exc:
+            self.recorder.record(endpoint, time.perf_counter() - started, type(exc).__name__, False)
+            return None
+        source = None
+        if endpoint == "chat" and resp.ok:
+            source = (resp.json().get("source") or "model") if resp.content else None
+        self.recorder.record(endpoint, time.perf_counter() - started, resp.status_code,
+                             resp.ok or resp.status_code == 304, source)
+        return resp
+
+    def setup(self):
+        for path in ("/api/auth/register", "/api/auth/login"):
+            resp = self.http.post(self.base_url + path, json={"email": self.email, "password": PASSWORD},
+                                  timeout=self.timeout)
+            if not resp.ok:
+                raise RuntimeError(f"{path} failed for {self.email}: {resp.status_code} {resp.text[:200]}")
+
+    def run(self):
+        try:
+            self.setup()
+        except Exception as exc:
+            self.setup_error = str(exc)
+            return
+        finally:
+            self.ready.set()
+        while not self.stop_event.is_set():
+            action = self.rng.choices(self.actions, self.weights)[0]
+            getattr(self, f"do_{action}")()
+            if self.think:
+                self.stop_event.wait(self.rng.uniform(0, 2 * self.think))
+
+    def _chat_payload(self) -> dict:
+        message = self.rng.choices([m for _, m in MESSAGES], [w for w, _ in MESSAGES])[0]
+        # Mostly continue a conversation, sometimes start a new one
+        if self.sessions and self.rng.random() < 0.8:
+            session_id = self.sessions[-1]
+        else:
+            session_id = uuid.uuid4().hex
+            self.sessions.append(session_id)
+        return {"message": message, "session_id": session_id}
+
+    def do_chat(self):
+        self._request("chat", "POST", "/api/chat", json=self._chat_payload())
+
+    def do_chat_stream(self):
+        started = time.perf_counter()
+        first_delta = None
+        try:
+            with self.http.post(self.base_url + "/api/chat/stream", json=self._chat_payload(),
+                                stream=True, timeout=self.timeout) as resp:
+                ok = resp.ok
+                for line in resp.iter_lines():
+                    if first_delta is None and line.startswith(b"data:"):
+                        first_delta = time.perf_counter() - started
+                    if line.startswith(b"event: error"):
+                        ok = False
+                status = resp.status_code
+        except requests.RequestException as exc:
+            ok, status = False, type(exc).__name__
+        self.recorder.record("chat_stream", time.perf_counter() - started, status, ok)
+        if first_delta is not None:
+            self.recorder.record("chat_stream:first_delta", first_delta, status, ok)
+
+    def do_history(self):
+        self._request("history", "GET", "/api/chat/history")
+
+    def do_messages(self):
+        if not self.sessions:
+            return self.do_chat()
+        session_id = self.rng.choice(self.sessions)
+        self._request("messages", "GET", f"/api/chat/messages/{session_id}")
+
+    def do_login(self):
+        self._request("login", "POST", "/api/auth/login", json={"email": self.email, "password": PASSWORD})
+
+    def do_status(self):
+        self._request("status", "GET", "/api/auth/status")
+
+
+def git_revision() -> dict:
+    def git(*argv):
+        return subprocess.run(["git", *argv], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def run_load(args, base_url: str) -> dict:
+    recorder = Recorder()
+    stop = threading.Event()
+    run_id = uuid.uuid4().hex[:8]
+    users = [VirtualUser(i, base_url, recorder, args.mix, args.think_ms / 1000, args.seed, run_id, stop,
+                         args.request_timeout)
+             for i in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.ready.wait()
+    failed = [user.setup_error for user in users if user.setup_error]
+    if failed:
+        stop.set()
+        raise RuntimeError(f"{len(failed)} virtual users could not sign in, e.g. {failed[0]}")
+
+    print(f"{args.users} users signed in; warming up for {args.warmup}s", file=sys.stderr)
+    time.sleep(args.warmup)
+    recorder.recording = True
+    started = time.monotonic()
+    print(f"measuring for {args.duration}s", file=sys.stderr)
+    time.sleep(args.duration)
+    recorder.recording = False
+    elapsed = time.monotonic() - started
+    stop.set()
+    for user in users:
+        user.join(args.request_timeout + 5)
+    return recorder.results(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Flask gateway and FastAPI service against a local LLM stub.")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users (default 20)")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds (default 60)")
+    parser.add_argument("--warmup", type=float, default=10, help="unmeasured seconds first (default 10)")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between a user's requests (default 500)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"action weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1, help="seeds the users' choices and the stub (default 1)")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--database-url", help="PostgreSQL URL to use instead of a fresh SQLite file; "
+                                               "use a scratch database, the run adds users and chats")
+    parser.add_argument("--flask-workers", type=int, default=2)
+    parser.add_argument("--fastapi-workers", type=int, default=1)
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--stub-jitter-ms", type=float, default=50)
+    parser.add_argument("--stub-tokens-per-sec", type=float, default=60)
+    parser.add_argument("--stub-reply-tokens", type=int, default=120)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="share of LLM calls failing with 500")
+    parser.add_argument("--stub-throttle-rate", type=float, default=0.0, help="share of LLM calls answered 429")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for all services, e.g. --env MESSAGE_WRITE_BEHIND=1 (repeatable)")
+    parser.add_argument("--keep-logs", action="store_true", help="keep service logs and the SQLite file")
+    parser.add_argument("--out", help="write the JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    args.env = parse_env(args.env)
+
+    work_dir = tempfile.mkdtemp(prefix="tena-bench-")
+    stack = Stack(args, work_dir)
+    try:
+        stack.start()
+        results = run_load(args, stack.flask_url)
+        diagnostics = stack.snapshot()
+    finally:
+        stack.stop()
+        if args.keep_logs:
+            print(f"service logs in {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "run": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "users": args.users,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "think_ms": args.think_ms,
+            "mix": args.mix,
+            "seed": args.seed,
+            "database": "postgresql" if args.database_url else "sqlite",
+            "flask_workers": args.flask_workers,
+            "fastapi_workers": args.fastapi_workers,
+            "stub": {
+                "latency_ms": args.stub_latency_ms,
+                "jitter_ms": args.stub_jitter_ms,
+                "tokens_per_sec": args.stub_tokens_per_sec,
+                "reply_tokens": args.stub_reply_tokens,
+                "error_rate": args.stub_error_rate,
+                "throttle_rate": args.stub_throttle_rate,
+            },
+            "env": args.env,
+        },
+        **results,
+        "diagnostics": diagnostics,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,15 @@ class Config:
    Testing=False
    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
    SQLALCHEMY_TRACK_MODIFICATIONS = False
+   if (SQLALCHEMY_DATABASE_URI or "").startswith("postgres"):
+      # Bounded per-worker pool; with gevent workers many greenlets share it, so
+      # requests queue for up to DB_POOL_TIMEOUT seconds instead of opening more connections
+      SQLALCHEMY_ENGINE_OPTIONS = {
+         "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+         "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+         "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+         "pool_pre_ping": True,
+      }
    SECRET_KEY = os.getenv("SECRET_KEY")
    AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
    AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -17,11 +26,101 @@ class Config:
    if FLASK_ENV == "development":
       # frontend origin for CORS (set to '*' for dev)
       FRONTEND_URL = os.getenv("http://localhost:5173")
-      FASTAPI_URL = os.getenv("http://localhost:8000")
+      FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
    elif  FLASK_ENV == "production":
       FRONTEND_URL = os.getenv("FRONTEND_URL", "https://tenaai.vercel.app")
       FASTAPI_URL = os.getenv("FASTAPI_URL", "https://tena-fastapi.onrender.com")
    else:
       FRONTEND_URL = "https://tenaai.vercel.app"
-      FASTAPI_URL = "https://tena-fastapi.onrender.com"      
-           
\ No newline at end of file
+      FASTAPI_URL = "https://tena-fastapi.onrender.com"
+
+   # Flask -> FastAPI gateway client (one keep-alive pool per worker)
+   INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
+   AI_GATEWAY_POOL_SIZE = int(os.getenv("AI_GATEWAY_POOL_SIZE", "10"))
+   AI_GATEWAY_CONNECT_TIMEOUT = float(os.getenv("AI_GATEWAY_CONNECT_TIMEOUT", "5"))
+   AI_GATEWAY_READ_TIMEOUT = float(os.getenv("AI_GATEWAY_READ_TIMEOUT", "30"))
+   AI_GATEWAY_MAX_RETRIES = int(os.getenv("AI_GATEWAY_MAX_RETRIES", "2"))
+   AI_GATEWAY_BACKOFF = float(os.getenv("AI_GATEWAY_BACKOFF", "0.2"))
+
+   # Circuit breaker around the AI service; AI_GATEWAY_READ_TIMEOUT is the timeout ceiling
+   AI_BREAKER_WINDOW = float(os.getenv("AI_BREAKER_WINDOW", "60"))  # seconds of outcomes considered
+   AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "10"))
+   AI_BREAKER_FAILURE_RATE = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5"))
+   AI_BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("AI_BREAKER_CONSECUTIVE_FAILURES", "5"))
+   AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "15"))  # seconds open before a probe
+   AI_BREAKER_MIN_TIMEOUT = float(os.getenv("AI_BREAKER_MIN_TIMEOUT", "5"))
+   AI_BREAKER_TIMEOUT_MULTIPLIER = float(os.getenv("AI_BREAKER_TIMEOUT_MULTIPLIER", "2"))  # x observed p99
+   DEGRADED_FAQ_MIN_COVERAGE = float(os.getenv("DEGRADED_FAQ_MIN_COVERAGE", "0.3"))
+
+   # Chat context window sent to the AI service, bounded by prompt tokens
+   CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+   CONTEXT_SYSTEM_PROMPT_TOKENS = int(os.getenv("CONTEXT_SYSTEM_PROMPT_TOKENS", "1200"))  # size of the FastAPI system prompt
+   CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "50"))
+   CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "estimate")  # or a tiktoken encoding, e.g. cl100k_base
+
+   # Rolling conversation summaries, built in the background after a reply
+   SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "1") == "1"
+   SUMMARY_TRIGGER_MESSAGES = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", "30"))  # unsummarized messages before folding
+   SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "10"))  # newest messages always sent verbatim
+   SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "60"))
+
+   # Hot history cache for active chat sessions (Redis when REDIS_URL is set, else in-process LRU with one worker)
+   REDIS_URL = os.getenv("REDIS_URL")
+   HISTORY_CACHE_BACKEND = os.getenv("HISTORY_CACHE_BACKEND", "auto")  # auto | redis | memory | off
+   # Web worker processes (exported by gunicorn.conf.py); per-process caches are only safe with one
+   WEB_WORKERS = int(os.getenv("GUNICORN_WORKERS", "1"))
+   HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", "1800"))  # seconds
+   HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", "2000"))  # in-process backend only
+
+   # Rights/FAQ knowledge file, indexed at startup and re-read when it changes
+   KNOWLEDGE_FILE = os.getenv("KNOWLEDGE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rights_data.json"))
+   KNOWLEDGE_RELOAD_INTERVAL = float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "5"))  # seconds between mtime checks
+   FAQ_FAST_PATH = os.getenv("FAQ_FAST_PATH", "1") == "1"
+   FAQ_MIN_COVERAGE = float(os.getenv("FAQ_MIN_COVERAGE", "0.6"))  # share of content words a FAQ must explain
+   FAQ_MAX_WORDS = int(os.getenv("FAQ_MAX_WORDS", "12"))  # longer messages always go to the model
+   FAQ_PERSIST_MESSAGES = os.getenv("FAQ_PERSIST_MESSAGES", "1") == "1"
+
+   # Local crisis-language detector: answers with the helplines before (or instead of) the model
+   CRISIS_FAST_PATH = os.getenv("CRISIS_FAST_PATH", "1") == "1"
+   CRISIS_LEXICON_FILE = os.getenv("CRISIS_LEXICON_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "crisis_lexicon.json"))
+
+   # Admin metrics counters (rows per counter; more shards = less write contention)
+   STATS_SHARDS = int(os.getenv("STATS_SHARDS", "8"))
+   STATS_MAX_RANGE_DAYS = int(os.getenv("STATS_MAX_RANGE_DAYS", "366"))
+
+   # Optional write-behind persistence of chat messages (batched by a background thread)
+   MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "0") == "1"
+   MESSAGE_QUEUE_SIZE = int(os.getenv("MESSAGE_QUEUE_SIZE", "10000"))  # turns; when full, writes go synchronous
+   MESSAGE_FLUSH_BATCH = int(os.getenv("MESSAGE_FLUSH_BATCH", "500"))  # max rows per insert
+   MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.2"))  # max seconds a row waits
+
+   # Chat rate limits per client IP, chat session and signed-in user (0 disables a window)
+   RATE_LIMIT_ENABLED = os.getenv("ENABLE_RATE_LIMIT", "0") == "1"
+   RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "auto")  # auto | redis | memory
+   RATE_LIMIT_MINUTE = int(os.getenv("RATE_LIMIT_MINUTE", "60"))
+   RATE_LIMIT_HOUR = int(os.getenv("RATE_LIMIT_HOUR", "1000"))
+   RATE_LIMIT_IP_MINUTE = int(os.getenv("RATE_LIMIT_IP_MINUTE", str(RATE_LIMIT_MINUTE)))  # IPs may be shared (NAT)
+   RATE_LIMIT_IP_HOUR = int(os.getenv("RATE_LIMIT_IP_HOUR", str(RATE_LIMIT_HOUR)))
+   RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))  # proxies appending X-Forwarded-For
+
+   # Signed-in user snapshots served to Flask-Login without a query (Redis tier when REDIS_URL is set)
+   USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "1") == "1"
+   USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "auto")  # auto | redis | memory
+   USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))  # seconds; bounds staleness of edits made outside the app
+   USER_CACHE_LOCAL_TTL = int(os.getenv("USER_CACHE_LOCAL_TTL", "5"))  # in-process tier when Redis is shared
+   USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+   # Password reset links: only a hash of each token is stored, expired ones are swept
+   RESET_TOKEN_LIFESPAN = int(os.getenv("RESET_TOKEN_LIFESPAN", "3600"))  # seconds
+   RESET_TOKEN_SWEEP_INTERVAL = int(os.getenv("RESET_TOKEN_SWEEP_INTERVAL", "600"))  # per process, on issue; 0 = cron only
+
+   # Prometheus metrics on /metrics (set PROMETHEUS_MULTIPROC_DIR to aggregate gunicorn workers)
+   METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+   METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # if set, scrapes must send "Authorization: Bearer <token>"
+   SLOW_REQUEST_LOG_MS = float(os.getenv("SLOW_REQUEST_LOG_MS", "5000"))  # log stage timings of slower requests; 0 = off
+
+   # Password hashing: bcrypt cost, and native threads per worker so login bursts can't starve chat
+   BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))  # hashes of another cost are upgraded at login
+   PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+   PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # beyond this, 503 immediately
+   PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))  # seconds queued before a 503
@@ -0,0 +1,146 @@
+"""Circuit breaker for calls to the model provider, with a p99-derived timeout."""
+import time
+from collections import deque
+from typing import Optional
+
+
+class CircuitBreaker:
+    """Rolling-window breaker. Only touched from the event loop, so no locking is needed.
+
+    Opens after `consecutive_failures` failures in a row, or once at least
+    `min_calls` calls in the last `window` seconds failed at `failure_rate` or
+    more. While open, callers are rejected for `cooldown` seconds; then a single
+    probe is let through and its outcome closes or re-opens the breaker.
+    timeout() is the p99 latency of recent successful calls times
+    `timeout_multiplier`, clamped to [min_timeout, max_timeout].
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, window: float = 60.0, min_calls: int = 10,
+                 failure_rate: float = 0.5, consecutive_failures: int = 5,
+                 cooldown: float = 15.0, max_samples: int = 1000,
+                 min_timeout: float = 5.0, max_timeout: float = 30.0,
+                 timeout_multiplier: float = 2.0, min_latency_samples: int = 20):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_latency_samples = min_latency_samples
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=max_samples)   # (finished_at, ok)
+        self._latencies = deque(maxlen=max_samples)  # (finished_at, seconds)
+        self._failures_in_row = 0
+        self._probe_started: Optional[float] = None
+        self._timeout = max_timeout
+        self._median: Optional[float] = None
+        self._timeout_at = 0.0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probe_started = None
+        if self.state == self.HALF_OPEN and (
+                self._probe_started is None or now - self._probe_started > self.max_timeout):
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency: Optional[float] = None):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+        self._failures_in_row = 0
+        self._outcomes.append((now, True))
+        if latency is not None:
+            self._latencies.append((now, latency))
+
+    def release(self):
+        """Ends an allowed call that never reached the provider (e.g. it was not
+        admitted) without an outcome; a half-open breaker lets the next probe through."""
+        if self.state == self.HALF_OPEN:
+            self._probe_started = None
+
+    def record_failure(self):
+        now = time.monotonic()
+        self._failures_in_row += 1
+        self._outcomes.append((now, False))
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._should_open(now)):
+            self.state = self.OPEN
+            self.opened_at = now
+            self.times_opened += 1
+            self._probe_started = None
+
+    def _recent(self, samples: deque, now: float) -> list:
+        return [value for finished_at, value in samples if now - finished_at <= self.window]
+
+    def _should_open(self, now: float) -> bool:
+        if self._failures_in_row >= self.consecutive_failures:
+            return True
+        recent = self._recent(self._outcomes, now)
+        return len(recent) >= self.min_calls and recent.count(False) / len(recent) >= self.failure_rate
+
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    @staticmethod
+    def _percentile(values: list, q: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def _refresh_latency(self):
+        # Recomputed at most once a second
+        now = time.monotonic()
+        if now - self._timeout_at >= 1.0:
+            latencies = self._recent(self._latencies, now)
+            timeout = self.max_timeout
+            if len(latencies) >= self.min_latency_samples:
+                p99 = self._percentile(latencies, 0.99)
+                timeout = min(max(p99 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+            self._timeout, self._median, self._timeout_at = timeout, self._percentile(latencies, 0.5), now
+
+    def timeout(self) -> float:
+        """Adaptive timeout for the next call."""
+        self._refresh_latency()
+        return self._timeout
+
+    def median_latency(self) -> Optional[float]:
+        """p50 of recent successful calls, None before the first one."""
+        self._refresh_latency()
+        return self._median
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        recent = self._recent(self._outcomes, now)
+        latencies = self._recent(self._latencies, now)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "calls": len(recent),
+            "failure_rate": round(recent.count(False) / len(recent), 4) if recent else 0.0,
+            "latency_p50": self._percentile(latencies, 0.50),
+            "latency_p95": self._percentile(latencies, 0.95),
+            "latency_p99": self._percentile(latencies, 0.99),
+            "timeout": round(self.timeout(), 3),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 3),
+        }
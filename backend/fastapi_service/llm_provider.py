@@ -0,0 +1,226 @@
+"""Chat completion providers: Azure OpenAI, any OpenAI-compatible endpoint, and a
+deterministic local stand-in that needs no model at all."""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class Completion:
+    __slots__ = ("text", "total_tokens", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, text: str, total_tokens: Optional[int] = None,
+                 prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        self.text = text
+        self.total_tokens = total_tokens
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class TextStream:
+    """The text deltas of a streamed reply. Use as `async with stream: async for text in stream`;
+    leaving the block releases the upstream connection, even if the client went away."""
+
+    def __init__(self, deltas: AsyncIterator[str], close: Optional[Callable[[], Awaitable]] = None):
+        self._deltas = deltas
+        self._close = close
+
+    def __aiter__(self):
+        return self._deltas
+
+    async def __aenter__(self) -> "TextStream":
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._close is not None:
+            await self._close()
+        return False
+
+
+class ChatProvider(ABC):
+    """What the endpoints need from a model provider.
+
+    Admission, retries and the circuit breaker stay with the caller (main.py), so
+    every provider goes through the same path. Failures surface as the openai SDK's
+    exceptions, which is what the scheduler retries and the breaker counts.
+    `canned_replies` providers don't actually read the conversation.
+    """
+
+    name = "base"
+    canned_replies = False
+
+    def __init__(self, model: Optional[str]):
+        self.model = model
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.model)
+
+    def check_config(self):
+        """Raises ValueError if the provider can't be called."""
+        if not self.configured:
+            raise ValueError(f"{self.name} provider configuration incomplete")
+
+    @abstractmethod
+    async def complete(self, messages: list[dict], timeout: Optional[float] = None, **params) -> Completion:
+        """The whole reply at once."""
+
+    @abstractmethod
+    async def stream(self, messages: list[dict], timeout: Optional[float] = None, **params) -> TextStream:
+        """The reply as it is generated."""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"provider": self.name, "model": self.model}
+
+
+async def _sdk_deltas(stream) -> AsyncIterator[str]:
+    async for chunk in stream:
+        # Azure sends a leading chunk with only content-filter results and no choices
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+class OpenAICompatibleProvider(ChatProvider):
+    """Chat completions over the openai SDK against any OpenAI-compatible server
+    (OpenAI, vLLM, Ollama, LiteLLM, ...). `http_client` carries the shared
+    keep-alive pool; the SDK's own retries are off since the scheduler retries."""
+
+    name = "openai"
+
+    def __init__(self, base_url: Optional[str], api_key: Optional[str], model: Optional[str],
+                 http_client: httpx.AsyncClient):
+        super().__init__(model)
+        self.base_url = base_url
+        # Local servers often need no key, but the SDK insists on one
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key or "unused", max_retries=0,
+                                  http_client=http_client)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.base_url and self.model)
+
+    async def complete(self, messages: list[dict], timeout: Optional[float] = None, **params) -> Completion:
+        resp = await self.client.chat.completions.create(
+            model=self.model, messages=messages, timeout=timeout, **params)
+        usage = resp.usage
+        if usage is None:
+            return Completion(resp.choices[0].message.content or "")
+        return Completion(resp.choices[0].message.content or "", usage.total_tokens,
+                          usage.prompt_tokens, usage.completion_tokens)
+
+    async def stream(self, messages: list[dict], timeout: Optional[float] = None, **params) -> TextStream:
+        # The timeout applies per read, i.e. between streamed chunks
+        stream = await self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, timeout=timeout, **params)
+        return TextStream(_sdk_deltas(stream), stream.close)
+
+    async def close(self):
+        await self.client.close()
+
+
+class AzureProvider(OpenAICompatibleProvider):
+    """Azure OpenAI; `model` is the deployment name."""
+
+    name = "azure"
+
+    def __init__(self, api_key: Optional[str], endpoint: Optional[str], api_version: str,
+                 deployment: Optional[str], http_client: httpx.AsyncClient):
+        ChatProvider.__init__(self, deployment)
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.client = AsyncAzureOpenAI(api_key=api_key, azure_endpoint=endpoint, api_version=api_version,
+                                       max_retries=0, http_client=http_client)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.endpoint and self.model)
+
+    def check_config(self):
+        if not self.configured:
+            logger.error("Missing Azure OpenAI configuration: api_key=%s, api_base=%s, deployment=%s",
+                         bool(self.api_key), bool(self.endpoint), bool(self.model))
+            raise ValueError("Azure OpenAI configuration incomplete")
+
+
+DEFAULT_LOCAL_TEMPLATE = (
+    "Thank you for reaching out. Tena AI can't reach its language model at the moment, so I "
+    "can't give you a full answer right now. Please try again in a little while. If you are in "
+    "danger, call 112, or the Police Service on 191."
+)
+
+
+class LocalProvider(ChatProvider):
+    """Deterministic replies without a model, for offline runs, CI performance gates
+    and capacity planning, or as a stop-gap while the real provider is down.
+
+    mode "template" answers every message with `template`, where "{message}" is
+    replaced by the user's message; "echo" answers with the message itself. The
+    same input always gives the same reply. Model time is simulated: `latency`
+    seconds to the first token, then `tokens_per_sec` (0 = all at once), with
+    words standing in for tokens.
+    """
+
+    name = "local"
+    canned_replies = True
+
+    def __init__(self, mode: str = "template", template: Optional[str] = None,
+                 latency: float = 0.0, tokens_per_sec: float = 0.0):
+        if mode not in ("template", "echo"):
+            raise ValueError(f"unknown local provider mode {mode!r}")
+        super().__init__(f"local-{mode}")
+        self.mode = mode
+        self.template = template or DEFAULT_LOCAL_TEMPLATE
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.calls = 0
+
+    def _words(self, messages: list[dict], max_tokens: Optional[int]) -> list[str]:
+        message = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        text = message if self.mode == "echo" else self.template.replace("{message}", message)
+        words = text.split(" ")
+        return words[:max_tokens] if max_tokens else words
+
+    def _token_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    async def complete(self, messages: list[dict], timeout: Optional[float] = None, **params) -> Completion:
+        self.calls += 1
+        words = self._words(messages, params.get("max_tokens"))
+        await asyncio.sleep(self.latency + self._token_time(len(words)))
+        prompt_tokens = sum(len(m["content"]) // 4 + 4 for m in messages)
+        return Completion(" ".join(words), prompt_tokens + len(words), prompt_tokens, len(words))
+
+    async def stream(self, messages: list[dict], timeout: Optional[float] = None, **params) -> TextStream:
+        self.calls += 1
+        words = self._words(messages, params.get("max_tokens"))
+        per_token = self._token_time(1)
+
+        async def deltas():
+            await asyncio.sleep(self.latency)
+            for i, word in enumerate(words):
+                if i and per_token:
+                    await asyncio.sleep(per_token)
+                yield word if i == 0 else " " + word
+
+        generator = deltas()
+        return TextStream(generator, generator.aclose)
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "model": self.model,
+            "latency": self.latency,
+            "tokens_per_sec": self.tokens_per_sec,
+            "calls": self.calls,
+        }
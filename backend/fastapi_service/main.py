@@ -1,29 +1,51 @@
 from typing import Optional
 import os
-import asyncio
+import json
+import time
 import logging
 from time import asctime
 from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
-from openai import AzureOpenAI
+import httpx
+import openai
 from redis.asyncio import Redis
 from fastapi import FastAPI, Request
-from fastapi import Header, HTTPException, Depends
+from fastapi import Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
+from response_cache import ResponseCache, MemoryBackend, RedisBackend, cache_key, is_cacheable
+from circuit_breaker import CircuitBreaker
+from scheduler import AzureScheduler, SchedulerTimeout, retry_after_seconds
+from rate_limiter import RateLimiter, MemoryLimiter, RedisLimiter, parse_limits, retry_after_header
+from sanitizer import strip_markdown, MarkdownStripper
+from llm_provider import AzureProvider, OpenAICompatibleProvider, LocalProvider
+from metrics import LLM_IN_FLIGHT, MetricsMiddleware, observe_stage, record_tokens, render_metrics, stage, trace_id_var
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Rate limit settings
+# Rate limit settings, applied per client IP, session and user (0 disables a window)
 RATE_LIMIT_MINUTE = int(os.getenv("RATE_LIMIT_MINUTE", "60"))  # requests per minute
 RATE_LIMIT_HOUR = int(os.getenv("RATE_LIMIT_HOUR", "1000"))   # requests per hour
+RATE_LIMIT_IP_MINUTE = int(os.getenv("RATE_LIMIT_IP_MINUTE", str(RATE_LIMIT_MINUTE)))  # IPs may be shared (NAT)
+RATE_LIMIT_IP_HOUR = int(os.getenv("RATE_LIMIT_IP_HOUR", str(RATE_LIMIT_HOUR)))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost")
 ENABLE_RATE_LIMIT = os.getenv("ENABLE_RATE_LIMIT", "0") == "1"
 
+# Exact-match reply cache for repeated, context-free questions
+ENABLE_RESPONSE_CACHE = os.getenv("ENABLE_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory | redis
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_HISTORY = int(os.getenv("RESPONSE_CACHE_MAX_HISTORY", "0"))  # 0 = first turns only
+
+# Prometheus metrics on /metrics; requests slower than SLOW_REQUEST_LOG_MS are logged with their stage timings
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # if set, scrapes must send "Authorization: Bearer <token>"
+SLOW_REQUEST_LOG_MS = float(os.getenv("SLOW_REQUEST_LOG_MS", "5000"))  # 0 = off
+
 app = FastAPI(title="Tena AI - AI Service")
 
 # Configure CORS
@@ -33,23 +55,163 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+# Added last so it wraps everything else: the request counts, latencies and trace ID cover CORS too
+app.add_middleware(MetricsMiddleware, slow_request_ms=SLOW_REQUEST_LOG_MS)
 
 # Load env from backend directory 
 _backend_dir = Path(__file__).resolve().parents[1]
 load_dotenv(_backend_dir / ".env")
 
+# Chat model provider: azure | openai (any OpenAI-compatible endpoint) | local (canned replies, no model)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "azure")
+
 # Azure OpenAI client
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT") 
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
+AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+
+# OpenAI-compatible endpoint (OpenAI, vLLM, Ollama, ...) for LLM_PROVIDER=openai
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. https://api.openai.com/v1
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL")
+
+# Deterministic local replies for LLM_PROVIDER=local (offline runs, CI perf gates, emergencies)
+LOCAL_LLM_MODE = os.getenv("LOCAL_LLM_MODE", "template")  # template | echo
+LOCAL_LLM_TEMPLATE = os.getenv("LOCAL_LLM_TEMPLATE")  # "{message}" is replaced by the user's message
+LOCAL_LLM_LATENCY_MS = float(os.getenv("LOCAL_LLM_LATENCY_MS", "0"))  # simulated time to first token
+LOCAL_LLM_TOKENS_PER_SEC = float(os.getenv("LOCAL_LLM_TOKENS_PER_SEC", "0"))  # 0 = whole reply at once
+
+# Upstream connection pool settings (whichever provider is remote). One pool is shared by every
+# request in this worker, so keep-alive connections (and their TLS sessions) are reused across chat turns.
+AZURE_POOL_MAX_CONNECTIONS = int(os.getenv("AZURE_POOL_MAX_CONNECTIONS", "200"))
+AZURE_POOL_MAX_KEEPALIVE = int(os.getenv("AZURE_POOL_MAX_KEEPALIVE", "50"))
+AZURE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("AZURE_POOL_KEEPALIVE_EXPIRY", "60"))  # seconds
+AZURE_CONNECT_TIMEOUT = float(os.getenv("AZURE_CONNECT_TIMEOUT", "5"))
+AZURE_READ_TIMEOUT = float(os.getenv("AZURE_READ_TIMEOUT", "30"))
+AZURE_POOL_TIMEOUT = float(os.getenv("AZURE_POOL_TIMEOUT", "10"))  # wait for a free connection
+AZURE_MAX_RETRIES = int(os.getenv("AZURE_MAX_RETRIES", "2"))
+
+# Circuit breaker around Azure chat calls; AZURE_READ_TIMEOUT is the timeout ceiling
+AZURE_BREAKER_WINDOW = float(os.getenv("AZURE_BREAKER_WINDOW", "60"))  # seconds
+AZURE_BREAKER_MIN_CALLS = int(os.getenv("AZURE_BREAKER_MIN_CALLS", "10"))
+AZURE_BREAKER_FAILURE_RATE = float(os.getenv("AZURE_BREAKER_FAILURE_RATE", "0.5"))
+AZURE_BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("AZURE_BREAKER_CONSECUTIVE_FAILURES", "5"))
+AZURE_BREAKER_COOLDOWN = float(os.getenv("AZURE_BREAKER_COOLDOWN", "15"))  # seconds
+AZURE_BREAKER_MIN_TIMEOUT = float(os.getenv("AZURE_BREAKER_MIN_TIMEOUT", "5"))
+AZURE_BREAKER_TIMEOUT_MULTIPLIER = float(os.getenv("AZURE_BREAKER_TIMEOUT_MULTIPLIER", "2"))  # x p99
+
+# Admission control for Azure calls (set AZURE_TPM / AZURE_RPM to the deployment quota; 0 = unlimited)
+AZURE_MAX_IN_FLIGHT = int(os.getenv("AZURE_MAX_IN_FLIGHT", str(AZURE_POOL_MAX_CONNECTIONS)))
+AZURE_TPM = int(os.getenv("AZURE_TPM", "0"))
+AZURE_RPM = int(os.getenv("AZURE_RPM", "0"))
+AZURE_QUEUE_TIMEOUT = float(os.getenv("AZURE_QUEUE_TIMEOUT", "20"))  # seconds a request may wait for admission
+
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=AZURE_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=AZURE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=AZURE_POOL_KEEPALIVE_EXPIRY,
+    ),
+    timeout=httpx.Timeout(
+        AZURE_READ_TIMEOUT,
+        connect=AZURE_CONNECT_TIMEOUT,
+        pool=AZURE_POOL_TIMEOUT,
+    ),
+)
+
+
+def create_provider(name: str):
+    """The chat provider selected by LLM_PROVIDER."""
+    if name == "azure":
+        return AzureProvider(AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION,
+                             AZURE_OPENAI_DEPLOYMENT, http_client)
+    if name == "openai":
+        return OpenAICompatibleProvider(OPENAI_BASE_URL, OPENAI_API_KEY, OPENAI_MODEL, http_client)
+    if name == "local":
+        return LocalProvider(LOCAL_LLM_MODE, LOCAL_LLM_TEMPLATE,
+                             latency=LOCAL_LLM_LATENCY_MS / 1000, tokens_per_sec=LOCAL_LLM_TOKENS_PER_SEC)
+    raise ValueError(f"Unknown LLM_PROVIDER {name!r} (expected azure, openai or local)")
+
+
+# Retries are done by the scheduler (429s honor Retry-After), not by the SDK
+provider = create_provider(LLM_PROVIDER)
+logger.info("Chat provider: %s (%s)", provider.name, provider.model)
+
+
+class UpstreamTracker:
+    """Counts in-flight upstream calls so pool pressure can be observed.
+
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total = 0
+
+    def __enter__(self):
+        self.in_flight += 1
+        self.total += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        LLM_IN_FLIGHT.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self.in_flight -= 1
+        LLM_IN_FLIGHT.dec()
+        return False
+
+
+upstream = UpstreamTracker()
 
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version=AZURE_OPENAI_API_VERSION,
+scheduler = AzureScheduler(
+    max_in_flight=AZURE_MAX_IN_FLIGHT,
+    tpm=AZURE_TPM,
+    rpm=AZURE_RPM,
+    queue_timeout=AZURE_QUEUE_TIMEOUT,
+    max_retries=AZURE_MAX_RETRIES,
 )
 
+azure_breaker = CircuitBreaker(
+    "azure_openai",
+    window=AZURE_BREAKER_WINDOW,
+    min_calls=AZURE_BREAKER_MIN_CALLS,
+    failure_rate=AZURE_BREAKER_FAILURE_RATE,
+    consecutive_failures=AZURE_BREAKER_CONSECUTIVE_FAILURES,
+    cooldown=AZURE_BREAKER_COOLDOWN,
+    min_timeout=AZURE_BREAKER_MIN_TIMEOUT,
+    max_timeout=AZURE_READ_TIMEOUT,
+    timeout_multiplier=AZURE_BREAKER_TIMEOUT_MULTIPLIER,
+)
+
+
+def is_provider_failure(exc: Exception) -> bool:
+    """Errors that say the model provider is unhealthy (as opposed to a bad request).
+    A 429 is quota back-pressure: the scheduler retries it and pauses admissions."""
+    return isinstance(exc, (openai.APIConnectionError, openai.InternalServerError))
+
+
+def pool_stats() -> dict:
+    """Snapshot of the shared upstream connection pool."""
+    # httpx does not expose pool internals publicly; read them defensively
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "max_connections": AZURE_POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": AZURE_POOL_MAX_KEEPALIVE,
+        "keepalive_expiry": AZURE_POOL_KEEPALIVE_EXPIRY,
+        "open_connections": len(connections),
+        "idle_connections": idle,
+        "active_connections": len(connections) - idle,
+        "in_flight_requests": upstream.in_flight,
+        "peak_in_flight_requests": upstream.peak_in_flight,
+        "total_requests": upstream.total,
+    }
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -63,83 +225,26 @@ class ChatRequest(BaseModel):
     message: str 
     history: list[MessageContext] = [] 
     session_id: Optional[str] = None
+    summary: Optional[str] = None # running summary of turns no longer sent in history
+    no_cache: bool = False # set by the gateway on crisis turns: always generate a fresh reply
 
+class SummarizeRequest(BaseModel):
+    summary: str = ""
+    history: list[MessageContext] = []
 
-@app.get("/health")
-async def health():
-    return {"status": "FastAPI working perfectly!", "serivice": "FastAPI"}
 
+def build_messages_payload(history: list[MessageContext], new_message: str, summary: Optional[str] = None) -> list[dict]:
+    """Builds the chat completion message list: system prompt, optional conversation
+    summary, prior turns, then the new message."""
 
-@app.on_event("startup")
-async def startup():
-    """Initialize optional rate limiter on startup"""
-    if ENABLE_RATE_LIMIT:
-        try:
-            redis = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
-            await FastAPILimiter.init(redis)
-            logger.info("Rate limiting enabled with Redis at %s", REDIS_URL)
-        except Exception as exc:
-            logger.warning("Rate limiter disabled: Redis init failed: %s", exc)
-    else:
-        logger.info("Rate limiting disabled (ENABLE_RATE_LIMIT != 1)")
-
-@app.on_event("shutdown")
-async def shutdown():
-    """Close Redis connection if limiter was initialized"""
-    try:
-        await FastAPILimiter.close()
-    except Exception:
-        pass
-
-if ENABLE_RATE_LIMIT:
-    rate_limit_dependency = Depends(RateLimiter(times=RATE_LIMIT_MINUTE, minutes=1))
-else:
-    async def _noop_rate_limit():
-        return True
-    rate_limit_dependency = Depends(_noop_rate_limit)
-
-def strip_markdown(text: str) -> str:
-    """Removes common Markdown characters from a string."""
-    text = text.replace('**', '').replace('*', '')
-    text = text.replace('#', '').replace('##', '').replace('###', '')
-    text = text.replace('>', '').strip()
-    return text
-
-@app.post("/ai/chat")
-async def ai_chat(
-    req: ChatRequest,
-    x_internal_key: Optional[str] = Header(None),
-    rate_limit: bool = rate_limit_dependency):
-    """Accepts a chat request and returns a generated reply.
+    target_audience = """TARGET AUDIENCE:
 
-    This endpoint is intentionally stateless: session handling and persistence
-    are expected to be performed by the gateway (Flask) or another service.
+    Primary : Women and girls seeking rights-based information and safety support.
+    Secondary : NGOs, schools, and advocates who work directly with women.
+    Tertiary : Government bodies, legal services, and partner organizations that support women’s rights and protection.
     """
-    if not req.message:
-        return {"reply": "", "session_id": req.session_id}
-
-    # require the gateway to send an internal key
-    internal_key = os.getenv("INTERNAL_API_KEY")
-    
-    # If an INTERNAL_API_KEY is configured, require the incoming header to match it.
-    if internal_key:
-        if not x_internal_key or x_internal_key != internal_key:
-            raise HTTPException(status_code=401, detail="Unauthorized")
-    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-    if not deployment:
-        return {"reply": None, "session_id": req.session_id}
-
-    def _call_openai(history: list[MessageContext], new_message: str):
-        # Blocking call to Azure OpenAI SDK executed in a thread
-        
-        target_audience = """TARGET AUDIENCE:
 
-        Primary : Women and girls seeking rights-based information and safety support.
-        Secondary : NGOs, schools, and advocates who work directly with women.
-        Tertiary : Government bodies, legal services, and partner organizations that support women’s rights and protection.
-        """
-
-        objectives = """Our main function is simple:
+    objectives = """Our main function is simple:
 
 We answer women’s questions directly in clear,
 practical language.
@@ -189,70 +294,452 @@ Behavior:
 Cultural context: Reflect awareness of diverse African contexts, norms, and access constraints.
 Makers/Builders/Creators: You were built by the Tena AI team, a team of students at the Kwame Nkrumah University of Science and Technology in Ghana. 
 """
-        
+    
 
-        system_prompt = f"""You are Tena AI, a smart, accessible assistant that simplifies complex legal and social information so every woman — no
-        matter her age or background can understand and act. You give women clarity, guidance, and confidence when they need it most.
-        Your responses must be empathetic, respectful, and psychologically safe. You are NOT a therapist, and you must never diagnose or prescribe.
-        You listen, validate feelings, and suggest healthy coping mechanisms or resources.
-        Date: {asctime()}. The current time is {datetime.now().strftime("%H:%M:%S")}, and today's date is {datetime.now().strftime("%d %B %Y")} in case you're asked.
-        
-        When a user describes serious distress (suicidal thoughts, trauma, etc.), respond calmly and refer them to a professional or emergency helpline: 
-        - National Mental Health Helpline: +233 244 846 701 (or 0800 678 678)
-        - Suicidal Prevention Hotline : +233 244 471 279
-        - General Emergency: 112 or 999
-        - Ambulance Service: 193
-        - Police Service: 191
-        
-        Tone: warm, understanding, and encouraging - never robotic or judgemental.
-        Your Goal: make the user feel heard, understood, and empowered. You want to be sure that the answer is helpful and solves the user's problem.
-        After giving a a specific information, always ask the user if the response was helpful.
-        
-        Here's your target audience just incase you are asked: {target_audience}
-        
-        Here are some more context about Tena AI and about how you should respond: {objectives}
-        """ 
-        
-        messages_payload = [
-            {
-                "role": "system",
-                "content": system_prompt
-            }
-        ]
-        
-        for msg in history:
-            messages_payload.append(msg)
-            
-        messages_payload.append({"role": "user", "content": new_message})   
+    system_prompt = f"""You are Tena AI, a smart, accessible assistant that simplifies complex legal and social information so every woman — no
+    matter her age or background can understand and act. You give women clarity, guidance, and confidence when they need it most.
+    Your responses must be empathetic, respectful, and psychologically safe. You are NOT a therapist, and you must never diagnose or prescribe.
+    You listen, validate feelings, and suggest healthy coping mechanisms or resources.
+    Date: {asctime()}. The current time is {datetime.now().strftime("%H:%M:%S")}, and today's date is {datetime.now().strftime("%d %B %Y")} in case you're asked.
+    
+    When a user describes serious distress (suicidal thoughts, trauma, etc.), respond calmly and refer them to a professional or emergency helpline: 
+    - National Mental Health Helpline: +233 244 846 701 (or 0800 678 678)
+    - Suicidal Prevention Hotline : +233 244 471 279
+    - General Emergency: 112 or 999
+    - Ambulance Service: 193
+    - Police Service: 191
+    
+    Tone: warm, understanding, and encouraging - never robotic or judgemental.
+    Your Goal: make the user feel heard, understood, and empowered. You want to be sure that the answer is helpful and solves the user's problem.
+    After giving a a specific information, always ask the user if the response was helpful.
+    
+    Here's your target audience just incase you are asked: {target_audience}
+    
+    Here are some more context about Tena AI and about how you should respond: {objectives}
+    """ 
+    
+    messages_payload = [
+        {
+            "role": "system",
+            "content": system_prompt
+        }
+    ]
+
+    if summary:
+        messages_payload.append({
+            "role": "system",
+            "content": f"Summary of the earlier part of this conversation: {summary}"
+        })
+    
+    for msg in history:
+        messages_payload.append(msg.model_dump())
         
-        resp = client.chat.completions.create(
-            model=deployment,  
-            temperature=0.7,
-            max_tokens=400,
-            presence_penalty=0.1,
-            frequency_penalty=0.1,
-            messages=messages_payload,
-        )
-        return (resp.choices[0].message.content or "").strip()
+    messages_payload.append({"role": "user", "content": new_message})
+    return messages_payload
+
+
+# Bump when the system prompt or reply post-processing changes so cached replies are not reused
+PROMPT_VERSION = "1"
+
+response_cache = ResponseCache(
+    MemoryBackend(RESPONSE_CACHE_MAX_BYTES),
+    ttl=RESPONSE_CACHE_TTL,
+    max_history=RESPONSE_CACHE_MAX_HISTORY,
+)
+
+
+def response_cache_key(req: "ChatRequest") -> Optional[str]:
+    """Cache key for a chat turn, or None when the turn must bypass the cache."""
+    if not ENABLE_RESPONSE_CACHE or not is_cacheable(req.message, req.history, req.summary,
+                                                     response_cache.max_history, req.no_cache):
+        return None
+    # The system prompt embeds today's date, so replies are only reused within the day
+    prompt_version = f"{PROMPT_VERSION}:{datetime.now().strftime('%Y-%m-%d')}"
+    return cache_key(req.message, req.history, f"{provider.name}:{provider.model}", COMPLETION_PARAMS, prompt_version)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "FastAPI working perfectly!", "serivice": "FastAPI"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request, authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    body, content_type = render_metrics(request.headers.get("accept"))
+    return Response(body, media_type=content_type)
+
+@app.get("/ai/stats")
+async def ai_stats(x_internal_key: Optional[str] = Header(None)):
+    """Runtime statistics for the AI service (upstream pool occupancy, response cache, breaker, limiter)."""
+    _require_internal_key(x_internal_key)
+    return {
+        "provider": provider.stats(),
+        "upstream_pool": pool_stats(),
+        "response_cache": response_cache.stats(),
+        "azure_breaker": azure_breaker.stats(),
+        "scheduler": scheduler.stats(),
+        "rate_limiter": rate_limiter.stats(),
+    }
+
+
+@app.on_event("startup")
+async def startup():
+    """Switch the rate limiter and response cache to Redis when configured"""
+    if ENABLE_RATE_LIMIT and RATE_LIMIT_BACKEND == "redis":
+        try:
+            redis = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+            await redis.ping()
+            rate_limiter.backend = RedisLimiter(redis)
+            logger.info("Rate limiting shared via Redis at %s", REDIS_URL)
+        except Exception as exc:
+            logger.warning("Rate limiter falling back to memory: Redis init failed: %s", exc)
+    logger.info("Rate limiting %s", "enabled" if rate_limiter.enabled else "disabled (ENABLE_RATE_LIMIT != 1)")
+
+    if ENABLE_RESPONSE_CACHE and RESPONSE_CACHE_BACKEND == "redis":
+        try:
+            redis = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+            await redis.ping()
+            response_cache.backend = RedisBackend(redis)
+            logger.info("Response cache shared via Redis at %s", REDIS_URL)
+        except Exception as exc:
+            logger.warning("Response cache falling back to memory: Redis init failed: %s", exc)
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Drain the upstream pool"""
+    await provider.close()
+    await http_client.aclose()
+
+rate_limiter = RateLimiter(
+    MemoryLimiter(),
+    limits=parse_limits(RATE_LIMIT_MINUTE, RATE_LIMIT_HOUR),
+    ip_limits=parse_limits(RATE_LIMIT_IP_MINUTE, RATE_LIMIT_IP_HOUR),
+    enabled=ENABLE_RATE_LIMIT,
+)
+
+async def enforce_rate_limit(request: Request, session_id: Optional[str]):
+    """Rejects the request with 429 + Retry-After once its IP, session or user is over a limit.
+
+    The gateway forwards the browser's address and the signed-in user as X-Client-IP
+    and X-User-Id; those headers are only trusted when INTERNAL_API_KEY is set
+    (and was checked), since anyone could send them otherwise.
+    """
+    trusted = bool(os.getenv("INTERNAL_API_KEY"))
+    ip = (trusted and request.headers.get("x-client-ip")) or (request.client.host if request.client else None)
+    user_id = request.headers.get("x-user-id") if trusted else None
+    wait = await rate_limiter.check(ip=ip, session_id=session_id, user_id=user_id)
+    if wait:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=retry_after_header(wait))
+
+async def sanitized_deltas(stream):
+    """Yields a provider's streamed text with markdown removed, each piece as soon
+    as it can no longer turn out to be part of markdown syntax."""
+    stripper = MarkdownStripper()
+    async for delta in stream:
+        yield stripper.feed(delta)
+    yield stripper.flush()
+
+APOLOGY_REPLY = "I apologize, but I'm having trouble generating a response. Please, try again later."
+
+# Sampling parameters shared by the blocking and streaming endpoints
+COMPLETION_PARAMS = {
+    "temperature": float(os.getenv("LLM_TEMPERATURE", "0.7")),
+    "max_tokens": int(os.getenv("LLM_MAX_TOKENS", "400")),
+    "presence_penalty": float(os.getenv("LLM_PRESENCE_PENALTY", "0.1")),
+    "frequency_penalty": float(os.getenv("LLM_FREQUENCY_PENALTY", "0.1")),
+}
+
+def _require_internal_key(x_internal_key: Optional[str]):
+    """If an INTERNAL_API_KEY is configured, require the incoming header to match it."""
+    internal_key = os.getenv("INTERNAL_API_KEY")
+    if internal_key:
+        if not x_internal_key or x_internal_key != internal_key:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+def admission_timeout(request: Request, streaming: bool = False) -> Optional[float]:
+    """How long this request may queue for the scheduler: AZURE_QUEUE_TIMEOUT, cut
+    short so that an admitted call can still answer before the gateway gives up
+    (X-Request-Timeout, its read timeout in seconds). A blocking call needs its
+    typical latency after admission. A stream only needs its first token before
+    then, since the gateway's timeout applies between chunks, so half the budget
+    is kept for it. None means the scheduler's default.
+    """
     try:
-        # Check required Azure settings
-        if not all([AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, deployment]):
-            logger.error("Missing Azure OpenAI configuration: api_key=%s, api_base=%s, deployment=%s",
-                        bool(AZURE_OPENAI_KEY), bool(AZURE_OPENAI_ENDPOINT), bool(deployment))
-            raise ValueError("Azure OpenAI configuration incomplete")
+        budget = float(request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        return None
+    expected = budget / 2 if streaming else (azure_breaker.median_latency() or 0.0)
+    # admit() treats 0 as "default", so a spent budget still gets a token wait
+    return min(AZURE_QUEUE_TIMEOUT, max(budget - expected, 0.001))
+
+def estimate_request_tokens(messages: list[dict], max_tokens: int) -> int:
+    """Rough prompt size (~4 characters per token plus per-message overhead) plus the
+    completion allowance; reserved from the TPM bucket before the call."""
+    prompt = sum((len(msg["content"]) + 3) // 4 + 4 for msg in messages)
+    return prompt + max_tokens
+
+def unavailable_response(session_id: Optional[str], error: str, retry_after: float) -> JSONResponse:
+    """Immediate 503 when Azure can't be called right now (breaker open, or not admitted
+    before the queue deadline); the gateway serves its degraded reply."""
+    return JSONResponse(
+        status_code=503,
+        content={"reply": APOLOGY_REPLY, "session_id": session_id, "error": error},
+        headers={"Retry-After": str(max(1, round(retry_after)))},
+    )
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Formats a single Server-Sent Event frame with a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ai/chat")
+async def ai_chat(
+    req: ChatRequest,
+    request: Request,
+    x_internal_key: Optional[str] = Header(None)):
+    """Accepts a chat request and returns a generated reply.
+
+    This endpoint is intentionally stateless: session handling and persistence
+    are expected to be performed by the gateway (Flask) or another service.
+    """
+    if not req.message:
+        return {"reply": "", "session_id": req.session_id}
+
+    # require the gateway to send an internal key
+    _require_internal_key(x_internal_key)
+    with stage("rate_limit"):
+        await enforce_rate_limit(request, req.session_id)
+    if not provider.model:
+        return {"reply": None, "session_id": req.session_id}
+
+    queue_timeout = admission_timeout(request)
+
+    async def _call_model(history: list[MessageContext], new_message: str):
+        # Awaited directly on the event loop once the scheduler admits it
+        with stage("build_prompt"):
+            messages = build_messages_payload(history, new_message, req.summary)
+        started = time.monotonic()
+        try:
+            async with scheduler.admit(estimate_request_tokens(messages, COMPLETION_PARAMS["max_tokens"]),
+                                       timeout=queue_timeout) as ticket:
+                observe_stage("admission", time.monotonic() - started)
+                with upstream, stage("llm"):
+                    completion = await ticket.call(lambda: provider.complete(
+                        messages,
+                        timeout=azure_breaker.timeout(),
+                        **COMPLETION_PARAMS,
+                    ))
+                ticket.used(completion.total_tokens)
+                record_tokens(provider.name, completion.prompt_tokens, completion.completion_tokens)
+        except (SchedulerTimeout, openai.RateLimitError):
+            # Not admitted, or still over quota at the deadline: says nothing about the provider's health
+            azure_breaker.release()
+            raise
+        except Exception as e:
+            if is_provider_failure(e):
+                azure_breaker.record_failure()
+            else:
+                azure_breaker.record_success()
+            raise
+        azure_breaker.record_success(time.monotonic() - started)
+        return completion.text.strip(), completion.total_tokens or 0
+
+    try:
+        # Check required provider settings
+        provider.check_config()
+
+        key = response_cache_key(req)
+        with stage("cache_lookup"):
+            cached = await response_cache.lookup(key)
+        if cached:
+            return {"reply": cached, "session_id": req.session_id}
+
+        if not azure_breaker.allow():
+            return unavailable_response(req.session_id, "circuit_open", azure_breaker.retry_after())
         
-        reply = await asyncio.to_thread(_call_openai, req.history, req.message)
+        try:
+            reply, tokens = await _call_model(req.history, req.message)
+        except SchedulerTimeout as e:
+            logger.warning("Azure request not admitted: %s", e)
+            return unavailable_response(req.session_id, "overloaded", e.retry_after)
+        except openai.RateLimitError as e:
+            logger.warning("Azure quota still exhausted at the request deadline")
+            return unavailable_response(req.session_id, "overloaded", retry_after_seconds(e) or 1.0)
         
         if reply:
-            reply = strip_markdown(reply)
+            with stage("strip_markdown"):
+                reply = strip_markdown(reply)
         
         if not reply:
             logger.error("Empty reply from OpenAI")
-            return {"reply": "I apologize, but I'm having trouble generating a response. Please, try again later.", "session_id": req.session_id}
+            return {"reply": APOLOGY_REPLY, "session_id": req.session_id}
+        with stage("cache_store"):
+            await response_cache.store(key, reply, tokens)
         return {"reply": reply, "session_id": req.session_id}
     except Exception as e:
-        logger.exception("Error calling OpenAI: %s", str(e))
-        return {"reply": "I apologize, but I'm having trouble generating a response. Please, try again later.", "session_id": req.session_id}
+        logger.exception("Error calling OpenAI (trace %s): %s", trace_id_var.get(), str(e))
+        return {"reply": APOLOGY_REPLY, "session_id": req.session_id, "error": "upstream_error"}
+
 
-    return {"reply": reply, "session_id": req.session_id}
+@app.post("/ai/chat/stream")
+async def ai_chat_stream(
+    req: ChatRequest,
+    request: Request,
+    x_internal_key: Optional[str] = Header(None)):
+    """Server-Sent Events variant of /ai/chat.
+
+    Emits one `data: {"delta": "..."}` frame per token batch received from the provider,
+    then a final `event: done` frame carrying the session_id. Failures are reported
+    as an `event: error` frame with the standard apology as `reply`, so the gateway
+    always has something to show and persist.
+    """
+    _require_internal_key(x_internal_key)
+    with stage("rate_limit"):
+        await enforce_rate_limit(request, req.session_id)
+
+    async def _event_stream():
+        if not req.message:
+            yield sse_event({"session_id": req.session_id}, event="done")
+            return
+        try:
+            provider.check_config()
+
+            key = response_cache_key(req)
+            with stage("cache_lookup"):
+                cached = await response_cache.lookup(key)
+            if cached:
+                yield sse_event({"delta": cached})
+                yield sse_event({"session_id": req.session_id}, event="done")
+                return
+
+            if not azure_breaker.allow():
+                yield sse_event({"reply": APOLOGY_REPLY, "error": "circuit_open"}, event="error")
+                return
+
+            produced = False
+            parts = []
+            with stage("build_prompt"):
+                messages = build_messages_payload(req.history, req.message, req.summary)
+            max_tokens = COMPLETION_PARAMS["max_tokens"]
+            started = time.monotonic()
+            try:
+                # The admission slot is held until the stream is fully relayed
+                async with scheduler.admit(estimate_request_tokens(messages, max_tokens),
+                                           timeout=admission_timeout(request, streaming=True)) as ticket:
+                    observe_stage("admission", time.monotonic() - started)
+                    llm_started = time.monotonic()
+                    with upstream:
+                        # The timeout applies per read, i.e. between streamed chunks
+                        stream = await ticket.call(lambda: provider.stream(
+                            messages,
+                            timeout=azure_breaker.timeout(),
+                            **COMPLETION_PARAMS,
+                        ))
+                        # Closing the stream returns the connection to the pool even if the client disconnects
+                        async with stream:
+                            async for text in sanitized_deltas(stream):
+                                if not produced:
+                                    text = text.lstrip()
+                                if text:
+                                    if not produced:
+                                        observe_stage("llm_first_token", time.monotonic() - llm_started)
+                                    produced = True
+                                    parts.append(text)
+                                    yield sse_event({"delta": text})
+                    # Includes the time spent relaying to the gateway, which paces the stream
+                    observe_stage("llm_stream", time.monotonic() - llm_started)
+                    # Streamed chunks carry no usage; estimate the completion from its length
+                    completion_tokens = estimate_request_tokens([{"content": "".join(parts)}], 0)
+                    ticket.used(ticket.tokens - max_tokens + completion_tokens)
+                    record_tokens(provider.name, ticket.tokens - max_tokens, completion_tokens)
+            except SchedulerTimeout as e:
+                logger.warning("Azure stream not admitted: %s", e)
+                azure_breaker.release()
+                yield sse_event({"reply": APOLOGY_REPLY, "error": "overloaded"}, event="error")
+                return
+            except openai.RateLimitError:
+                logger.warning("Azure quota still exhausted at the stream deadline")
+                azure_breaker.release()
+                yield sse_event({"reply": APOLOGY_REPLY, "error": "overloaded"}, event="error")
+                return
+            except Exception as e:
+                if is_provider_failure(e):
+                    azure_breaker.record_failure()
+                else:
+                    azure_breaker.record_success()
+                raise
+            azure_breaker.record_success(time.monotonic() - started)
+
+            if not produced:
+                logger.error("Empty streamed reply from OpenAI")
+                yield sse_event({"reply": APOLOGY_REPLY}, event="error")
+                return
+            with stage("cache_store"):
+                await response_cache.store(key, "".join(parts).strip())
+            yield sse_event({"session_id": req.session_id}, event="done")
+        except Exception as e:
+            logger.exception("Error streaming from OpenAI (trace %s): %s", trace_id_var.get(), str(e))
+            yield sse_event({"reply": APOLOGY_REPLY, "error": "upstream_error"}, event="error")
+
+    return StreamingResponse(
+        _event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and Tena AI,
+an assistant for women's rights and wellbeing. Update the existing summary with the new messages.
+Keep facts the user shared about themselves and their situation (country, relationships, work, safety
+concerns), what advice was already given, and any open questions. Do not invent details.
+Write plain text in the third person, at most 150 words."""
+
+@app.post("/ai/summarize")
+async def ai_summarize(
+    req: SummarizeRequest,
+    request: Request,
+    x_internal_key: Optional[str] = Header(None)):
+    """Folds a batch of older turns into a conversation's running summary.
+
+    Called by the gateway in the background, never on the user-facing request path.
+    """
+    _require_internal_key(x_internal_key)
+    if not req.history:
+        return {"summary": req.summary}
+    if provider.canned_replies:
+        # A canned reply would replace what the summary remembers; an empty summary
+        # tells the gateway to leave the turns unfolded
+        return {"summary": None}
+
+    transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in req.history)
+    messages_payload = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Existing summary:\n{req.summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+    try:
+        provider.check_config()
+        # Summaries share the deployment quota with chat turns
+        async with scheduler.admit(estimate_request_tokens(messages_payload, 300),
+                                   timeout=admission_timeout(request)) as ticket:
+            with upstream, stage("summary_llm"):
+                completion = await ticket.call(lambda: provider.complete(
+                    messages_payload,
+                    temperature=0.2,
+                    max_tokens=300,
+                ))
+            ticket.used(completion.total_tokens)
+            record_tokens(provider.name, completion.prompt_tokens, completion.completion_tokens)
+        summary = strip_markdown(completion.text)
+    except SchedulerTimeout as e:
+        logger.warning("Summary request not admitted: %s", e)
+        raise HTTPException(status_code=503, detail="AI service busy", headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    except openai.RateLimitError as e:
+        logger.warning("Summary request over the Azure quota at its deadline")
+        raise HTTPException(status_code=503, detail="AI service busy",
+                            headers={"Retry-After": str(max(1, round(retry_after_seconds(e) or 1.0)))})
+    except Exception as e:
+        logger.exception("Error summarizing conversation: %s", str(e))
+        raise HTTPException(status_code=502, detail="Summarization failed")
+    return {"summary": summary}
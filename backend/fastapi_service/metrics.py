@@ -0,0 +1,132 @@
+"""Prometheus metrics and trace IDs for the AI service, served on /metrics.
+
+Every request is counted by route template, method and status, and timed. The
+chat endpoints time their stages with `stage()`: rate limiting, prompt building,
+cache lookup, admission, the model call and markdown stripping. The gateway's
+X-Trace-Id is adopted (or a new one generated) and echoed on the response, so
+both services' timings of one chat turn line up; requests slower than
+SLOW_REQUEST_LOG_MS are logged with their stage breakdown.
+"""
+import os
+import re
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.exposition import choose_encoder
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+_VALID_TRACE_ID = re.compile(r"[A-Za-z0-9._-]{8,64}\Z")
+
+# Seconds; matches the gateway's buckets so the two services can be compared directly
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUESTS = Counter(
+    "tena_ai_requests_total", "HTTP requests handled", ["endpoint", "method", "status"])
+REQUEST_LATENCY = Histogram(
+    "tena_ai_request_duration_seconds", "Time to handle a request, including streamed bodies",
+    ["endpoint"], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge(
+    "tena_ai_requests_in_flight", "Requests being handled", multiprocess_mode="livesum")
+STAGE_LATENCY = Histogram(
+    "tena_ai_stage_duration_seconds", "Time spent in one stage of a request", ["stage"], buckets=STAGE_BUCKETS)
+LLM_IN_FLIGHT = Gauge(
+    "tena_ai_llm_calls_in_flight", "Model calls waiting on the provider", multiprocess_mode="livesum")
+LLM_TOKENS = Counter(
+    "tena_ai_llm_tokens_total", "Tokens sent to and generated by the model (estimated for streams)",
+    ["provider", "kind"])
+
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_stage_seconds: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("stage_seconds", default=None)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_LATENCY.labels(name).observe(seconds)
+    stages = _stage_seconds.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block as one stage of the current request: `with stage("llm"): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def record_tokens(provider: str, prompt: Optional[int], completion: Optional[int]):
+    if prompt:
+        LLM_TOKENS.labels(provider, "prompt").inc(prompt)
+    if completion:
+        LLM_TOKENS.labels(provider, "completion").inc(completion)
+
+
+def render_metrics(accept: Optional[str]) -> tuple[bytes, str]:
+    """The exposition body and its content type (OpenMetrics, with exemplars, if asked for)."""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    encoder, content_type = choose_encoder(accept)
+    return encoder(registry), content_type
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to their last chunk
+    and the trace ID is visible to everything the request awaits."""
+
+    def __init__(self, app, slow_request_ms: float = 5000):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = ""
+        for name, value in scope["headers"]:
+            if name == b"x-trace-id":
+                incoming = value.decode("latin-1")
+                break
+        trace_id = incoming if _VALID_TRACE_ID.match(incoming) else uuid.uuid4().hex
+        trace_token = trace_id_var.set(trace_id)
+        stages_token = _stage_seconds.set({})
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; templates keep the label set small
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUESTS.labels(endpoint, scope["method"], str(status)).inc()
+            REQUEST_LATENCY.labels(endpoint).observe(elapsed, exemplar={"trace_id": trace_id})
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                stages = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in _stage_seconds.get().items())
+                logger.warning("Slow request %s %s -> %s in %.0fms (trace %s) %s",
+                               scope["method"], endpoint, status, elapsed * 1000, trace_id, stages)
+            _stage_seconds.reset(stages_token)
+            trace_id_var.reset(trace_token)
@@ -0,0 +1,142 @@
+"""Per-client rate limiting (GCRA) with an in-process or Redis backend."""
+import math
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (requests allowed, period in seconds)
+Limit = Tuple[int, float]
+# A client key with the windows that apply to it
+Rule = Tuple[str, List[Limit]]
+
+
+def parse_limits(per_minute: int, per_hour: int) -> List[Limit]:
+    """Minute and hour windows; a value of 0 disables that window."""
+    return [(count, period) for count, period in ((per_minute, 60.0), (per_hour, 3600.0)) if count > 0]
+
+
+class MemoryLimiter:
+    """GCRA (generic cell rate algorithm) kept in a dict of key -> theoretical arrival time.
+
+    Each key/window pair costs a single float: a request is allowed when
+    admitting it keeps the key's TAT no more than `period` ahead of now, which
+    behaves like a sliding window of `count` requests per `period` without
+    storing individual timestamps. Entries whose TAT has passed carry no state
+    and are swept every `sweep_interval` seconds. Only touched from the event loop.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._tats: Dict[str, float] = {}
+        self._swept_at = time.monotonic()
+
+    async def hit(self, rules: List[Rule]) -> float:
+        """Counts one request against every key/window. Returns 0 if allowed, else
+        the seconds until it would be; rejected requests consume nothing."""
+        now = time.monotonic()
+        if now - self._swept_at >= self.sweep_interval:
+            self._sweep(now)
+        updates, wait = [], 0.0
+        for key, limits in rules:
+            for count, period in limits:
+                slot = f"{key}:{int(period)}"
+                tat = max(self._tats.get(slot, now), now) + period / count
+                wait = max(wait, tat - now - period)
+                updates.append((slot, tat))
+        if wait > 0:
+            return wait
+        self._tats.update(updates)
+        return 0.0
+
+    def _sweep(self, now: float):
+        self._tats = {slot: tat for slot, tat in self._tats.items() if tat > now}
+        self._swept_at = now
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "tracked": len(self._tats)}
+
+
+# Same algorithm as MemoryLimiter, applied atomically to every key in one round trip.
+# ARGV: now, then interval and period for each key. Returns the wait as a string
+# because Lua numbers are truncated to integers on the way back.
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tats, wait = {}, 0
+for i = 1, #KEYS do
+  local interval, period = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+  local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+  if tat < now then tat = now end
+  tats[i] = tat + interval
+  wait = math.max(wait, tats[i] - now - period)
+end
+if wait > 0 then return tostring(wait) end
+for i = 1, #KEYS do
+  redis.call('SET', KEYS[i], tostring(tats[i]), 'PX', math.ceil(tonumber(ARGV[2 * i + 1]) * 1000))
+end
+return '0'
+"""
+
+
+class RedisLimiter:
+    """Shared across workers and instances. Keys expire after their window, and
+    Redis errors fail open so an outage never blocks chat."""
+
+    def __init__(self, redis, prefix: str = "tena:ratelimit:"):
+        self.redis = redis
+        self.prefix = prefix
+        self.errors = 0
+        self._script = redis.register_script(_GCRA_SCRIPT)
+
+    async def hit(self, rules: List[Rule]) -> float:
+        slots, argv = [], [time.time()]
+        for key, limits in rules:
+            for count, period in limits:
+                slots.append(f"{self.prefix}{key}:{int(period)}")
+                argv += [period / count, period]
+        try:
+            return float(await self._script(keys=slots, args=argv))
+        except Exception:
+            self.errors += 1
+            logger.warning("Rate limiter check failed, allowing request", exc_info=True)
+            return 0.0
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "errors": self.errors}
+
+
+class RateLimiter:
+    """Applies the configured windows to a request's client IP, session and user."""
+
+    def __init__(self, backend, limits: List[Limit], ip_limits: Optional[List[Limit]] = None,
+                 enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.ip_limits = ip_limits if ip_limits is not None else limits
+        self.enabled = enabled and bool(limits or self.ip_limits)
+        self.rejected = 0
+
+    async def check(self, ip: Optional[str] = None, session_id: Optional[str] = None,
+                    user_id: Optional[str] = None) -> float:
+        """Returns 0 if the request may proceed, else the Retry-After in seconds."""
+        rules = []
+        if ip and self.ip_limits:
+            rules.append((f"ip:{ip}", self.ip_limits))
+        if self.limits:
+            rules += [(f"{scope}:{value}", self.limits)
+                      for scope, value in (("session", session_id), ("user", user_id)) if value]
+        if not self.enabled or not rules:
+            return 0.0
+        wait = await self.backend.hit(rules)
+        if wait:
+            self.rejected += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "rejected": self.rejected,
+                "limits": self.limits, "ip_limits": self.ip_limits, **self.backend.stats()}
+
+
+def retry_after_header(wait: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
@@ -0,0 +1,174 @@
+"""Exact-match cache of model replies for repeated, context-free questions."""
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.,;:]+$")
+
+# Messages carrying details about the user are never served from or written to the cache
+_PERSONAL_MARKERS = re.compile(
+    r"[\w.+-]+@[\w-]+\.[\w.]+"            # email address
+    r"|\+?\d[\d\s-]{6,}\d"                # phone number
+    r"|\bmy name is\b|\bi am \d+|\bi'm \d+|\bi live in\b"
+    # statements about the user's own situation or people in it
+    r"|\b(?:i am|i'm|im|i was|i've been|i have been|i feel|i felt)\b"
+    r"|\bmy (?:husband|wife|partner|boyfriend|girlfriend|ex|fianc[eé]e?|boss|employer|manager|landlord|landlady"
+    r"|father|mother|dad|mum|mom|parents?|brother|sister|son|daughter|child|children|kids?|family|in-laws?"
+    r"|uncle|aunt|teacher|neighbou?r)\b"
+    r"|\b(?:hit|beat|hurt|rape|kick|slap|push|touch|threat|forc|harass|follow|stalk|attack|lock|insult"
+    r"|control|abus)\w*\b.{0,20}\bme\b",
+    re.IGNORECASE,
+)
+
+# Coarse safety net; replies to distress must always be generated fresh
+_CRISIS_HINTS = re.compile(
+    r"suicid|kill (?:my|him|her)self|end (?:my|it all)|self[- ]harm|hurt myself|want to die"
+    r"|rape|raped|beat(?:s|ing)? me|abus(?:e|ed|ing) me|threaten"
+    r"|(?:want|wanna) to (?:live|be alive)|better off dead|overdose",
+    re.IGNORECASE,
+)
+
+
+def normalize_message(message: str) -> str:
+    """Case-folds, collapses whitespace and drops trailing punctuation."""
+    return _TRAILING_PUNCT.sub("", _WHITESPACE.sub(" ", message.strip().casefold()))
+
+
+def is_cacheable(message: str, history: list, summary: Optional[str], max_history: int,
+                 no_cache: bool = False) -> bool:
+    """Only context-free (or short, non-personal context) turns without crisis language are cacheable.
+
+    `no_cache` is the gateway's verdict (its crisis detector fired); the local
+    patterns only back it up for callers that don't send one.
+    """
+    if no_cache or summary or len(history) > max_history:
+        return False
+    texts = [message] + [msg.content for msg in history]
+    return not any(_PERSONAL_MARKERS.search(t) or _CRISIS_HINTS.search(t) for t in texts)
+
+
+def cache_key(message: str, history: list, deployment: str, params: dict, prompt_version: str) -> str:
+    """Hash of everything that determines the reply: message, history window, model and sampling params."""
+    material = json.dumps({
+        "message": normalize_message(message),
+        "history": [(msg.role, normalize_message(msg.content)) for msg in history],
+        "deployment": deployment,
+        "params": params,
+        "prompt": prompt_version,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """Per-worker LRU bounded by the total size of stored replies."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict, ttl: int):
+        size = len(value["reply"].encode("utf-8")) + len(key)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._data[key] = (time.monotonic() + ttl, value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[2]
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self._data), "bytes": self.size,
+                "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """Shared across workers; eviction is left to Redis' maxmemory policy."""
+
+    def __init__(self, redis, prefix: str = "tena:reply:"):
+        self.redis = redis
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = await self.redis.get(self.prefix + key)
+        except Exception:
+            logger.warning("Response cache read failed", exc_info=True)
+            return None
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, value: dict, ttl: int):
+        try:
+            await self.redis.set(self.prefix + key, json.dumps(value), ex=ttl)
+        except Exception:
+            logger.warning("Response cache write failed", exc_info=True)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: int, max_history: int = 0):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_history = max_history
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_tokens = 0
+
+    async def lookup(self, key: Optional[str]) -> Optional[str]:
+        """Returns the cached reply for key (None key means the turn bypasses the cache)."""
+        if key is None:
+            self.bypassed += 1
+            return None
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_tokens += value.get("tokens", 0)
+        return value["reply"]
+
+    async def store(self, key: Optional[str], reply: str, tokens: int = 0):
+        if key is None or not reply:
+            return
+        await self.backend.set(key, {"reply": reply, "tokens": tokens}, self.ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self.backend.stats(),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
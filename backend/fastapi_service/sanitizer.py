@@ -0,0 +1,256 @@
+"""Removes markdown syntax from model output, for whole replies or streamed chunks."""
+import re
+
+# Emphasis is recognised one delimiter run at a time, from the characters on either
+# side of it, without pairing an opener with its closer: a run opens emphasis when
+# no letter or digit precedes it and text follows, and closes it when text precedes
+# it and no letter or digit follows. "2*3*4", "5 * 3" and snake_case are left alone;
+# a stray opener or closer is dropped like a matched one. Deciding each run locally is
+# what lets the streaming stripper hold back only the run itself instead of
+# everything up to a closer that may never come, and keeps its output identical
+# to strip_markdown() of the whole reply.
+#
+# There is one pattern per syntax character, starting with that character, so the
+# engine skips straight to candidates and a pattern whose character doesn't occur
+# is never run; line markers are accepted only right after a newline. Every pattern
+# deletes what it matches, so re.sub() never calls back into Python per match.
+#
+# Cost (`python sanitizer.py`): a whole prose reply is stripped in about 60% of the
+# time of the old replace() chain, but one with syntax every few words still takes
+# about twice as long: each removal is a regex match, which costs several times a
+# replace() hit. Streaming is cheaper than the old per-chunk replace() for both. A
+# stream moves between states (the held text and the class of the character before
+# it), and each state keeps a table from chunk to output and next state, so a chunk
+# already seen in that state costs one dict lookup. Model output is made of a
+# bounded vocabulary of tokens and next to nothing is ever held back, so the tables
+# stay small and the patterns run on a chunk only the first time it is seen.
+
+# A horizontal rule: three or more of the character, alone on its line
+_RULE = r"(?:[ \t]*%s){2,}[ \t]*(?=\n|\Z)"
+
+# Blockquote, heading and bullet markers opening a line, with the blanks after them
+_QUOTE = re.compile(r">(?<![^\n]>)[ \t]*(?:>[ \t]*)*")
+_HEADING = re.compile(r"\#(?<![^\n]\#)\#{0,5}[ \t]+")
+_DASH = re.compile(r"-(?<![^\n]-)(?:" + _RULE % "-" + r"|[ \t]+)")
+_PLUS = re.compile(r"\+(?<![^\n]\+)[ \t]+")
+
+# The same markers after indentation, which is kept (group 1); group 2 is dropped
+_INDENTED_LINE = re.compile(r"""
+    (\n[ \t]+)(?:([-*_])(?:[ \t]*\2){2,}[ \t]*(?=\n|\Z)
+                |(?:>[ \t]*)+(?:\#{1,6}[ \t]+|[-*+][ \t]+)?
+                |\#{1,6}[ \t]+
+                |[-*+][ \t]+)
+""", re.VERBOSE)
+
+# Rules and bullets, then one to three * or _ (exactly two ~) that open or close
+# emphasis. The lookbehinds sit after the first character so the patterns still
+# start with a literal.
+_STAR = re.compile(r"""
+    \*(?<![^\n]\*)(?:""" + _RULE % r"\*" + r"""|[ \t]+)
+   |\*(?<!\*\*)(?:(?<![^\W_]\*)\*{0,2}(?=[^\s*])    # opens: no letter or digit before, text after
+                 |(?<=\S\*)\*{0,2}(?![^\W_]|\*))    # closes: text before, no letter or digit after
+""", re.VERBOSE)
+_UNDERSCORE = re.compile(r"""
+    _(?<![^\n]_)""" + _RULE % "_" + r"""
+   |_(?<!__)(?:(?<![^\W_]_)_{0,2}(?=[^\s_])
+              |(?<=\S_)_{0,2}(?![^\W_]|_))
+""", re.VERBOSE)
+_TILDE = re.compile(r"~~(?<!~~~)(?!~)(?:(?<![^\W_]~~)(?=\S)|(?<=\S~~)(?![^\W_]))")
+
+# In order: a marker uncovered by an earlier pass ("> ## x") is still at a line start
+_PASSES = ((">", _QUOTE), ("#", _HEADING), ("-", _DASH), ("+", _PLUS),
+           ("*", _STAR), ("_", _UNDERSCORE), ("~", _TILDE))
+
+# A line so far made only of characters that could still turn out to be line syntax
+_UNDECIDED_LINE = re.compile(r"[ \t>#*+\-_]*\Z")
+_DELIMITERS = "*_~"
+
+# Upper bound on text held back waiting for a line's syntax to be decided
+MAX_HOLD = 400
+
+# Streaming states, each the class of the character before the held-back text
+# followed by that text. A state's node maps a chunk to (output, next node) and
+# keeps the state itself under None. Only short states and chunks get a transition;
+# a full node or set of nodes is cleared.
+_NODES = {}
+_TABLE_MAX = 4096
+_TRANSITION_KEY_MAX = 64
+
+
+def _strip(text: str) -> str:
+    """Removes all syntax from `text`, which starts with "\\n" or a character that
+    no rule depends on."""
+    parts = _INDENTED_LINE.split(text)
+    del parts[2::3]
+    text = "".join(parts)
+    for char, pattern in _PASSES:
+        if char in text:
+            text = pattern.sub("", text)
+    return text
+
+
+def strip_markdown(text: str) -> str:
+    """Removes emphasis, headings, blockquotes, bullets and horizontal rules.
+
+    Only syntax is touched: "3 > 2", "#1 priority", "5 * 3", "2*3*4" and
+    snake_case pass through unchanged.
+    """
+    return _strip("\n" + text)[1:].strip()
+
+
+def _char_class(char: str) -> str:
+    """Stands in for the character before a piece of the stream: only whether it is
+    whitespace, a letter or digit, or anything else matters to the rules."""
+    if char.isspace():
+        return " "
+    return "a" if char.isalnum() else "."
+
+
+def _advance(state: str, final: bool) -> tuple:
+    """Strips as much of the held-back text in `state` as is final.
+
+    Holds back an undecided line start (the newline and the markers after it) and a
+    trailing run of delimiters, which can only be classified once the next character
+    arrives. Returns (output, next state).
+    """
+    before, text = state[0], state[1:]
+    cut = len(text)
+    if not final:
+        line_start = text.rfind("\n")
+        if line_start != -1 and _UNDECIDED_LINE.match(text, line_start + 1):
+            cut = line_start
+        elif text and text[-1] in _DELIMITERS:
+            cut = len(text.rstrip(_DELIMITERS))
+            # A horizontal rule looks ahead to the end of its line, which mustn't
+            # appear to be the end of the held-back run
+            if line_start != -1 and _UNDECIDED_LINE.match(text, line_start + 1, cut):
+                cut = line_start
+        if len(text) - cut > MAX_HOLD:
+            cut = len(text)
+    if not cut:
+        return "", state
+    segment = _strip(_char_class(before) + text[:cut])
+    # At the start of the stream, the newline it was seeded with goes too
+    return segment[2 if before == "\n" else 1:], _char_class(segment[-1]) + text[cut:]
+
+
+def _node(state: str) -> dict:
+    """The transition table of a streaming state, shared by every stream."""
+    node = _NODES.get(state)
+    if node is None:
+        if len(_NODES) >= _TABLE_MAX:
+            _NODES.clear()
+        node = _NODES[state] = {None: state}
+    return node
+
+
+class MarkdownStripper:
+    """Incremental strip_markdown for streamed replies.
+
+    feed() returns the sanitized text that is final so far and flush() the rest
+    once the stream ends. Only a line start whose markers are still arriving ("\\n",
+    "\\n## ", "\\n---") and a trailing run of "*", "_" or "~" are held back; the
+    concatenated output equals strip_markdown() of the whole reply up to
+    leading/trailing whitespace.
+    """
+
+    __slots__ = ("_node",)
+
+    def __init__(self):
+        # A "\n" before the held text marks the start of the stream, which is a line start
+        self._node = _node("\n\n")
+
+    def feed(self, chunk: str) -> str:
+        try:
+            out, self._node = self._node[chunk]
+        except KeyError:
+            out, self._node = self._step(chunk)
+        return out
+
+    def _step(self, chunk: str) -> tuple:
+        node = self._node
+        state = node[None]
+        out, next_state = _advance(state + chunk, False)
+        result = (out, _node(next_state))
+        if len(state) + len(chunk) <= _TRANSITION_KEY_MAX:
+            if len(node) > _TABLE_MAX:
+                # One key at a time, so that None is never missing for another stream
+                for key in list(node):
+                    if key is not None:
+                        node.pop(key, None)
+            node[chunk] = result
+        return result
+
+    def flush(self) -> str:
+        out, state = _advance(self._node[None], True)
+        self._node = _node(state)
+        return out
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    def legacy_strip_markdown(text: str) -> str:
+        text = text.replace('**', '').replace('*', '')
+        text = text.replace('#', '').replace('##', '').replace('###', '')
+        text = text.replace('>', '').strip()
+        return text
+
+    def legacy_strip_markdown_chunk(text: str) -> str:
+        return text.replace('*', '').replace('#', '').replace('>', '')
+
+    paragraph = (
+        "Under Ghanaian law an employer must give written notice before ending a contract of "
+        "employment, and the length of that notice depends on how long you have worked and how "
+        "you are paid. If you were dismissed because of your pregnancy, union membership or a "
+        "complaint you made, the dismissal is unfair and you can apply to the **National Labour "
+        "Commission** for a remedy. "
+    )
+    typical = ("## What the law says\n\n" + paragraph * 3 + "\n\nSteps you can take:\n"
+               "- Keep copies of your contract\n- Write down dates and names\n\n" + paragraph * 2 + "\n\n")
+    dense = (
+        "## Your rights at work\n\n"
+        "Under the **Labour Act, 2003 (Act 651)** you are entitled to:\n"
+        "- A written contract stating your *wages* and hours\n"
+        "- At least **15 working days** of paid leave per year\n"
+        "* Protection from ___unfair___ dismissal, see section_63 of the Act\n\n"
+        "> If your employer refuses, contact the ~~Labour Office~~ National Labour Commission.\n\n"
+        "Remember: 3 > 2, your safety is the #1 priority, and 5 * 3 = 15.\n"
+        "---\n"
+    )
+    example = dense.splitlines()[-2]
+    print("legacy :", legacy_strip_markdown(example))
+    print("new    :", strip_markdown(example))
+
+    def best_of(fn) -> float:
+        return min(timeit.repeat(fn, number=50, repeat=7)) / 50 * 1e6
+
+    rng = random.Random(7)
+    for name, reply in (("typical", typical * 8), ("markup-dense", dense * 40)):
+        # Streaming must agree with the whole-text result for any chunking
+        expected = strip_markdown(reply)
+        for _ in range(50):
+            stripper, out, i = MarkdownStripper(), [], 0
+            while i < len(reply):
+                n = rng.randint(1, 12)
+                out.append(stripper.feed(reply[i:i + n]))
+                i += n
+            out.append(stripper.flush())
+            assert "".join(out).strip() == expected, "streamed output differs from strip_markdown"
+
+        chunks = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+
+        def stream_new():
+            stripper = MarkdownStripper()
+            return "".join(stripper.feed(c) for c in chunks) + stripper.flush()
+
+        def stream_legacy():
+            return "".join(legacy_strip_markdown_chunk(c) for c in chunks)
+
+        print(f"\n{name} reply, {len(reply)} chars:")
+        for label, fn in (("legacy strip_markdown", lambda: legacy_strip_markdown(reply)),
+                          ("strip_markdown", lambda: strip_markdown(reply)),
+                          (f"legacy chunks ({len(chunks)} x 4)", stream_legacy),
+                          (f"MarkdownStripper ({len(chunks)} x 4)", stream_new)):
+            print(f"  {label:32s} {best_of(fn):9.1f} us")
@@ -0,0 +1,232 @@
+"""Admission control for Azure OpenAI calls: bounded concurrency plus TPM/RPM token buckets."""
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerTimeout(Exception):
+    """A request could not be admitted before its queue deadline."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"not admitted before deadline (retry after {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to a burst of `per_minute`. 0 disables it."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (requests larger than the burst wait for a full bucket)."""
+        if not self.enabled:
+            return 0.0
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.level -= amount
+
+    def give_back(self, amount: float):
+        if self.enabled:
+            self.level = min(self.capacity, self.level + amount)
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Reads Azure's retry-after-ms / retry-after headers from a 429 error, if present."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class Ticket:
+    """One admitted request. Holds an in-flight slot until the surrounding `admit` block exits."""
+
+    def __init__(self, scheduler: "AzureScheduler", tokens: int, deadline: float):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        self.deadline = deadline
+
+    async def call(self, request: Callable[[], Awaitable]):
+        """Awaits `request()`, retrying 429s and connection errors within the deadline.
+
+        A 429 pauses admission for every queued request for the Retry-After the
+        service asked for (or an exponential backoff with jitter).
+        """
+        scheduler = self.scheduler
+        attempt = 0
+        while True:
+            await scheduler.wait_for_resume(self.deadline)
+            try:
+                return await request()
+            except (openai.RateLimitError, openai.APIConnectionError) as exc:
+                throttled = isinstance(exc, openai.RateLimitError)
+                # 429s are retried for as long as the deadline allows; connection errors a few times
+                if isinstance(exc, openai.APITimeoutError) or (not throttled and attempt >= scheduler.max_retries):
+                    raise
+                delay = retry_after_seconds(exc) if throttled else None
+                if delay is None:
+                    delay = random.uniform(0, min(scheduler.backoff_base * 2 ** attempt, 30.0))
+                delay = max(delay, 0.1)
+                if time.monotonic() + delay > self.deadline:
+                    raise
+                attempt += 1
+                if throttled:
+                    scheduler.throttled += 1
+                    scheduler.pause(delay)
+                    logger.warning("Azure returned 429; pausing admissions for %.2fs", delay)
+                else:
+                    await asyncio.sleep(delay)
+
+    def used(self, tokens: Optional[int]):
+        """Reports actual usage so an over-estimate is returned to the TPM bucket."""
+        if tokens is not None and tokens < self.tokens:
+            self.scheduler.tpm.give_back(self.tokens - tokens)
+            self.tokens = tokens
+
+
+class AzureScheduler:
+    """Admits Azure calls so bursts queue instead of tripping deployment quotas.
+
+    - at most `max_in_flight` calls run at once;
+    - each call reserves its estimated prompt+completion tokens from a
+      tokens-per-minute bucket and one unit from a requests-per-minute bucket;
+    - callers wait in FIFO order, up to `queue_timeout` seconds, then get
+      SchedulerTimeout carrying a Retry-After hint;
+    - a 429 pauses all admissions for the advertised Retry-After.
+    Only touched from the event loop.
+    """
+
+    def __init__(self, max_in_flight: int = 32, tpm: int = 0, rpm: int = 0,
+                 queue_timeout: float = 20.0, max_retries: int = 2, backoff_base: float = 0.5):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.tpm = TokenBucket(tpm)
+        self.rpm = TokenBucket(rpm)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.timed_out = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._queue_lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _primitives(self):
+        # Created lazily so they bind to the running event loop
+        if self._slots is None:
+            self._queue_lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self._queue_lock, self._slots
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def wait_for_resume(self, deadline: float):
+        wait = self._paused_until - time.monotonic()
+        if wait > 0:
+            if time.monotonic() + wait > deadline:
+                raise SchedulerTimeout(wait)
+            await asyncio.sleep(wait)
+
+    async def _reserve(self, tokens: int, deadline: float):
+        """Waits (head of line) until the buckets can cover this request, then debits them."""
+        queue_lock, _ = self._primitives()
+        async with queue_lock:
+            while True:
+                now = time.monotonic()
+                self.tpm.refill(now)
+                self.rpm.refill(now)
+                wait = max(self._paused_until - now, self.tpm.wait_time(tokens), self.rpm.wait_time(1))
+                if wait <= 0:
+                    self.tpm.take(tokens)
+                    self.rpm.take(1)
+                    return
+                if now + wait > deadline:
+                    raise SchedulerTimeout(wait)
+                await asyncio.sleep(wait)
+
+    def admit(self, tokens: int, timeout: Optional[float] = None) -> "_Admission":
+        """`async with scheduler.admit(estimated_tokens) as ticket: await ticket.call(...)`"""
+        return _Admission(self, tokens, time.monotonic() + (timeout or self.queue_timeout))
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self.tpm.refill(now)
+        self.rpm.refill(now)
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "timed_out": self.timed_out,
+            "throttled": self.throttled,
+            "tpm_limit": int(self.tpm.capacity),
+            "tpm_available": int(self.tpm.level) if self.tpm.enabled else None,
+            "rpm_limit": int(self.rpm.capacity),
+            "rpm_available": int(self.rpm.level) if self.rpm.enabled else None,
+            "paused_for": round(max(self._paused_until - now, 0.0), 3),
+        }
+
+
+class _Admission:
+    def __init__(self, scheduler: AzureScheduler, tokens: int, deadline: float):
+        self.scheduler = scheduler
+        self.ticket = Ticket(scheduler, tokens, deadline)
+        self._holding_slot = False
+
+    async def __aenter__(self) -> Ticket:
+        scheduler = self.scheduler
+        _, slots = scheduler._primitives()
+        scheduler.waiting += 1
+        try:
+            await scheduler._reserve(self.ticket.tokens, self.ticket.deadline)
+            try:
+                await asyncio.wait_for(slots.acquire(), max(self.ticket.deadline - time.monotonic(), 0.001))
+            except asyncio.TimeoutError:
+                scheduler.tpm.give_back(self.ticket.tokens)
+                scheduler.rpm.give_back(1)
+                raise SchedulerTimeout(1.0)
+        except SchedulerTimeout:
+            scheduler.timed_out += 1
+            raise
+        finally:
+            scheduler.waiting -= 1
+        self._holding_slot = True
+        scheduler.in_flight += 1
+        scheduler.admitted += 1
+        return self.ticket
+
+    async def __aexit__(self, *exc):
+        if self._holding_slot:
+            self.scheduler.in_flight -= 1
+            self.scheduler._slots.release()
+        return False
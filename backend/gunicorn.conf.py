@@ -0,0 +1,49 @@
+"""Gunicorn settings for the Flask gateway (picked up automatically by `gunicorn run:app`).
+
+The default worker class is gevent: each worker serves up to
+GUNICORN_WORKER_CONNECTIONS requests concurrently as greenlets, so chat requests
+waiting on the AI service no longer hold a whole process. Set
+GUNICORN_WORKER_CLASS=sync to go back to one request per worker.
+"""
+import os
+import shutil
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+# Seen by the app in every worker, which keeps per-process caches off when there are several
+os.environ["GUNICORN_WORKERS"] = str(workers)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+# Must exceed AI_GATEWAY_READ_TIMEOUT so slow completions aren't killed mid-stream
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+
+def on_starting(server):
+    # Workers write their Prometheus samples here so /metrics can add them up;
+    # samples from a previous run would be counted again
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drops the dead worker's live gauges (in-flight requests); its counters are kept
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    if worker_class != "gevent":
+        return
+    # psycopg2 is a C extension that gevent's monkey-patching can't reach; without
+    # this a slow query would block every greenlet in the worker.
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen not installed; database calls will block the gevent worker")
+        return
+    patch_psycopg()
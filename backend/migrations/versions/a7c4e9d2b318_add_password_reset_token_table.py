@@ -0,0 +1,52 @@
+"""Move password reset tokens to their own table, stored as hashes
+
+Revision ID: a7c4e9d2b318
+Revises: f3b8d1c6a925
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e9d2b318'
+down_revision = 'f3b8d1c6a925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The token hash is the primary key, so redeeming a link is one index probe;
+    # expires_at is indexed for the sweep. Outstanding plaintext tokens on "user"
+    # are dropped with their columns: those links stop working and can be requested again.
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS password_reset_token (
+            token_hash VARCHAR(64) PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES "user" (user_id) ON DELETE CASCADE,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP
+        );
+
+        CREATE INDEX IF NOT EXISTS ix_password_reset_token_user_id
+        ON password_reset_token (user_id);
+
+        CREATE INDEX IF NOT EXISTS ix_password_reset_token_expires_at
+        ON password_reset_token (expires_at);
+
+        ALTER TABLE "user" DROP COLUMN IF EXISTS reset_token;
+        ALTER TABLE "user" DROP COLUMN IF EXISTS reset_token_expiration;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        ALTER TABLE "user" ADD COLUMN IF NOT EXISTS reset_token VARCHAR(128) DEFAULT NULL;
+        ALTER TABLE "user" ADD COLUMN IF NOT EXISTS reset_token_expiration TIMESTAMP DEFAULT NULL;
+
+        DROP TABLE IF EXISTS password_reset_token;
+        """
+    )
@@ -0,0 +1,35 @@
+"""Add rolling summary columns to chat_session
+
+Revision ID: c41e7f2a9d10
+Revises: 3b84ad2a71b1
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7f2a9d10'
+down_revision = '3b84ad2a71b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Guarded so it is safe on databases where the columns were added by hand.
+    op.execute(
+        """
+        ALTER TABLE chat_session ADD COLUMN IF NOT EXISTS summary TEXT DEFAULT NULL;
+        ALTER TABLE chat_session ADD COLUMN IF NOT EXISTS summary_until_id INTEGER DEFAULT NULL;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        ALTER TABLE chat_session DROP COLUMN IF EXISTS summary_until_id;
+        ALTER TABLE chat_session DROP COLUMN IF EXISTS summary;
+        """
+    )
@@ -0,0 +1,30 @@
+"""Add composite (chat_id, timestamp, message_id) index on message
+
+Revision ID: d7a3b9e51f62
+Revises: c41e7f2a9d10
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3b9e51f62'
+down_revision = 'c41e7f2a9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backs ordered history reads and keyset pagination of a session's messages.
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_message_chat_id_timestamp_id
+        ON message (chat_id, timestamp, message_id);
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_message_chat_id_timestamp_id;")
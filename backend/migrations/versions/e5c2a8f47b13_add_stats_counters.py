@@ -0,0 +1,83 @@
+"""Add stat_total / stat_daily counters and chat_session.last_active_date
+
+Revision ID: e5c2a8f47b13
+Revises: d7a3b9e51f62
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c2a8f47b13'
+down_revision = 'd7a3b9e51f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stat_total (
+            metric VARCHAR(32) NOT NULL,
+            shard SMALLINT NOT NULL,
+            value BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, shard)
+        );
+
+        CREATE TABLE IF NOT EXISTS stat_daily (
+            metric VARCHAR(32) NOT NULL,
+            day DATE NOT NULL,
+            shard SMALLINT NOT NULL,
+            value BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, day, shard)
+        );
+
+        ALTER TABLE chat_session ADD COLUMN IF NOT EXISTS last_active_date DATE;
+        """
+    )
+
+    # Backfill from the base tables once; afterwards the application keeps the
+    # counters current (`flask stats rebuild` repeats this if they ever drift).
+    op.execute(
+        """
+        INSERT INTO stat_total (metric, shard, value)
+        SELECT 'users', 0, count(*) FROM "user"
+        UNION ALL SELECT 'chats', 0, count(*) FROM chat_session
+        UNION ALL SELECT 'messages', 0, count(*) FROM message
+        ON CONFLICT DO NOTHING;
+
+        INSERT INTO stat_daily (metric, day, shard, value)
+        SELECT 'messages', timestamp::date, 0, count(*)
+            FROM message WHERE timestamp IS NOT NULL GROUP BY 2
+        UNION ALL SELECT 'active_sessions', timestamp::date, 0, count(DISTINCT chat_id)
+            FROM message WHERE timestamp IS NOT NULL GROUP BY 2
+        UNION ALL SELECT 'new_users', created_at::date, 0, count(*)
+            FROM "user" WHERE created_at IS NOT NULL GROUP BY 2
+        UNION ALL SELECT 'new_sessions', created_at::date, 0, count(*)
+            FROM chat_session WHERE created_at IS NOT NULL GROUP BY 2
+        UNION ALL SELECT 'anonymous_sessions', created_at::date, 0, count(*)
+            FROM chat_session WHERE created_at IS NOT NULL AND user_id IS NULL GROUP BY 2
+        UNION ALL SELECT 'authenticated_sessions', created_at::date, 0, count(*)
+            FROM chat_session WHERE created_at IS NOT NULL AND user_id IS NOT NULL GROUP BY 2
+        ON CONFLICT DO NOTHING;
+
+        UPDATE chat_session cs
+        SET last_active_date = activity.day
+        FROM (
+            SELECT chat_id, max(timestamp)::date AS day FROM message GROUP BY chat_id
+        ) AS activity
+        WHERE cs.chat_id = activity.chat_id;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        ALTER TABLE chat_session DROP COLUMN IF EXISTS last_active_date;
+        DROP TABLE IF EXISTS stat_daily;
+        DROP TABLE IF EXISTS stat_total;
+        """
+    )
@@ -0,0 +1,37 @@
+"""Add message.flag for crisis follow-up, with a partial index on flagged rows
+
+Revision ID: f3b8d1c6a925
+Revises: e5c2a8f47b13
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1c6a925'
+down_revision = 'e5c2a8f47b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only flagged rows are indexed, so the index stays tiny next to the message table.
+    op.execute(
+        """
+        ALTER TABLE message ADD COLUMN IF NOT EXISTS flag VARCHAR(32);
+
+        CREATE INDEX IF NOT EXISTS ix_message_flagged
+        ON message (message_id) WHERE flag IS NOT NULL;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP INDEX IF EXISTS ix_message_flagged;
+        ALTER TABLE message DROP COLUMN IF EXISTS flag;
+        """
+    )
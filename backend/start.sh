@@ -4,6 +4,9 @@ echo "Running database migrations..."
 # This command relies on the DATABASE_URL environment variable being set by Render
 flask db upgrade
 
+# Lets /metrics aggregate every gunicorn worker; gunicorn.conf.py empties it on start
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/tena-prometheus}"
+
 echo "Starting Gunicorn server..."
-# Using the command from your original Dockerfile
-exec gunicorn -w 4 -b 0.0.0.0:5000 run:app
\ No newline at end of file
+# Workers, worker class (gevent by default) and timeouts come from gunicorn.conf.py
+exec gunicorn -c gunicorn.conf.py run:app
\ No newline at end of file
@@ -33,6 +33,8 @@ const AdminDashboard = () => {
     const [deletionMessage, setDeletionMessage] = useState('');
     const [isDeleting, setIsDeleting] = useState(false);
     const [users, setUsers] = useState([]);
+    const [nextUsersCursor, setNextUsersCursor] = useState(null);
+    const [isLoadingUsers, setIsLoadingUsers] = useState(false);
     const { logout } = useAuth();
     const navigate = useNavigate();
 
@@ -43,8 +45,9 @@ const AdminDashboard = () => {
             const metricsData = await api.getSystemMetrics(); 
             setMetrics(metricsData);
 
-            const usersData = await api.getAllUsers();
-            setUsers(usersData);
+            const usersPage = await api.getUsers();
+            setUsers(usersPage.users);
+            setNextUsersCursor(usersPage.next_after);
             
         } catch (err) {
             console.error("Error fetching admin metrics:", err);
@@ -58,6 +61,20 @@ const AdminDashboard = () => {
         fetchMetrics();
     }, []);
     
+    const loadMoreUsers = async () => {
+        setIsLoadingUsers(true);
+        try {
+            const usersPage = await api.getUsers(nextUsersCursor);
+            setUsers((prev) => [...prev, ...usersPage.users]);
+            setNextUsersCursor(usersPage.next_after);
+        } catch (err) {
+            console.error("Error fetching users:", err);
+            setError("Failed to load more users.");
+        } finally {
+            setIsLoadingUsers(false);
+        }
+    };
+
     // --- Dashboard Actions ---
 
     const handleRefresh = () => {
@@ -172,7 +189,8 @@ const AdminDashboard = () => {
 
             {/* User Management Section */}
             <section className="user-management">
-                <h2>👤 Registered Users ({users.length})</h2>
+                <h2>👤 Registered Users ({metrics?.total_users ?? users.length})</h2>
+                <a className="export-link" href={api.userExportUrl('csv')}>Export CSV</a>
                 <div className="user-list-card">
                     <Table size={24} style={{ marginBottom: '1rem' }} />
                     <div className="user-table-wrapper">
@@ -200,6 +218,11 @@ const AdminDashboard = () => {
                         </table>
                     </div>
                     {users.length === 0 && <p className="no-data">No users registered yet.</p>}
+                    {nextUsersCursor !== null && (
+                        <button onClick={loadMoreUsers} disabled={isLoadingUsers}>
+                            {isLoadingUsers ? 'Loading...' : 'Load more'}
+                        </button>
+                    )}
                 </div>
             </section>
 
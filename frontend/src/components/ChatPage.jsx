@@ -88,8 +88,14 @@ const ChatPage = ({ onLogout, isAuthenticated, userEmail, theme, onToggleTheme,
         setMessages(prev => [...prev, typingPlaceholder]);
 
         try {
-            // Send message with the current session UUID
-            const response = await api.chat(currentInput, currentSessionUUID);
+            // Send message with the current session UUID, rendering tokens as they arrive
+            let streamedText = '';
+            const response = await api.chatStream(currentInput, currentSessionUUID, (delta) => {
+                streamedText += delta;
+                setMessages(prev => prev.map(msg => 
+                    msg.id === placeholderId ? { ...msg, text: streamedText, sender: 'ai' } : msg
+                ));
+            });
 
             // If a NEW session was created (currentSessionUUID was null), update it
             if (response.session_id && response.session_id !== currentSessionUUID) {
@@ -102,7 +108,7 @@ const ChatPage = ({ onLogout, isAuthenticated, userEmail, theme, onToggleTheme,
 
             const aiResponse = {
                 id: Date.now() + 2,
-                text: response.reply || "An unknown response was received.", 
+                text: response.reply || streamedText || "An unknown response was received.", 
                 sender: 'ai',
                 timestamp: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })        
             };
@@ -87,6 +87,60 @@ export const api = {
         return data;
     },
 
+    // Streams the reply as Server-Sent Events. onDelta is called with each text chunk;
+    // resolves with { reply, session_id } once the server sends the final 'done' event.
+    chatStream: async (message, sessionId = null, onDelta = () => {}) => {
+        const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+            method: 'POST',
+            credentials: 'include',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+            },
+            body: JSON.stringify({
+                message,
+                session_id: sessionId
+            }),
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = { reply: '', session_id: sessionId };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Frames are separated by a blank line; keep any partial frame in the buffer
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+
+            for (const frame of frames) {
+                let event = 'message';
+                let data = '';
+                for (const line of frame.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (!data) continue;
+
+                const payload = JSON.parse(data);
+                if (event === 'done') {
+                    result = { reply: payload.reply, session_id: payload.session_id };
+                } else if (payload.delta) {
+                    onDelta(payload.delta);
+                }
+            }
+        }
+        return result;
+    },
+
     getChatHistory: async () => {
         return fetchWithAuth('/chat/history'); 
     },
@@ -148,11 +202,16 @@ export const api = {
         return fetchWithAuth('/admin/metrics/system');
     },
 
-    getAllUsers: async () => {
-        const data = await fetchWithAuth('/admin/users');
-        return data.users;
+    // One page of users; pass the previous page's next_after to continue
+    getUsers: async (after = null, limit = 100) => {
+        const params = new URLSearchParams({ limit });
+        if (after !== null) params.set('after', after);
+        return fetchWithAuth(`/admin/users?${params}`);
     },
 
+    // Streamed full export (downloaded by the browser, not parsed here)
+    userExportUrl: (format = 'csv') => `${API_BASE_URL}/admin/users/export?format=${format}`,
+
     deleteAllUsers: async () => {
         return fetchWithAuth('/admin/delete-all-users', { method: 'POST' });
     },